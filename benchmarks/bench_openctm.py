@@ -0,0 +1,282 @@
+"""Import/export benchmark of the OpenCTM add-on on synthetic meshes.
+
+Run headless inside Blender to time every phase:
+
+    blender -b --factory-startup --python benchmarks/bench_openctm.py -- --output bench.json
+
+or with plain Python (or bpy installed as a module) to time the file phases
+only:
+
+    python benchmarks/bench_openctm.py --sizes 10k,1M --baseline bench.json
+
+Phases:
+    encode   ctm_io.encode_file() of the synthetic mesh
+    decode   ctm_io.decode_file(), as run by the import workers (memory
+             mapping for RAW files), with normals, UVs and colors
+    gather   export arrays read back from the Blender mesh (bpy)
+
+plus the phases the import/export code records in its profiling trace:
+ctmDefineMesh and ctmSave of the encode, ctmLoad (or mmap) and arrays of
+the decode and, inside Blender, transform, build, uv, color, update and
+normals of io_openctm.create_mesh().
+
+Results are written as JSON. With --baseline, phases slower than the
+baseline by more than --tolerance are listed and the exit status is 1.
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+PACKAGE = "openctm_addon"
+
+DEFAULT_SIZES = "10k,100k,1M,5M,20M"
+DEFAULT_METHODS = "RAW,MG1,MG2"
+DEFAULT_VARIANTS = "bare,full"
+
+
+def load_addon():
+    """Import the add-on modules without running its bpy registration,
+    io_openctm is None without bpy"""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [SRC]
+        sys.modules[PACKAGE] = package
+    ctm_io = importlib.import_module(PACKAGE + ".ctm_io")
+    mesh_utils = importlib.import_module(PACKAGE + ".mesh_utils")
+    profiling = importlib.import_module(PACKAGE + ".profiling")
+    io_openctm = importlib.import_module(PACKAGE + ".io_openctm") if bpy is not None else None
+    return ctm_io, mesh_utils, profiling, io_openctm
+
+
+def parse_count(text):
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes, None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def synthetic_mesh(ctm_io, triangle_count, attributes):
+    """Wavy grid surface with about triangle_count triangles"""
+    width = max(2, int(np.sqrt(triangle_count / 2.0)) + 1)
+    height = max(2, int(np.ceil(triangle_count / (2.0 * (width - 1)))) + 1)
+    u = np.linspace(0.0, 1.0, width, dtype=np.float32)
+    v = np.linspace(0.0, 1.0, height, dtype=np.float32)
+    uu, vv = np.meshgrid(u, v)
+    phase = np.float32(8.0 * np.pi)
+    z = 0.05 * np.sin(phase * uu) * np.cos(phase * vv)
+    vertices = np.stack((uu * 10.0, vv * 10.0, z), axis=-1).reshape((-1, 3)).astype(np.float32)
+
+    rows = np.arange(height - 1, dtype=np.uint32)[:, None] * width
+    columns = np.arange(width - 1, dtype=np.uint32)[None, :]
+    corner = (rows + columns).ravel()
+    quads = np.stack((corner, corner + 1, corner + width + 1, corner + width), axis=1)
+    indices = np.concatenate((quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]))[:triangle_count]
+    indices = np.ascontiguousarray(indices)
+
+    mesh = ctm_io.ExportMesh(vertices, indices)
+    if attributes:
+        dz_du = 0.05 * phase * np.cos(phase * uu) * np.cos(phase * vv) / 10.0
+        dz_dv = -0.05 * phase * np.sin(phase * uu) * np.sin(phase * vv) / 10.0
+        normals = np.stack((-dz_du, -dz_dv, np.ones_like(uu)), axis=-1).reshape((-1, 3))
+        normals /= np.linalg.norm(normals, axis=1)[:, None]
+        mesh.normals = normals.astype(np.float32)
+        uv_coords = np.stack((uu, vv), axis=-1).reshape((-1, 2))
+        mesh.uv_maps = [("UVMap", uv_coords)]
+        mesh.attrib_maps = [("Color", np.concatenate((uv_coords, 0.5 + vertices[:, 2:] * 10.0,
+                                                      np.ones((len(vertices), 1), dtype=np.float32)), axis=1))]
+    return mesh
+
+
+class Timer:
+    def __init__(self):
+        self.phases = {}
+
+    def __call__(self, phase):
+        timer = self
+
+        class Phase:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                timer.phases[phase] = timer.phases.get(phase, 0.0) + time.perf_counter() - self.start
+
+        return Phase()
+
+
+def blender_phases(io_openctm, mesh_utils, decoded, attributes, timer):
+    mesh = io_openctm.create_mesh(decoded, "OpenCTMBenchmark", np.identity(4, dtype=np.float32))
+    try:
+        with timer("gather"):
+            mesh_utils.triangle_vertex_indices(mesh)
+            mesh_utils.vertex_positions(mesh)
+            if attributes:
+                mesh_utils.vertex_normals(mesh)
+                mesh_utils.vertex_uv_coords(mesh, mesh.uv_layers.active)
+                mesh_utils.vertex_attribute_values(mesh, mesh.color_attributes.active_color)
+    finally:
+        bpy.data.meshes.remove(mesh)
+
+
+def run_case(ctm_io, mesh_utils, profiling, io_openctm, triangle_count, method, variant, directory):
+    attributes = variant == "full"
+    source = synthetic_mesh(ctm_io, triangle_count, attributes)
+    settings = ctm_io.ExportSettings(getattr(ctm_io, "CTM_METHOD_" + method))
+    filepath = os.path.join(directory, f"bench_{triangle_count}_{method}_{variant}.ctm")
+    timer = Timer()
+    trace = profiling.start("benchmark", track_memory=False)
+    try:
+        with timer("encode"):
+            ctm_io.encode_file(filepath, source, settings)
+        file_size = os.path.getsize(filepath)
+        del source
+        gc.collect()
+
+        with timer("decode"):
+            decoded = ctm_io.decode_file(filepath)
+        vertex_count = len(decoded.vertices)
+        triangle_count = len(decoded.indices)
+        if io_openctm is not None:
+            blender_phases(io_openctm, mesh_utils, decoded, attributes, timer)
+        decoded.release()
+        del decoded
+        gc.collect()
+    finally:
+        profiling.stop()
+        if os.path.exists(filepath):
+            os.remove(filepath)
+    # Phases of the import/export code itself
+    for phase, (seconds, _, _) in trace.totals().items():
+        timer.phases[phase] = seconds
+
+    return {
+        "triangles": triangle_count,
+        "vertices": vertex_count,
+        "method": method,
+        "variant": variant,
+        "file_size": file_size,
+        "phases": timer.phases,
+        "throughput": {phase: triangle_count / seconds for phase, seconds in timer.phases.items() if seconds > 0},
+        "peak_rss": peak_rss(),
+    }
+
+
+def case_key(result):
+    return result["triangles"], result["method"], result["variant"]
+
+
+def compare(results, baseline, tolerance, min_time):
+    """(case, phase, baseline seconds, seconds) of the phases slower than the
+    baseline by more than tolerance, phases faster than min_time are noise"""
+    reference = {case_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = reference.get(case_key(result))
+        if base is None:
+            continue
+        for phase, seconds in result["phases"].items():
+            base_seconds = base["phases"].get(phase)
+            if base_seconds and max(seconds, base_seconds) >= min_time and seconds > base_seconds * (1.0 + tolerance):
+                regressions.append((case_key(result), phase, base_seconds, seconds))
+    return regressions
+
+
+def metadata(ctm_io):
+    return {
+        "backend": ctm_io.BACKEND,
+        "blender": bpy.app.version_string if bpy is not None else None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def parse_args(argv):
+    # Blender passes the script arguments after "--"
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    elif bpy is not None and bpy.app.background:
+        argv = []
+    parser = argparse.ArgumentParser(description="OpenCTM add-on import/export benchmark")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="triangle counts (default %(default)s)")
+    parser.add_argument("--methods", default=DEFAULT_METHODS, help="compression methods (default %(default)s)")
+    parser.add_argument("--variants", default=DEFAULT_VARIANTS,
+                        help="bare: positions only, full: normals, UVs and colors (default %(default)s)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed slowdown against the baseline (default %(default)s)")
+    parser.add_argument("--min-time", type=float, default=0.01,
+                        help="phases shorter than this many seconds are not compared (default %(default)s)")
+    parser.add_argument("--directory", help="where the temporary .ctm files go")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    ctm_io, mesh_utils, profiling, io_openctm = load_addon()
+    sizes = sorted(parse_count(size) for size in args.sizes.split(","))
+    methods = [method.strip().upper() for method in args.methods.split(",")]
+    variants = [variant.strip() for variant in args.variants.split(",")]
+
+    results = []
+    # Growing sizes so the process wide peak RSS follows the largest case
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        for triangle_count in sizes:
+            for variant in variants:
+                for method in methods:
+                    result = run_case(ctm_io, mesh_utils, profiling, io_openctm, triangle_count, method, variant, directory)
+                    results.append(result)
+                    timings = " ".join(f"{phase}={seconds:.3f}s" for phase, seconds in result["phases"].items())
+                    print(f"{result['triangles']:>10} {method} {variant:<4} {timings}", flush=True)
+
+    report = {"meta": metadata(ctm_io), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as stream:
+            json.dump(report, stream, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as stream:
+            baseline = json.load(stream)
+        regressions = compare(results, baseline, args.tolerance, args.min_time)
+        for (triangles, method, variant), phase, base_seconds, seconds in regressions:
+            print(f"REGRESSION {triangles} {method} {variant} {phase}: "
+                  f"{base_seconds:.3f}s -> {seconds:.3f}s ({seconds / base_seconds - 1.0:+.0%})")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
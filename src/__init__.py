@@ -1,5 +1,6 @@
 import bpy
-from .io_openctm import OpenCTMImport, OpenCTMExport
+from . import preferences
+from .io_openctm import OpenCTMImport, OpenCTMExport, OpenCTMLoadFullResolution
 
 bl_info = {
     "name": "OpenCTM (.ctm)",
@@ -20,15 +21,22 @@ def menu_import(self, context):
 def menu_export(self, context):
     self.layout.operator(OpenCTMExport.bl_idname, text="OpenCTM (.ctm)")
 
+def menu_object(self, context):
+    self.layout.operator(OpenCTMLoadFullResolution.bl_idname)
+
 def register():
+    preferences.register()
     io_openctm.register()
     bpy.types.TOPBAR_MT_file_import.append(menu_import)
     bpy.types.TOPBAR_MT_file_export.append(menu_export)
+    bpy.types.VIEW3D_MT_object.append(menu_object)
 
 def unregister():
     io_openctm.unregister()
+    preferences.unregister()
     bpy.types.TOPBAR_MT_file_import.remove(menu_import)
     bpy.types.TOPBAR_MT_file_export.remove(menu_export)
+    bpy.types.VIEW3D_MT_object.remove(menu_object)
 
 if __name__ == "__main__":
     register()
\ No newline at end of file
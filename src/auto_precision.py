@@ -0,0 +1,66 @@
+import numpy as np
+
+from .openctm.codec.format import Grid
+
+# Candidate precisions tried between the guaranteed bound and this many times
+# coarser
+_SEARCH_RANGE = 2.0
+_SEARCH_STEPS = 16
+
+
+def vertex_error(vertices, precision):
+    """Largest distance between the vertices and their MG2 quantized
+    positions, computed like the encoder and decoder do (float32)"""
+    vertices = np.asarray(vertices, dtype=np.float32)
+    grid = Grid.for_vertices(vertices)
+    origins = grid.index_to_point(grid.point_to_index(vertices))
+    scale = np.float32(1.0 / precision)
+    ints = np.floor(scale * (vertices - origins) + np.float32(0.5))
+    restored = ints * np.float32(precision) + origins
+    deltas = restored - vertices
+    return float(np.sqrt(np.einsum("ij,ij->i", deltas, deltas).max(initial=0.0)))
+
+
+def map_error(values, precision):
+    """Largest difference between UV/attribute values and their MG2 quantized
+    values"""
+    values = np.asarray(values, dtype=np.float32)
+    ints = np.floor(np.float32(1.0 / precision) * values + np.float32(0.5))
+    restored = ints * np.float32(precision)
+    return float(np.abs(restored - values).max(initial=0.0))
+
+
+def coarsest_precision(error, budget, bound):
+    """Coarsest precision p with error(p) <= budget, bound being a precision
+    known to meet the budget in theory. Quantization error is not monotonic
+    in the precision, so candidates are tried from coarse to fine."""
+    for step in range(_SEARCH_STEPS, -1, -1):
+        precision = bound * _SEARCH_RANGE ** (step / _SEARCH_STEPS)
+        if error(precision) <= budget:
+            return precision
+    # Float rounding can push the bound itself over the budget
+    precision = bound
+    while error(precision) > budget and precision > 1e-20:
+        precision *= 0.5
+    return precision
+
+
+def auto_precisions(export_mesh, max_vertex_error, max_uv_error, max_colour_error):
+    """Coarsest MG2 precisions keeping the quantization error of an ExportMesh
+    within the budgets. Returns {name: (precision, error)} for vertex, uv and
+    colour (when the mesh has UV or attribute maps)."""
+    results = {}
+    # Rounding to the nearest step is off by at most half a step per axis
+    bound = 2.0 * max_vertex_error / 3.0 ** 0.5
+    precision = coarsest_precision(lambda p: vertex_error(export_mesh.vertices, p), max_vertex_error, bound)
+    results["vertex"] = (precision, vertex_error(export_mesh.vertices, precision))
+    for name, maps, budget in (("uv", export_mesh.uv_maps, max_uv_error),
+                               ("colour", export_mesh.attrib_maps, max_colour_error)):
+        if maps:
+            # One precision for all the UV maps, one for all the attribute maps
+            def error(precision, maps=maps):
+                return max(map_error(values, precision) for _, values in maps)
+
+            precision = coarsest_precision(error, budget, 2.0 * budget)
+            results[name] = (precision, error(precision))
+    return results
@@ -0,0 +1,814 @@
+import collections
+import copy
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from ctypes import POINTER, c_char_p, c_float, c_uint
+
+import numpy as np
+
+from .auto_precision import auto_precisions
+from .mesh_lod import decimate, group_means
+from .openctm import *
+from .openctm.codec.probe import METHOD_NAMES
+from .openctm.codec.reader import mesh_size
+from .openctm.codec.stream import CTMError
+from .profiling import array_bytes, phase
+
+EXPORT_COMMENT = ("Created by OpenCTM Addon (https://github.com/RealIndrit/blender-openctm) "
+                  "for Blender (https://www.blender.org/)")
+
+# Method/level combinations encoded by a compression sweep, the level does
+# not change RAW files
+SWEEP_CANDIDATES = (
+    (CTM_METHOD_RAW, 1),
+    (CTM_METHOD_MG1, 1),
+    (CTM_METHOD_MG1, 5),
+    (CTM_METHOD_MG1, 9),
+    (CTM_METHOD_MG2, 1),
+    (CTM_METHOD_MG2, 5),
+    (CTM_METHOD_MG2, 9),
+)
+# Loads of each candidate, the fastest one is its decode time
+SWEEP_DECODE_RUNS = 2
+# UV and attribute maps a file holds at most
+MAX_MAPS = 8
+# Triangle count ratio between successive levels of detail
+LOD_REDUCTION = 4
+
+
+class ArchiveMember:
+    """A .ctm file inside a zip archive, decoded straight from the archive"""
+
+    def __init__(self, archive, member, size=0):
+        self.archive = archive
+        self.member = member
+        self.size = size
+
+    def __str__(self):
+        return os.path.join(self.archive, self.member)
+
+    def open(self):
+        # The member stream keeps the archive file open on its own
+        with zipfile.ZipFile(self.archive) as archive:
+            return archive.open(self.member)
+
+
+def archive_members(archive):
+    """ArchiveMember of every .ctm file of a zip archive"""
+    with zipfile.ZipFile(archive) as zip_file:
+        return [ArchiveMember(archive, info.filename, info.file_size) for info in zip_file.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".ctm")]
+
+
+def _is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+def _label(source):
+    # Name of a file, archive member or stream in traces and messages
+    if _is_path(source):
+        return os.fspath(source)
+    if isinstance(source, ArchiveMember):
+        return str(source)
+    return str(getattr(source, "name", "<memory>"))
+
+
+def _load(ctm_context, source):
+    # ctmLoad from any source, returns the bytes read for streams
+    if _is_path(source):
+        ctmLoad(ctm_context, _encode(os.fspath(source)))
+        return None
+    if isinstance(source, ArchiveMember):
+        with source.open() as stream:
+            return ctmLoadStream(ctm_context, stream)
+    return ctmLoadStream(ctm_context, source)
+
+
+class DecodedMesh:
+    """Arrays of one .ctm file, decoded without touching Blender data.
+
+    The arrays of decode_file() are views into its OpenCTM context, kept
+    until release()."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.vertices = None
+        self.indices = None
+        self.normals = None
+        # (name, array) pairs, (n, 2) UVs and (n, 4) attribute values
+        self.uv_maps = []
+        self.attrib_maps = []
+        # Simplified versions, see add_lods()
+        self.lods = []
+        # CTMContext owning the arrays, None when they own their memory
+        self.context = None
+        # mesh_fingerprint(), computed by the decode workers on request
+        self.fingerprint = None
+
+    def release(self):
+        """Drop the arrays once consumed (such as by create_mesh()), handing
+        their OpenCTM context back to the pool"""
+        self.vertices = self.indices = self.normals = None
+        self.uv_maps = []
+        self.attrib_maps = []
+        self.lods = []
+        if self.context is not None:
+            self.context.release()
+            self.context = None
+
+    def decimated(self, target_triangles):
+        """Copy simplified to about target_triangles by vertex clustering,
+        with the UVs and attributes averaged over the merged vertices"""
+        lod = DecodedMesh(self.filepath)
+        lod.vertices, lod.indices, lod.normals, maps = _decimate(self.vertices, self.indices, self.normals,
+                                                                 target_triangles, self.uv_maps + self.attrib_maps)
+        lod.uv_maps = maps[:len(self.uv_maps)]
+        lod.attrib_maps = maps[len(self.uv_maps):]
+        return lod
+
+
+def _decimate(vertices, indices, normals, target_triangles, maps):
+    # Vertices, triangles, normals and (name, values) maps simplified by
+    # decimate()
+    groups, triangles = decimate(vertices, indices, target_triangles)
+    if normals is not None:
+        normals = group_means(normals, groups)
+        length = np.sqrt(np.einsum("ij,ij->i", normals, normals))
+        normals /= np.where(length > 1e-10, length, 1.0)[:, None]
+    maps = [(name, group_means(values, groups)) for name, values in maps]
+    return group_means(vertices, groups), triangles, normals, maps
+
+
+def lod_triangle_counts(triangles, levels, triangle_count):
+    """Target triangle counts of levels LODs of a mesh of triangle_count
+    triangles, the first with about triangles and each next one
+    LOD_REDUCTION times fewer. Levels at or above triangle_count are left
+    out."""
+    counts = [max(1, triangles // LOD_REDUCTION ** level) for level in range(levels)]
+    return [count for count in counts if count < triangle_count]
+
+
+def add_lods(decoded, triangles, levels=1, proxy=False):
+    """Fill decoded.lods with its levels of detail (lod_triangle_counts()),
+    each simplified from the previous one. With proxy, the first LOD is
+    returned in place of decoded, with the next ones as its lods."""
+    lods = []
+    source = decoded
+    for count in lod_triangle_counts(triangles, levels, len(decoded.indices)):
+        with phase("lod", decoded.filepath):
+            source = source.decimated(count)
+        lods.append(source)
+    if proxy and lods:
+        # The full resolution is not built
+        decoded.release()
+        decoded, lods = lods[0], lods[1:]
+    decoded.lods = lods
+    return decoded
+
+
+def mesh_fingerprint(decoded):
+    """Key equal for DecodedMesh with the same vertices, triangles, normals,
+    UVs and attributes: the counts and map names plus a hash of the array
+    bytes"""
+    digest = hashlib.blake2b(digest_size=16)
+    maps = decoded.uv_maps + decoded.attrib_maps
+    arrays = [decoded.vertices, decoded.indices] + [values for _, values in maps]
+    if decoded.normals is not None:
+        arrays.append(decoded.normals)
+    for array in arrays:
+        digest.update(memoryview(np.ascontiguousarray(array)).cast("B"))
+    return (len(decoded.vertices), len(decoded.indices), decoded.normals is not None, tuple(name for name, _ in maps),
+            digest.hexdigest())
+
+
+def _uv_layer_name(name, map_index):
+    # Unnamed maps (files of older exports) become UV0, UV1...
+    return name or f"UV{map_index}"
+
+
+def _attribute_name(name, map_index):
+    return name or f"Attribute{map_index}"
+
+
+def map_raw_file(filepath, uv=True, colour=True):
+    """DecodedMesh of arrays memory-mapped straight from a RAW file, or None
+    for other files (and files probe() rejects, left for ctmLoad to report)"""
+    if sys.byteorder != "little":
+        return None
+    try:
+        info = probe(filepath)
+    except CTMError:
+        return None
+    if info.method != CTM_METHOD_RAW:
+        return None
+    with phase("mmap", filepath, info.file_size):
+        try:
+            arrays = info.map_arrays()
+        except CTMError as e:
+            raise IOError(f"Error loading file: {e}")
+        decoded = DecodedMesh(filepath)
+        decoded.vertices = arrays["vertices"]
+        decoded.indices = arrays["indices"]
+        decoded.normals = arrays["normals"]
+        if uv:
+            decoded.uv_maps = [(_uv_layer_name(uv_map.name, map_index), uv_coords) for map_index, (uv_map, uv_coords)
+                               in enumerate(zip(info.uv_maps, arrays["uv_maps"]))]
+        if colour:
+            decoded.attrib_maps = [(_attribute_name(attrib_map.name, map_index), values)
+                                   for map_index, (attrib_map, values)
+                                   in enumerate(zip(info.attrib_maps, arrays["attrib_maps"]))]
+    return decoded
+
+
+def read_chunked_file(filepath, uv=True, colour=True, max_memory=None):
+    """DecodedMesh of a file decoded section by section by the Python codec
+    (MeshReader) within max_memory bytes, or None for files ctmLoad fits in
+    (and files probe() rejects, left for ctmLoad to report). ctmLoad holds
+    the compressed file and the decoded mesh at once, the chunked reader only
+    the mesh and a bounded work buffer."""
+    if max_memory is None:
+        return None
+    try:
+        info = probe(filepath)
+    except CTMError:
+        return None
+    if mesh_size(info) + info.file_size <= max_memory:
+        return None
+    with phase("chunked load", filepath, info.file_size):
+        try:
+            mesh = info.load(max_memory=max_memory)
+        except CTMError as e:
+            raise IOError(f"Error loading file: {e}")
+    decoded = DecodedMesh(filepath)
+    decoded.vertices = mesh.vertices
+    decoded.indices = mesh.indices
+    decoded.normals = mesh.normals
+    if uv:
+        decoded.uv_maps = [(_uv_layer_name(uv_map.name, map_index), uv_map.coords)
+                           for map_index, uv_map in enumerate(mesh.uv_maps)]
+    if colour:
+        decoded.attrib_maps = [(_attribute_name(attrib_map.name, map_index), attrib_map.values)
+                               for map_index, attrib_map in enumerate(mesh.attrib_maps)]
+    return decoded
+
+
+def decode_file(source, uv=True, colour=True, max_memory=None):
+    """Load a .ctm file into a DecodedMesh. source is a file path, an
+    ArchiveMember, bytes, a memoryview (or any buffer, such as an mmap) or a
+    binary file object. Safe to run off the main thread, the OpenCTM library
+    and LZMA release the GIL while decoding. RAW files are memory-mapped
+    instead, see map_raw_file(), and files that would take more than
+    max_memory bytes to load are decoded in chunks, see read_chunked_file().
+    Streams and archive members are always loaded whole.
+
+    The arrays are zero-copy views into a pooled OpenCTM context, call
+    DecodedMesh.release() once they are consumed."""
+    if _is_path(source):
+        decoded = map_raw_file(source, uv, colour) or read_chunked_file(source, uv, colour, max_memory)
+        if decoded is not None:
+            return decoded
+    filepath = _label(source)
+    decoded = DecodedMesh(filepath)
+    ctm = pooled_context(CTM_IMPORT)
+    try:
+        ctm_context = ctm.handle
+        with phase("ctmLoad", filepath) as timing:
+            nbytes = _load(ctm_context, source)
+            ctm.check("Error loading file")
+            timing.bytes = os.path.getsize(source) if nbytes is None else nbytes
+
+        with phase("arrays", filepath) as timing:
+            decoded.vertices = ctmGetArrayView(ctm_context, CTM_VERTICES)
+            decoded.indices = ctmGetArrayView(ctm_context, CTM_INDICES)
+            if ctmGetInteger(ctm_context, CTM_HAS_NORMALS):
+                decoded.normals = ctmGetArrayView(ctm_context, CTM_NORMALS)
+            timing.bytes = array_bytes(decoded.vertices, decoded.indices, decoded.normals)
+
+        if uv:
+            for map_index in range(ctmGetInteger(ctm_context, CTM_UV_MAP_COUNT)):
+                uv_map = CTM_UV_MAP_1 + map_index
+                uv_name = _decode(ctmGetUVMapString(ctm_context, uv_map, CTM_NAME))
+                with phase("arrays", filepath) as timing:
+                    uv_coords = ctmGetArrayView(ctm_context, uv_map)
+                    timing.bytes = uv_coords.nbytes
+                decoded.uv_maps.append((_uv_layer_name(uv_name, map_index), uv_coords))
+
+        if colour:
+            for map_index in range(ctmGetInteger(ctm_context, CTM_ATTRIB_MAP_COUNT)):
+                attrib_map = CTM_ATTRIB_MAP_1 + map_index
+                attrib_name = _decode(ctmGetAttribMapString(ctm_context, attrib_map, CTM_NAME))
+                with phase("arrays", filepath) as timing:
+                    values = ctmGetArrayView(ctm_context, attrib_map)
+                    timing.bytes = values.nbytes
+                decoded.attrib_maps.append((_attribute_name(attrib_name, map_index), values))
+    except BaseException:
+        ctm.close()
+        raise
+    decoded.context = ctm
+    return decoded
+
+
+def _cache_arrays(decoded):
+    arrays = {"vertices": decoded.vertices, "indices": decoded.indices}
+    if decoded.normals is not None:
+        arrays["normals"] = decoded.normals
+    for map_index, (_, uv_coords) in enumerate(decoded.uv_maps):
+        arrays[f"uv{map_index}"] = uv_coords
+    for map_index, (_, values) in enumerate(decoded.attrib_maps):
+        arrays[f"attrib{map_index}"] = values
+    return arrays, {"uv_names": [uv_name for uv_name, _ in decoded.uv_maps],
+                    "attrib_names": [attrib_name for attrib_name, _ in decoded.attrib_maps]}
+
+
+def load_file(source, uv=True, colour=True, cache=None, max_memory=None):
+    """decode_file() going through a DecodeCache, a hit memory-maps the
+    arrays of an earlier decode instead of decompressing the file. Only
+    files and archive members are cached."""
+    if cache is None or not (_is_path(source) or isinstance(source, ArchiveMember)):
+        return decode_file(source, uv, colour, max_memory)
+    if _is_path(source):
+        # Mapping a RAW file is as fast as a cache hit
+        decoded = map_raw_file(source, uv, colour)
+        if decoded is not None:
+            return decoded
+    filepath = _label(source)
+    with phase("cache read", filepath):
+        variant = f"uv={uv:d},attrib={colour:d},normals=1"
+        if isinstance(source, ArchiveMember):
+            key = cache.key(source.archive, f"{variant},member={source.member}")
+        else:
+            key = cache.key(source, variant)
+        cached = cache.get(key)
+    if cached is not None:
+        arrays, info = cached
+        decoded = DecodedMesh(filepath)
+        decoded.vertices = arrays["vertices"]
+        decoded.indices = arrays["indices"]
+        decoded.normals = arrays.get("normals")
+        decoded.uv_maps = [(uv_name, arrays[f"uv{map_index}"]) for map_index, uv_name in enumerate(info["uv_names"])]
+        decoded.attrib_maps = [(attrib_name, arrays[f"attrib{map_index}"])
+                               for map_index, attrib_name in enumerate(info["attrib_names"])]
+        return decoded
+    decoded = decode_file(source, uv, colour, max_memory)
+    arrays, info = _cache_arrays(decoded)
+    with phase("cache write", filepath, array_bytes(*arrays.values())):
+        cache.put(key, arrays, info)
+    return decoded
+
+
+def _release_result(future):
+    # Done callback of decodes nobody collects
+    if not future.cancelled() and future.exception() is None:
+        future.result().release()
+
+
+def _load_prepared(source, uv, colour, cache, prepare, fingerprint, max_memory):
+    decoded = load_file(source, uv, colour, cache, max_memory)
+    if prepare is not None:
+        decoded = prepare(decoded)
+    if fingerprint:
+        with phase("fingerprint", decoded.filepath, array_bytes(decoded.vertices, decoded.indices)):
+            decoded.fingerprint = mesh_fingerprint(decoded)
+    return decoded
+
+
+def decoded_files(filepaths, uv, colour, workers, cache, prepare=None, fingerprint=False, max_memory=None):
+    """Yield (filepath, DecodedMesh or exception) as files finish decoding,
+    keeping at most a few decoded meshes per worker waiting for the caller.
+    prepare, when given, is applied to each DecodedMesh in the worker
+    thread (such as add_lods()) and its result yielded instead. With
+    fingerprint, the workers also set DecodedMesh.fingerprint. max_memory
+    is the memory ceiling of each decode, see decode_file(). The caller
+    releases the meshes (DecodedMesh.release()), those of decodes left
+    running when the generator is closed are released for it."""
+    if len(filepaths) == 1 or workers == 1:
+        for filepath in filepaths:
+            try:
+                yield filepath, _load_prepared(filepath, uv, colour, cache, prepare, fingerprint, max_memory)
+            except Exception as e:
+                yield filepath, e
+        return
+
+    pending = iter(filepaths)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+
+        def submit(filepath):
+            running[executor.submit(_load_prepared, filepath, uv, colour, cache, prepare, fingerprint,
+                                           max_memory)] = filepath
+
+        for filepath in itertools.islice(pending, 2 * workers):
+            submit(filepath)
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    filepath = running.pop(future)
+                    for next_filepath in itertools.islice(pending, 1):
+                        submit(next_filepath)
+                    error = future.exception()
+                    yield filepath, error if error is not None else future.result()
+        finally:
+            for future in running:
+                future.add_done_callback(_release_result)
+
+
+class DecodeQueue:
+    """Non-blocking decoded_files() for modal operators: files are decoded in
+    a thread pool and poll() hands out the finished ones"""
+
+    def __init__(self, filepaths, uv=True, colour=True, workers=0, cache=None, prepare=None, fingerprint=False,
+                 max_memory=None):
+        self.uv = uv
+        self.colour = colour
+        self.cache = cache
+        self.prepare = prepare
+        self.fingerprint = fingerprint
+        self.max_memory = max_memory
+        self.workers = workers or os.cpu_count() or 1
+        self.pending = collections.deque(filepaths)
+        self.total = len(self.pending)
+        self.finished = 0
+        self.running = {}
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._submit()
+
+    def _submit(self):
+        # A few files per worker, so decoded meshes do not pile up in memory
+        while self.pending and len(self.running) < 2 * self.workers:
+            filepath = self.pending.popleft()
+            future = self.executor.submit(_load_prepared, filepath, self.uv, self.colour, self.cache, self.prepare,
+                                          self.fingerprint, self.max_memory)
+            self.running[future] = filepath
+
+    @property
+    def done(self):
+        return not self.running and not self.pending
+
+    def poll(self, limit=None):
+        """(filepath, DecodedMesh or exception) of at most limit files that
+        finished decoding, without waiting"""
+        results = []
+        for future in [future for future in self.running if future.done()][:limit]:
+            filepath = self.running.pop(future)
+            error = future.exception()
+            results.append((filepath, error if error is not None else future.result()))
+        self.finished += len(results)
+        self._submit()
+        return results
+
+    def cancel(self):
+        """Drop the files not decoded yet, decodes already running finish in
+        the background and are released"""
+        self.pending.clear()
+        for future in self.running:
+            future.add_done_callback(_release_result)
+        self.running.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class ExportMesh:
+    """Arrays of one mesh to export, gathered on the main thread. uv_maps and
+    attrib_maps are (name, array) pairs of (n, 2) UVs and (n, 4) attribute
+    values, at most MAX_MAPS of each."""
+
+    def __init__(self, vertices, indices, normals=None, uv_maps=None, attrib_maps=None):
+        self.vertices = vertices
+        self.indices = indices
+        self.normals = normals
+        self.uv_maps = uv_maps or []
+        self.attrib_maps = attrib_maps or []
+
+    def arrays(self):
+        return [self.vertices, self.indices, self.normals] + [array for _, array in self.uv_maps + self.attrib_maps]
+
+    def decimated(self, target_triangles):
+        """Copy simplified to about target_triangles by vertex clustering,
+        with normals, UVs and attributes averaged over the merged vertices"""
+        vertices, indices, normals, maps = _decimate(self.vertices, self.indices, self.normals, target_triangles,
+                                                     self.uv_maps + self.attrib_maps)
+        return ExportMesh(vertices, indices, normals, maps[:len(self.uv_maps)], maps[len(self.uv_maps):])
+
+
+class ExportSettings:
+    """Compression settings shared by every file of an export.
+
+    With error_budget, a (max vertex distance, max UV error, max color error)
+    tuple, MG2 files get the coarsest precisions meeting it instead of the
+    vertex (relative to the average edge length), UV and color precisions.
+
+    With objective ("SIZE", "DECODE" or "BALANCED") every SWEEP_CANDIDATES
+    method/level is encoded and the best one by that objective is kept
+    instead of method and level. sweep_report also writes the measured table
+    next to each file.
+    """
+
+    def __init__(self, method=CTM_METHOD_MG1, vertex_precision=0.01, normal_precision=1.0 / 256.0,
+                 uv_precision=1.0 / 1024.0, colour_precision=1.0 / 256.0, comment=EXPORT_COMMENT,
+                 error_budget=None, level=None, objective=None, sweep_report=False):
+        self.method = method
+        self.level = level
+        self.objective = objective
+        self.sweep_report = sweep_report
+        self.vertex_precision = vertex_precision
+        self.normal_precision = normal_precision
+        self.uv_precision = uv_precision
+        self.colour_precision = colour_precision
+        self.comment = comment
+        self.error_budget = error_budget
+
+
+def merge_meshes(export_meshes):
+    """Concatenate several ExportMesh into one, offsetting the indices"""
+    offsets = np.cumsum([0] + [len(part.vertices) for part in export_meshes[:-1]], dtype=np.uint32)
+    indices = np.concatenate([part.indices + offset for part, offset in zip(export_meshes, offsets)])
+
+    def merged(attribute):
+        arrays = [getattr(part, attribute) for part in export_meshes]
+        return None if arrays[0] is None else np.concatenate(arrays)
+
+    def merged_maps(attribute, channels):
+        # Maps are matched by name, parts without one get zeros
+        names = list(dict.fromkeys(name for part in export_meshes for name, _ in getattr(part, attribute)))
+        maps = []
+        for name in names[:MAX_MAPS]:
+            arrays = [dict(getattr(part, attribute)).get(name) for part in export_meshes]
+            arrays = [np.zeros((len(part.vertices), channels), dtype=np.float32) if array is None else array
+                      for part, array in zip(export_meshes, arrays)]
+            maps.append((name, np.concatenate(arrays)))
+        return maps
+
+    return ExportMesh(merged("vertices"), indices, merged("normals"), merged_maps("uv_maps", 2),
+                      merged_maps("attrib_maps", 4))
+
+
+def encode_file(target, export_mesh, settings, precisions=None):
+    """Compress and write an ExportMesh to a file path, a bytearray or a
+    binary file object. Safe to run off the main thread, the OpenCTM library
+    and LZMA release the GIL while encoding.
+
+    Returns {"size": file size} plus, for automatic MG2 precisions,
+    "precisions": {name: (precision, max error)}. These can be passed in when
+    already known."""
+    filepath = _label(target)
+    result = {}
+    if settings.method != CTM_METHOD_MG2 or settings.error_budget is None:
+        precisions = {}
+    elif precisions is None:
+        with phase("precision", filepath):
+            precisions = auto_precisions(export_mesh, *settings.error_budget)
+    if precisions:
+        result["precisions"] = precisions
+
+    # A pooled OpenCTM context, its buffers hold the arrays needing a copy
+    # until ctmSave
+    with pooled_context(CTM_EXPORT) as ctm_context:
+        ctm = ctm_context.handle
+        vertices = ctm_context.array(export_mesh.vertices, np.float32)
+        indices = ctm_context.array(export_mesh.indices, np.uint32)
+        p_vertices = vertices.ctypes.data_as(POINTER(c_float))
+        p_indices = indices.ctypes.data_as(POINTER(c_uint))
+        if export_mesh.normals is not None:
+            normals = ctm_context.array(export_mesh.normals, np.float32)
+            p_normals = normals.ctypes.data_as(POINTER(c_float))
+        else:
+            p_normals = POINTER(c_float)()
+
+        # Set the file comment
+        ctmFileComment(ctm, c_char_p(_encode(settings.comment)))
+
+        # Define the mesh
+        with phase("ctmDefineMesh", filepath, array_bytes(vertices, indices, export_mesh.normals)):
+            ctmDefineMesh(ctm, p_vertices, c_uint(len(vertices)), p_indices, c_uint(len(indices)), p_normals)
+
+        # Add the UV maps, kept alive until ctmSave
+        map_arrays = []
+        for uv_name, uv_coords in export_mesh.uv_maps:
+            uv_coords = ctm_context.array(uv_coords, np.float32)
+            map_arrays.append(uv_coords)
+            tm = ctmAddUVMap(ctm, uv_coords.ctypes.data_as(POINTER(c_float)), c_char_p(_encode(uv_name) or None),
+                             c_char_p())
+            if settings.method == CTM_METHOD_MG2:
+                ctmUVCoordPrecision(ctm, tm, precisions.get("uv", (settings.uv_precision,))[0])
+
+        # Add the colors and other attributes
+        for attrib_name, values in export_mesh.attrib_maps:
+            values = ctm_context.array(values, np.float32)
+            map_arrays.append(values)
+            am = ctmAddAttribMap(ctm, values.ctypes.data_as(POINTER(c_float)), c_char_p(_encode(attrib_name)))
+            if settings.method == CTM_METHOD_MG2:
+                ctmAttribPrecision(ctm, am, precisions.get("colour", (settings.colour_precision,))[0])
+
+        # Set compression method
+        if "vertex" in precisions:
+            ctmVertexPrecision(ctm, precisions["vertex"][0])
+        elif settings.method == CTM_METHOD_MG2:
+            ctmVertexPrecisionRel(ctm, settings.vertex_precision)
+        if settings.method == CTM_METHOD_MG2:
+            if export_mesh.normals is not None:
+                ctmNormalPrecision(ctm, settings.normal_precision)
+        ctmCompressionMethod(ctm, settings.method)
+        if settings.level is not None:
+            ctmCompressionLevel(ctm, settings.level)
+
+        # Save the file
+        with phase("ctmSave", filepath) as timing:
+            if _is_path(target):
+                ctmSave(ctm, c_char_p(_encode(filepath)))
+                size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+            else:
+                size = ctmSaveStream(ctm, target)
+            timing.bytes = size
+
+        # Check for errors
+        ctm_context.check("Could not save the file")
+
+    result["size"] = size
+    return result
+
+
+def lod_jobs(jobs, levels):
+    """(filepath, ExportMesh) jobs followed by levels LODs of each mesh as
+    <name>_LOD1.ctm, <name>_LOD2.ctm... next to it, each LOD_REDUCTION times
+    fewer triangles than the one before"""
+    chain = []
+    for filepath, export_mesh in jobs:
+        chain.append((filepath, export_mesh))
+        root, extension = os.path.splitext(filepath)
+        triangle_count = len(export_mesh.indices)
+        lod = export_mesh
+        for level, count in enumerate(lod_triangle_counts(triangle_count // LOD_REDUCTION, levels, triangle_count), 1):
+            with phase("lod", filepath):
+                lod = lod.decimated(count)
+            chain.append((f"{root}_LOD{level}{extension}", lod))
+    return chain
+
+
+def export_files(jobs, settings, workers=0):
+    """Encode (filepath, ExportMesh) jobs in a thread pool, encode_file()
+    targets other than file paths work too.
+
+    Returns (results, errors): the (filepath, encode_file result) pairs of
+    the files written and the (filepath, exception) pairs of those that
+    failed."""
+    workers = workers or os.cpu_count() or 1
+    results = []
+    errors = []
+    if settings.objective is not None:
+        # Files one after the other, the candidates of each in parallel
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for filepath, export_mesh in jobs:
+                try:
+                    results.append((filepath, sweep_file(filepath, export_mesh, settings, executor)))
+                except Exception as e:
+                    errors.append((filepath, e))
+        return results, errors
+
+    if len(jobs) == 1 or workers == 1:
+        for filepath, export_mesh in jobs:
+            try:
+                results.append((filepath, encode_file(filepath, export_mesh, settings)))
+            except Exception as e:
+                errors.append((filepath, e))
+        return results, errors
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(filepath, executor.submit(encode_file, filepath, export_mesh, settings))
+                   for filepath, export_mesh in jobs]
+        for filepath, future in futures:
+            error = future.exception()
+            if error is not None:
+                errors.append((filepath, error))
+            else:
+                results.append((filepath, future.result()))
+    return results, errors
+
+
+def _encode_candidate(target, export_mesh, settings, precisions):
+    start = time.perf_counter()
+    result = encode_file(target, export_mesh, settings, precisions)
+    result["encode_seconds"] = time.perf_counter() - start
+    return result
+
+
+def decode_seconds(source):
+    """Time ctmLoad of a file path, buffer or binary file object"""
+    with pooled_context(CTM_IMPORT) as ctm:
+        start = time.perf_counter()
+        _load(ctm.handle, source)
+        seconds = time.perf_counter() - start
+        ctm.check("Could not load the file")
+    return seconds
+
+
+def sweep_winner(rows, objective):
+    """Best row of a sweep table: smallest file ("SIZE"), fastest decode
+    ("DECODE") or lowest sum of size and decode time, each relative to the
+    best candidate ("BALANCED")"""
+    if objective == "SIZE":
+        return min(rows, key=lambda row: (row["size"], row["decode_seconds"]))
+    if objective == "DECODE":
+        return min(rows, key=lambda row: (row["decode_seconds"], row["size"]))
+    smallest = min(row["size"] for row in rows) or 1
+    fastest = min(row["decode_seconds"] for row in rows) or 1e-9
+    return min(rows, key=lambda row: row["size"] / smallest + row["decode_seconds"] / fastest)
+
+
+def sweep_file(target, export_mesh, settings, executor):
+    """Encode an ExportMesh with every SWEEP_CANDIDATES method/level in the
+    executor and write the best one by settings.objective to target (a file
+    path, a bytearray or a binary file object).
+
+    Candidates are encoded in memory, decode times are measured one
+    candidate at a time once all are encoded (best of SWEEP_DECODE_RUNS
+    loads). Returns the encode_file result of the winner plus "method",
+    "level" and "sweep", the table of every candidate."""
+    filepath = _label(target)
+    precisions = None
+    if settings.error_budget is not None:
+        # Shared by the MG2 candidates
+        with phase("precision", filepath):
+            precisions = auto_precisions(export_mesh, *settings.error_budget)
+
+    candidates = []
+    for method, level in SWEEP_CANDIDATES:
+        candidate = copy.copy(settings)
+        candidate.method = method
+        candidate.level = level
+        candidate.objective = None
+        data = bytearray()
+        future = executor.submit(_encode_candidate, data, export_mesh, candidate, precisions)
+        candidates.append((method, level, data, future))
+
+    results = [future.result() for _, _, _, future in candidates]
+    rows = []
+    for (method, level, data, _), result in zip(candidates, results):
+        with phase("sweep decode", filepath, len(data)):
+            seconds = min(decode_seconds(data) for _ in range(SWEEP_DECODE_RUNS))
+        rows.append({
+            "method": METHOD_NAMES[method],
+            "level": level,
+            "size": result["size"],
+            "encode_seconds": result["encode_seconds"],
+            "decode_seconds": seconds,
+            "data": data,
+            "result": result,
+        })
+    best = sweep_winner(rows, settings.objective)
+    if _is_path(target):
+        with open(target, "wb") as stream:
+            stream.write(best["data"])
+    elif isinstance(target, bytearray):
+        target += best["data"]
+    else:
+        target.write(best["data"])
+
+    table = [{key: row[key] for key in ("method", "level", "size", "encode_seconds", "decode_seconds")}
+             for row in rows]
+    result = dict(best["result"], method=best["method"], level=best["level"], sweep=table)
+    if settings.sweep_report and _is_path(target):
+        with open(os.fspath(target) + ".sweep.json", "w", encoding="utf-8") as stream:
+            json.dump({"file": os.path.basename(target), "objective": settings.objective,
+                       "method": best["method"], "level": best["level"], "candidates": table},
+                      stream, indent=1)
+    return result
+
+
+def export_archive(archive, jobs, settings, workers=0):
+    """export_files() into a zip archive, the jobs naming archive members.
+    Files are encoded in memory and stored as they are, OpenCTM data does
+    not compress further.
+
+    Returns (results, errors) like export_files(), by member name."""
+    buffers = [(name, bytearray(), export_mesh) for name, export_mesh in jobs]
+    names = {id(data): name for name, data, _ in buffers}
+    results, errors = export_files([(data, export_mesh) for _, data, export_mesh in buffers], settings, workers)
+    results = [(names[id(data)], result) for data, result in results]
+    errors = [(names[id(data)], error) for data, error in errors]
+
+    failed = {name for name, _ in errors}
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zip_file:
+        for name, data, _ in buffers:
+            if name not in failed:
+                zip_file.writestr(name, data)
+    return results, errors
+
+
+def _decode(value):
+    return value.decode("utf-8", "replace") if value else ""
+
+
+def _encode(_filename):
+    try:
+        return str(_filename).encode("utf-8")
+    except UnicodeEncodeError:
+        pass
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Bump when the layout of the cached arrays changes
+CACHE_VERSION = 1
+_INFO_FILE = "info.json"
+_HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_digest(filepath):
+    """Hash of the file contents, the same on every machine"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filepath, "rb") as stream:
+        for block in iter(lambda: stream.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stat_digest(filepath):
+    """Hash of the path, size and modification time of the file, cheap but
+    only valid on one machine"""
+    stat = os.stat(filepath)
+    key = f"{os.path.abspath(filepath)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=20).hexdigest()
+
+
+class DecodeCache:
+    """On-disk cache of decoded meshes, one directory of .npy arrays per file.
+
+    Entries are keyed by a hash of the file (contents, or path, size and
+    mtime with by_content=False) and of the decode variant, and are read back
+    memory-mapped. The least recently used entries are removed by evict()
+    once the cache grows past max_size bytes.
+    """
+
+    def __init__(self, directory, max_size, by_content=False):
+        self.directory = directory
+        self.max_size = max_size
+        self.by_content = by_content
+
+    def key(self, filepath, variant=""):
+        digest = file_digest(filepath) if self.by_content else file_stat_digest(filepath)
+        return hashlib.blake2b(f"{CACHE_VERSION}\0{digest}\0{variant}".encode("utf-8"),
+                               digest_size=20).hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """(arrays, info) of a cached entry with read-only memory-mapped
+        arrays, or None on a miss"""
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, _INFO_FILE), "r", encoding="utf-8") as stream:
+                info = json.load(stream)
+            arrays = {name: np.load(os.path.join(entry, name + ".npy"), mmap_mode="r")
+                      for name in info.pop("arrays")}
+            # Directory mtime is the LRU clock
+            os.utime(entry)
+        except (OSError, ValueError, KeyError):
+            return None
+        return arrays, info
+
+    def put(self, key, arrays, info=None):
+        """Store named arrays and a JSON serializable info dict. Safe to call
+        from several threads or processes, the entry appears atomically."""
+        entry = self._entry(key)
+        if os.path.isdir(entry):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(staging, name + ".npy"), np.ascontiguousarray(array))
+            info = dict(info or {}, arrays=list(arrays))
+            with open(os.path.join(staging, _INFO_FILE), "w", encoding="utf-8") as stream:
+                json.dump(info, stream)
+            os.rename(staging, entry)
+        except OSError:
+            # Another writer won the race, or the cache location is not writable
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _entries(self):
+        """(last use, size, path) of every entry"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(file.stat().st_size for file in os.scandir(path))
+                entries.append((os.stat(path).st_mtime, size, path))
+            except OSError:
+                continue
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in
+        max_size bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            shutil.rmtree(path, ignore_errors=True)
@@ -1,16 +1,274 @@
 import bpy
+import functools
+import hashlib
+import os
+import time
+import zipfile
 import numpy as np
-from bpy_extras.io_utils import ImportHelper, ExportHelper, axis_conversion, orientation_helper
+from mathutils import Matrix
+from bpy_extras.io_utils import ImportHelper, axis_conversion, orientation_helper
 from .openctm import *
+from .ctm_io import (
+    MAX_MAPS,
+    ArchiveMember,
+    ExportMesh,
+    ExportSettings,
+    DecodeQueue,
+    add_lods,
+    lod_jobs,
+    load_file,
+    decoded_files,
+    merge_meshes,
+    mesh_fingerprint,
+    export_files,
+    archive_members,
+    export_archive
+)
+from .preferences import decode_cache, memory_limit, trace_settings
+from .mesh_optimize import weld_corners, locality_order
+from .profiling import array_bytes, phase
+from . import profiling
+from .mesh_utils import (
+    build_triangle_mesh,
+    loop_vertex_indices,
+    add_uv_layer,
+    add_color_attribute,
+    set_custom_normals,
+    triangle_vertex_indices,
+    vertex_positions,
+    vertex_normals,
+    vertex_uv_coords,
+    vertex_attribute_values,
+    triangle_loop_indices,
+    loop_uv_coords,
+    loop_attribute_values,
+    float_attributes,
+    transform_points,
+    transform_normals
+)
 from bpy.props import (
     BoolProperty,
+    CollectionProperty,
     IntProperty,
-    IntVectorProperty,
     StringProperty,
-    PointerProperty,
     EnumProperty
 )
 
+# Seconds between checks for decoded files, and main thread time spent
+# building meshes per check, in background imports
+BACKGROUND_POLL_INTERVAL = 0.1
+BACKGROUND_BUILD_TIME = 0.05
+
+# Custom property of proxy objects: where and how to load the full resolution
+PROXY_PROPERTY = "openctm_proxy"
+# Custom property of meshes imported with "Instance Duplicates": their
+# instance key and level, "<key>/<level>", level 0 the full mesh and 1... its
+# LODs. Later imports link them instead of building the same meshes again.
+INSTANCE_PROPERTY = "openctm_instance"
+
+COMPRESSION_METHODS = {
+    "MG1": CTM_METHOD_MG1,
+    "MG2": CTM_METHOD_MG2,
+    "RAW": CTM_METHOD_RAW,
+}
+
+
+def _stop_trace(operator, filepath):
+    trace = profiling.stop()
+    operator.report({'INFO'}, trace.summary())
+    if filepath:
+        try:
+            trace.write(filepath)
+        except OSError as e:
+            operator.report({'WARNING'}, f"Could not write the trace: {e}")
+
+
+def _traced(name):
+    """Record a profiling trace around an operator's execute() when enabled in
+    the add-on preferences, reporting its summary. A modal operator stops the
+    trace itself with _stop_trace(self, self.trace_file)."""
+    def decorate(execute):
+        @functools.wraps(execute)
+        def wrapper(self, context):
+            enabled, filepath, track_memory = trace_settings(context)
+            if not enabled:
+                return execute(self, context)
+            profiling.start(name, track_memory)
+            result = {'CANCELLED'}
+            try:
+                result = execute(self, context)
+            finally:
+                if 'RUNNING_MODAL' in result:
+                    self.trace_file = filepath
+                else:
+                    _stop_trace(self, filepath)
+            return result
+        return wrapper
+    return decorate
+
+
+def create_object(context, decoded, transform_matrix, select=True, instances=None, proxy=None, normals=True):
+    """Build and link the Blender object of a DecodedMesh, and hidden
+    <name>_LOD<n> objects of its decoded.lods, main thread only.
+
+    instances is a {instance key: meshes} dict, see existing_instances(),
+    files matching an earlier one then link its meshes instead of building
+    others (the decode workers compute decoded.fingerprint, see
+    decoded_files()). proxy
+    is stored on the object as PROXY_PROPERTY, marking it as a preview for
+    OpenCTMLoadFullResolution. With normals, the normals of the file become
+    custom normals. decoded is released once built."""
+    name = os.path.splitext(os.path.basename(decoded.filepath))[0] or "ImportedObject"
+    meshes = None
+    try:
+        if instances is not None:
+            fingerprint = decoded.fingerprint
+            if fingerprint is None:
+                with phase("fingerprint", decoded.filepath, array_bytes(decoded.vertices, decoded.indices)):
+                    fingerprint = mesh_fingerprint(decoded)
+            key = instance_key(fingerprint, transform_matrix, normals, len(decoded.lods))
+            meshes = instances.get(key)
+            if meshes is not None and len(meshes) != 1 + len(decoded.lods):
+                # LOD meshes of an earlier import were deleted
+                meshes = None
+        if meshes is None:
+            meshes = [create_mesh(level, name, transform_matrix, normals) for level in [decoded] + decoded.lods]
+            if instances is not None:
+                for level, mesh in enumerate(meshes):
+                    mesh[INSTANCE_PROPERTY] = f"{key}/{level}"
+                instances[key] = meshes
+    finally:
+        decoded.release()
+
+    with phase("link", decoded.filepath):
+        mesh_obj = bpy.data.objects.new(name=name, object_data=meshes[0])
+        context.scene.collection.objects.link(mesh_obj)
+        if proxy is not None:
+            mesh_obj[PROXY_PROPERTY] = proxy
+        for level, mesh in enumerate(meshes[1:], 1):
+            lod_obj = bpy.data.objects.new(name=f"{name}_LOD{level}", object_data=mesh)
+            context.scene.collection.objects.link(lod_obj)
+            lod_obj.hide_set(True)
+
+    if select:
+        mesh_obj.select_set(True)
+    return mesh_obj
+
+
+def instance_key(fingerprint, transform_matrix, normals, lod_count):
+    """INSTANCE_PROPERTY key of the meshes of a file: its mesh_fingerprint()
+    and the import settings the meshes depend on"""
+    settings = (fingerprint, [tuple(row) for row in transform_matrix], normals, lod_count)
+    return hashlib.blake2b(repr(settings).encode(), digest_size=16).hexdigest()
+
+
+def existing_instances():
+    """{instance key: meshes} of the meshes earlier imports marked with
+    INSTANCE_PROPERTY, so duplicates of files imported before link them"""
+    levels = {}
+    for mesh in bpy.data.meshes:
+        value = mesh.get(INSTANCE_PROPERTY)
+        if not isinstance(value, str) or "/" not in value:
+            continue
+        key, level = value.rsplit("/", 1)
+        levels.setdefault(key, {})[int(level)] = mesh
+    instances = {}
+    for key, meshes in levels.items():
+        # Keep the complete ones, full mesh and every LOD
+        if sorted(meshes) == list(range(len(meshes))):
+            instances[key] = [meshes[level] for level in range(len(meshes))]
+    return instances
+
+
+def proxy_info(source, transform_matrix, uv, colour, normals):
+    """PROXY_PROPERTY value of the proxy of a file path or ArchiveMember"""
+    archive, member = (source.archive, source.member) if isinstance(source, ArchiveMember) else (source, "")
+    return {"filepath": archive, "member": member, "uv": uv, "colour": colour, "normals": normals,
+            "matrix": [value for row in transform_matrix for value in row]}
+
+
+def create_mesh(decoded, name, transform_matrix, normals=True):
+    """Build the Blender mesh of a DecodedMesh, main thread only. Vertices
+    (and normals) are transformed in NumPy before the mesh is built, with
+    normals the normals of the file become custom normals."""
+    label = decoded.filepath
+    mesh = bpy.data.meshes.new(name=name)
+    with phase("transform", label, array_bytes(decoded.vertices)):
+        vertices = transform_points(decoded.vertices, transform_matrix)
+    with phase("build", label, array_bytes(vertices, decoded.indices)):
+        build_triangle_mesh(mesh, vertices, decoded.indices)
+
+    if decoded.uv_maps:
+        with phase("uv", label, array_bytes(*(uv_coords for _, uv_coords in decoded.uv_maps))):
+            loop_vertices = loop_vertex_indices(mesh)
+            for uv_name, uv_coords in decoded.uv_maps:
+                add_uv_layer(mesh, uv_name, uv_coords, loop_vertices)
+
+    if decoded.attrib_maps:
+        with phase("color", label, array_bytes(*(values for _, values in decoded.attrib_maps))):
+            # Attribute maps become color attributes, the first one active
+            for map_index, (attrib_name, values) in enumerate(decoded.attrib_maps):
+                add_color_attribute(mesh, attrib_name, values, active=map_index == 0)
+    with phase("update", label):
+        mesh.update(calc_edges=True)
+    if normals and decoded.normals is not None:
+        with phase("normals", label, array_bytes(decoded.normals)):
+            set_custom_normals(mesh, transform_normals(decoded.normals, transform_matrix))
+    return mesh
+
+
+def import_files(context, filepaths, uv=True, colour=True, select=True,
+                 axis_forward="Z", axis_up="Y", workers=0, cache=None, instance=False,
+                 lod="FULL", lod_triangles=100000, lod_levels=1, normals=True, max_memory=None):
+    """Import many .ctm files, decoding them in a thread pool while the
+    Blender objects are created on the calling (main) thread. With a
+    DecodeCache, files decoded before are read back from it. With instance,
+    files with identical contents share one mesh, also with the meshes of
+    earlier imports (see existing_instances()). lod "PROXY" builds
+    simplified proxies of about lod_triangles triangles, "LODS" adds
+    lod_levels LOD objects to the full resolution ones. With normals, the
+    normals of the files become custom normals. max_memory is the memory
+    ceiling of each decode in bytes, see decode_file().
+
+    Returns (objects, errors), errors being (filepath, exception) pairs of
+    the files that failed to import."""
+    workers = workers or os.cpu_count() or 1
+    transform_matrix = axis_conversion(
+        from_forward=axis_forward,
+        from_up=axis_up,
+    ).to_4x4()
+
+    objects = []
+    errors = []
+    instances = existing_instances() if instance else None
+    prepare = lod_preparation(lod, lod_triangles, lod_levels)
+    for filepath, decoded in decoded_files(list(filepaths), uv, colour, workers, cache, prepare, instance,
+                                           max_memory):
+        if isinstance(decoded, Exception):
+            errors.append((filepath, decoded))
+        else:
+            proxy = proxy_info(filepath, transform_matrix, uv, colour, normals) if lod == "PROXY" else None
+            objects.append(create_object(context, decoded, transform_matrix, select, instances, proxy, normals))
+    if cache is not None:
+        cache.evict()
+    return objects, errors
+
+
+def lod_preparation(lod, triangles, levels):
+    # Worker side of the "PROXY"/"LODS" imports, None for full resolution
+    if lod == "PROXY":
+        return functools.partial(add_lods, triangles=triangles, levels=1, proxy=True)
+    if lod == "LODS":
+        return functools.partial(add_lods, triangles=triangles, levels=levels)
+    return None
+
+
+def _instanced(objects):
+    # Report suffix counting the objects sharing the mesh of another one
+    instanced = len(objects) - len({obj.data.name for obj in objects})
+    return f", {instanced} as instances" if instanced else ""
+
+
 @orientation_helper(axis_forward="Z", axis_up="Y")
 class OpenCTMImport(bpy.types.Operator, ImportHelper):
     """Import from OpenCTM Format"""
@@ -19,12 +277,39 @@ class OpenCTMImport(bpy.types.Operator, ImportHelper):
     filename_ext = ".ctm"
 
     filepath: StringProperty(subtype="FILE_PATH")
-    filter_glob: StringProperty(default="*.ctm", options={'HIDDEN'})
-
-    uv_pref: BoolProperty(name="UV", description="Import UV", default=True)
-    colour_pref: BoolProperty(name="Color", description="Import vertex colors", default=True)
+    filter_glob: StringProperty(default="*.ctm;*.zip", options={'HIDDEN'})
+    files: CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+    directory: StringProperty(subtype="DIR_PATH", options={'HIDDEN', 'SKIP_SAVE'})
+
+    uv_pref: BoolProperty(name="UV", description="Import all UV maps", default=True)
+    colour_pref: BoolProperty(name="Color", description="Import vertex colors and other attribute maps", default=True)
+    normal_pref: BoolProperty(name="Normals", description="Import the normals of the file as custom normals",
+                              default=True)
     select_pref: BoolProperty(name="Select", description="Select imported object after completion",
                                         default=True)
+    threads_pref: IntProperty(name="Threads", description="Files decoded in parallel (0 = one per CPU core)",
+                              default=0, min=0, max=256)
+    background_pref: BoolProperty(name="Background",
+                                  description="Decode in the background and keep working, Esc cancels",
+                                  default=False)
+    instance_pref: BoolProperty(name="Instance Duplicates",
+                                description="Files with identical geometry, UVs and colors share one mesh, "
+                                            "imported as linked duplicates",
+                                default=False)
+    lod_pref: EnumProperty(
+        name="Detail",
+        description="Which meshes to build",
+        items=[("FULL", "Full", "Full resolution meshes"),
+               ("PROXY", "Proxy", "Simplified meshes to lay out quickly, Object > Load OpenCTM Full Resolution "
+                                  "swaps in the full resolution"),
+               ("LODS", "Full + LODs", "Full resolution meshes plus hidden, simplified LOD objects"),],
+        default="FULL"
+    )
+    lod_triangles: IntProperty(name="Triangles",
+                               description="Triangles of a proxy or of the first LOD, each further LOD has a "
+                                           "quarter of the one before",
+                               default=100000, min=100)
+    lod_levels: IntProperty(name="Levels", description="Number of LOD objects", default=2, min=1, max=8)
 
     def draw(self, context):
         box = self.layout.box()
@@ -35,96 +320,304 @@ class OpenCTMImport(bpy.types.Operator, ImportHelper):
         row1 = box.row()
         row1.prop(self, "uv_pref")
         row1.prop(self, "colour_pref")
+        row1.prop(self, "normal_pref")
         row2 = box.row()
         row2.prop(self, "select_pref")
+        row2.prop(self, "background_pref")
+        box.prop(self, "instance_pref")
+        box.prop(self, "threads_pref")
 
+        box = self.layout.box()
+        box.prop(self, "lod_pref")
+        if self.lod_pref != "FULL":
+            box.prop(self, "lod_triangles")
+        if self.lod_pref == "LODS":
+            box.prop(self, "lod_levels")
+
+    def filepaths(self):
+        """Selected files, or every .ctm/.zip file of the directory if none
+        is. Zip archives are replaced by the .ctm files they hold."""
+        names = [file.name for file in self.files if file.name]
+        if names:
+            filepaths = [os.path.join(self.directory, name) for name in names]
+        elif self.directory and not os.path.isfile(self.filepath):
+            filepaths = sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                               if name.lower().endswith((".ctm", ".zip")))
+        else:
+            filepaths = [self.filepath]
+
+        sources = []
+        for filepath in filepaths:
+            if not filepath.lower().endswith(".zip"):
+                sources.append(filepath)
+                continue
+            try:
+                sources.extend(archive_members(filepath))
+            except (OSError, zipfile.BadZipFile) as e:
+                self.report({'ERROR'}, f"{filepath}: {e}")
+        return sources
+
+    @_traced("import")
     def execute(self, context):
-        self.report({'INFO'}, f"Importing: {self.filepath}...")
+        filepaths = self.filepaths()
+        if not filepaths:
+            self.report({'ERROR'}, f"No .ctm files in {self.directory or self.filepath}")
+            return {'CANCELLED'}
+        if len(filepaths) == 1:
+            self.report({'INFO'}, f"Importing: {filepaths[0]}...")
+        else:
+            self.report({'INFO'}, f"Importing {len(filepaths)} files...")
         # Ensure there's at least one object
         if bpy.data.objects:
-            if bpy.context.object and bpy.context.object.mode != 'OBJECT':
+            if context.object and context.object.mode != 'OBJECT':
                 bpy.ops.object.mode_set(mode='OBJECT')
             bpy.ops.object.select_all(action='DESELECT')
 
-        ctm_context = ctmNewContext(CTM_IMPORT)
+        if self.background_pref and context.window is not None:
+            return self.start_background(context, filepaths)
+
+        objects, errors = import_files(context, filepaths, self.uv_pref, self.colour_pref, self.select_pref,
+                                       self.axis_forward, self.axis_up, self.threads_pref, decode_cache(context),
+                                       self.instance_pref, self.lod_pref, self.lod_triangles, self.lod_levels,
+                                       self.normal_pref, memory_limit(context))
+        for filepath, error in errors:
+            self.report({'ERROR'}, f"{filepath}: {error}")
+        if not objects:
+            return {'CANCELLED'}
+
+        if len(filepaths) == 1:
+            self.report({'INFO'}, f"Imported: {filepaths[0]}")
+        else:
+            self.report({'INFO'}, f"Imported {len(objects)} of {len(filepaths)} files{_instanced(objects)}")
+        return {'FINISHED'}
+
+    def start_background(self, context, filepaths):
+        self.queue = DecodeQueue(filepaths, self.uv_pref, self.colour_pref, self.threads_pref,
+                                 decode_cache(context),
+                                 lod_preparation(self.lod_pref, self.lod_triangles, self.lod_levels),
+                                 self.instance_pref, memory_limit(context))
+        self.transform_matrix = axis_conversion(
+            from_forward=self.axis_forward,
+            from_up=self.axis_up,
+        ).to_4x4()
+        self.objects = []
+        self.errors = []
+        self.instances = existing_instances() if self.instance_pref else None
+
+        window_manager = context.window_manager
+        self.timer = window_manager.event_timer_add(BACKGROUND_POLL_INTERVAL, window=context.window)
+        window_manager.progress_begin(0, len(filepaths))
+        window_manager.modal_handler_add(self)
+        self.update_status(context)
+        return {'RUNNING_MODAL'}
+
+    def update_status(self, context):
+        queue = self.queue
+        context.window_manager.progress_update(queue.finished)
+        context.workspace.status_text_set(
+            f"Importing OpenCTM: {queue.finished} of {queue.total} files, Esc to cancel")
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            self.queue.cancel()
+            return self.finish_background(context, cancelled=True)
+        # The only timer of the operator is its own (event_timer_add)
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
         try:
-            ctmLoad(ctm_context, _encode(self.filepath))
-            err = ctmGetError(ctm_context)
-            if err != CTM_NONE:
-                raise IOError("Error loading file: %s" % str(ctmErrorString(err)))
-
-            mesh = bpy.data.meshes.new(name="ImportedMesh")
-
-            # read vertices
-            vertex_count = ctmGetInteger(ctm_context, CTM_VERTEX_COUNT)
-            vertex_ctm = ctmGetFloatArray(ctm_context, CTM_VERTICES)
-
-            vertices = np.fromiter(vertex_ctm,
-                                   dtype=float,
-                                   count=vertex_count * 3).reshape((-1, 3))
-
-            # read faces
-            face_count = ctmGetInteger(ctm_context, CTM_TRIANGLE_COUNT)
-            face_ctm = ctmGetIntegerArray(ctm_context, CTM_INDICES)
-            faces = np.fromiter(face_ctm, dtype=int,
-                                count=face_count * 3).reshape((-1, 3))
-
-            mesh.from_pydata(vertices=vertices, edges=[], faces=faces)
-
-            transform_matrix = axis_conversion(
-                from_forward=self.axis_forward,
-                from_up=self.axis_up,
-            ).to_4x4()
-
-            if self.uv_pref:
-                if ctmGetInteger(ctm_context, CTM_UV_MAP_COUNT) > 0:
-                    for map_index in range(8):
-                        uv_coords = ctmGetFloatArray(ctm_context, (0x0700 + map_index))
-                        if uv_coords:
-                            uv_name = ctmGetUVMapString(ctm_context, (0x0700 + map_index), CTM_NAME)
-                            uv_coords = np.fromiter(uv_coords, dtype=float, count=vertex_count * 2).reshape((-1, 2))
-                            if uv_name:
-                                uv_name = uv_name.decode("utf-8") + f"{map_index}"
-                            else:
-                                uv_name = f"{map_index}"
-                            uv_layer = mesh.uv_layers.new(name=f"UV{uv_name}")
-
-                            for poly in mesh.polygons:
-                                for loop_index in poly.loop_indices:
-                                    vertex_index = mesh.loops[loop_index].vertex_index
-                                    uv = uv_coords[vertex_index]
-                                    uv_layer.data[loop_index].uv = (uv[0], uv[1])
-
-            if self.colour_pref:
-                colour_map = ctmGetNamedAttribMap(ctm_context, c_char_p(_encode('Color')))
-                if colour_map != CTM_FALSE:
-                    color_3_layer = mesh.vertex_colors.new(name=f"RGBA")
-                    colours = ctmGetFloatArray(ctm_context, colour_map)
-                    colours = np.fromiter(colours, count=vertex_count * 4, dtype=float).reshape((-1, 4))
-
-                    for poly in mesh.polygons:
-                        for loop_index in poly.loop_indices:
-                            vertex_index = mesh.loops[loop_index].vertex_index
-                            color = colours[vertex_index]
-                            color_3_layer.data[loop_index].color = (color[0], color[1], color[2], color[3])
-
-                    mesh.vertex_colors.active = color_3_layer
-            mesh.update()
-
-
-            mesh_obj = bpy.data.objects.new(name="ImportedObject", object_data=mesh)
-            mesh_obj.data.transform(transform_matrix)
-            bpy.context.scene.collection.objects.link(mesh_obj)
-
-            if self.select_pref:
-                mesh_obj.select_set(True)
-
-        finally:
-            ctmFreeContext(ctm_context)
-
-        self.report({'INFO'}, "Imported: " + self.filepath)
+            self.build_finished(context)
+            self.update_status(context)
+        except Exception as e:
+            # Stop cleanly, a modal operator raising is dropped with its
+            # timer and progress still registered
+            self.report({'ERROR'}, f"Import failed: {e}")
+            self.queue.cancel()
+            return self.finish_background(context, cancelled=True)
+        if self.queue.done:
+            return self.finish_background(context)
+        return {'PASS_THROUGH'}
+
+    def build_finished(self, context):
+        # Build the decoded meshes, for a bounded time per timer event so the
+        # UI stays responsive
+        deadline = time.perf_counter() + BACKGROUND_BUILD_TIME
+        while time.perf_counter() < deadline:
+            results = self.queue.poll(1)
+            if not results:
+                break
+            for filepath, decoded in results:
+                if isinstance(decoded, Exception):
+                    self.errors.append((filepath, decoded))
+                else:
+                    proxy = None
+                    if self.lod_pref == "PROXY":
+                        proxy = proxy_info(filepath, self.transform_matrix, self.uv_pref, self.colour_pref,
+                                           self.normal_pref)
+                    self.objects.append(create_object(context, decoded, self.transform_matrix, self.select_pref,
+                                                      self.instances, proxy, self.normal_pref))
+
+    def finish_background(self, context, cancelled=False):
+        window_manager = context.window_manager
+        window_manager.event_timer_remove(self.timer)
+        window_manager.progress_end()
+        context.workspace.status_text_set(None)
+        self.queue.close()
+        if self.queue.cache is not None:
+            self.queue.cache.evict()
+
+        for filepath, error in self.errors:
+            self.report({'ERROR'}, f"{filepath}: {error}")
+        if cancelled:
+            self.report({'WARNING'}, f"Import cancelled, imported {len(self.objects)} of {self.queue.total} files")
+        else:
+            self.report({'INFO'}, f"Imported {len(self.objects)} of {self.queue.total} files{_instanced(self.objects)}")
+        if getattr(self, "trace_file", None) is not None:
+            _stop_trace(self, self.trace_file)
+        return {'CANCELLED'} if cancelled or not self.objects else {'FINISHED'}
+
+
+class OpenCTMLoadFullResolution(bpy.types.Operator):
+    """Replace the meshes of the selected OpenCTM proxies by the full resolution meshes of their files"""
+    bl_idname = "object.openctm_full_resolution"
+    bl_label = "Load OpenCTM Full Resolution"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return any(PROXY_PROPERTY in obj for obj in context.selected_objects)
+
+    @_traced("full resolution")
+    def execute(self, context):
+        # Proxies sharing a mesh (instances) get one full resolution mesh
+        proxies = {}
+        for obj in context.selected_objects:
+            if PROXY_PROPERTY in obj:
+                proxies.setdefault(obj.data.name, []).append(obj)
+
+        loaded = 0
+        cache = decode_cache(context)
+        for objects in proxies.values():
+            proxy = objects[0][PROXY_PROPERTY].to_dict()
+            source = ArchiveMember(proxy["filepath"], proxy["member"]) if proxy["member"] else proxy["filepath"]
+            try:
+                decoded = load_file(source, proxy["uv"], proxy["colour"], cache, memory_limit(context))
+            except Exception as e:
+                self.report({'ERROR'}, f"{source}: {e}")
+                continue
+            matrix = Matrix([proxy["matrix"][row:row + 4] for row in range(0, 16, 4)])
+            try:
+                mesh = create_mesh(decoded, objects[0].data.name, matrix, proxy.get("normals", True))
+            finally:
+                decoded.release()
+            proxy_mesh = objects[0].data
+            for obj in objects:
+                obj.data = mesh
+                del obj[PROXY_PROPERTY]
+            if proxy_mesh.users == 0:
+                bpy.data.meshes.remove(proxy_mesh)
+            loaded += len(objects)
+        if cache is not None:
+            cache.evict()
+        if not loaded:
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"Loaded the full resolution of {loaded} objects")
         return {'FINISHED'}
 
+
+def extract_mesh(obj, transform_matrix, normal=True, uv=True, colour=True, optimize=True):
+    """Gather the arrays of a mesh object, transformed by transform_matrix.
+    With optimize, vertices are split at UV/color seams and the mesh is
+    reordered for locality. Uses the Blender API, main thread only."""
+    with phase("gather", obj.name) as timing:
+        if optimize:
+            export_mesh = _extract_split_mesh(obj.data, transform_matrix, normal, uv, colour)
+        else:
+            export_mesh = _extract_mesh(obj.data, transform_matrix, normal, uv, colour)
+        timing.bytes = array_bytes(*export_mesh.arrays())
+    return export_mesh
+
+
+def _extract_split_mesh(mesh, transform_matrix, normal, uv, colour):
+    triangles = triangle_vertex_indices(mesh)
+    corner_vertices = triangles.ravel()
+    corner_loops = triangle_loop_indices(mesh).ravel()
+
+    # Every corner keeps its own UVs and corner attribute values, corners of a
+    # vertex with the same values share one exported vertex. Point attributes
+    # follow their vertex.
+    uv_layers = list(mesh.uv_layers)[:MAX_MAPS] if uv else []
+    attributes = float_attributes(mesh)[:MAX_MAPS] if colour else []
+    corner_uv_maps = [(uv_layer.name, loop_uv_coords(mesh, uv_layer)[corner_loops]) for uv_layer in uv_layers]
+    corner_attrib_maps = [(attribute.name, loop_attribute_values(mesh, attribute)[corner_loops])
+                          for attribute in attributes if attribute.domain == 'CORNER']
+    corner_attributes = [values for _, values in corner_uv_maps + corner_attrib_maps]
+    with phase("weld", mesh.name):
+        corners, indices = weld_corners(corner_vertices, corner_attributes)
+        source_vertices = corner_vertices[corners]
+        vertices = transform_points(vertex_positions(mesh)[source_vertices], transform_matrix)
+
+    with phase("reorder", mesh.name):
+        order, indices = locality_order(vertices, indices)
+        corners = corners[order]
+        source_vertices = source_vertices[order]
+        vertices = vertices[order]
+    vertex_count = len(vertices)
+
+    normals = None
+    if normal:
+        normals = transform_normals(vertex_normals(mesh)[source_vertices], transform_matrix)
+    uv_maps = [(uv_name, uv_coords[corners]) for uv_name, uv_coords in corner_uv_maps]
+    corner_values = dict(corner_attrib_maps)
+    attrib_maps = [(attribute.name, corner_values[attribute.name][corners] if attribute.domain == 'CORNER'
+                    else vertex_attribute_values(mesh, attribute)[source_vertices]) for attribute in attributes]
+    return ExportMesh(vertices, indices, normals, *_default_maps(uv_maps, attrib_maps, uv, colour, vertex_count))
+
+
+def _extract_mesh(mesh, transform_matrix, normal, uv, colour):
+    # Extract triangles and vertices from the Blender mesh
+    indices = triangle_vertex_indices(mesh)
+    vertices = transform_points(vertex_positions(mesh), transform_matrix)
+    vertex_count = len(vertices)
+
+    # Extract normals
+    normals = None
+    if normal:
+        normals = transform_normals(vertex_normals(mesh), transform_matrix)
+
+    # Extract UVs
+    uv_maps = []
+    if uv:
+        uv_maps = [(uv_layer.name, vertex_uv_coords(mesh, uv_layer)) for uv_layer in list(mesh.uv_layers)[:MAX_MAPS]]
+
+    # Extract colors and other float attributes
+    attrib_maps = []
+    if colour:
+        attrib_maps = [(attribute.name, vertex_attribute_values(mesh, attribute))
+                       for attribute in float_attributes(mesh)[:MAX_MAPS]]
+    return ExportMesh(vertices, indices, normals, *_default_maps(uv_maps, attrib_maps, uv, colour, vertex_count))
+
+
+def _default_maps(uv_maps, attrib_maps, uv, colour, vertex_count):
+    # Meshes without UVs or colors still get a zero UV map and a zero Color
+    # map when these are exported
+    if uv and not uv_maps:
+        uv_maps = [("", np.zeros((vertex_count, 2), dtype=np.float32))]
+    if colour and not attrib_maps:
+        attrib_maps = [("Color", np.zeros((vertex_count, 4), dtype=np.float32))]
+    return uv_maps, attrib_maps
+
+
+def object_filename(template, obj, index):
+    """File name of obj from a template with {name}, {collection} and {index}
+    fields"""
+    collection = obj.users_collection[0].name if obj.users_collection else ""
+    filename = template.format(name=bpy.path.clean_name(obj.name), collection=bpy.path.clean_name(collection),
+                               index=index)
+    if not filename.lower().endswith(".ctm"):
+        filename += ".ctm"
+    return filename
+
+
 @orientation_helper(axis_forward="Z", axis_up="Y")
 class OpenCTMExport(bpy.types.Operator, ImportHelper):
     """Export to OpenCTM Format"""
@@ -133,20 +626,100 @@ class OpenCTMExport(bpy.types.Operator, ImportHelper):
 
     filename_ext = ".ctm"
     filepath: StringProperty(subtype="FILE_PATH")
-    filter_glob: StringProperty(default="*.ctm", options={'HIDDEN'})
-
-    uv_pref: BoolProperty(name="UV", description="Export UV", default=True)
+    filter_glob: StringProperty(default="*.ctm;*.zip", options={'HIDDEN'})
+
+    scope_pref: EnumProperty(
+        name="Objects",
+        description="Which mesh objects to export",
+        items=[("SELECTED", "Selected", "Selected mesh objects"),
+               ("COLLECTION", "Collection", "Mesh objects of the active collection"),
+               ("SCENE", "Scene", "All mesh objects of the scene"),],
+        default="SELECTED"
+    )
+    merge_pref: BoolProperty(name="Merge", description="Merge all objects into one file, in world space",
+                             default=False)
+    name_template: StringProperty(
+        name="File Names",
+        description="File name of each object when exporting several objects, next to the chosen file. "
+                    "Fields: {name}, {collection}, {index}",
+        default="{name}.ctm"
+    )
+    threads_pref: IntProperty(name="Threads", description="Files compressed in parallel (0 = one per CPU core)",
+                              default=0, min=0, max=256)
+    optimize_pref: BoolProperty(name="Optimize",
+                                description="Split vertices at UV/color seams and reorder the mesh for locality, "
+                                            "smaller files that decode faster",
+                                default=True)
+    lod_chain_pref: BoolProperty(name="LOD Chain",
+                                 description="Also write simplified versions of each file, <name>_LOD1.ctm with a "
+                                             "quarter of the triangles, <name>_LOD2.ctm with a sixteenth...",
+                                 default=False)
+    lod_chain_levels: IntProperty(name="Levels", description="Number of LOD files per file", default=2, min=1, max=8)
+
+    uv_pref: BoolProperty(name="UV", description="Export all UV maps", default=True)
     normal_pref: BoolProperty(name="Normal", description="Export Normals", default=True)
-    colour_pref: BoolProperty(name="Color", description="Export Vertex colors", default=True)
+    colour_pref: BoolProperty(name="Color", description="Export vertex colors and other float attributes", default=True)
     compression_pref: EnumProperty(
         name="Algorithm",
         description="What type of compression algorithm the file use",
         items=[("MG1", "MG1", "MG1 Compression"),
                ("MG2", "MG2", "MG2 Compression"),
-               ("RAW", "Uncompressed", "No Compression (Raw)"),],
+               ("RAW", "Uncompressed", "No Compression (Raw)"),
+               ("SWEEP", "Best of", "Try every algorithm at several levels and keep the best file"),],
         default="MG1"
     )
+    level_pref: IntProperty(
+        name="Level",
+        description="LZMA compression level, higher is smaller but slower to write",
+        default=1,
+        min=0,
+        max=9
+    )
+    objective_pref: EnumProperty(
+        name="Keep",
+        description="Which file of the sweep is kept",
+        items=[("SIZE", "Smallest", "Smallest file"),
+               ("DECODE", "Fastest", "Fastest file to load"),
+               ("BALANCED", "Balanced", "Best tradeoff between file size and load time"),],
+        default="SIZE"
+    )
+    sweep_report_pref: BoolProperty(
+        name="Sweep Report",
+        description="Write the size and timings of every tried algorithm/level next to each file (.sweep.json)",
+        default=False
+    )
 
+    precision_pref: EnumProperty(
+        name="Precision",
+        description="How the MG2 quantization precisions are chosen",
+        items=[("MANUAL", "Manual", "Use the precisions below"),
+               ("AUTO", "Error Budget", "Coarsest precisions keeping the error of each mesh within the budgets"),],
+        default="MANUAL"
+    )
+    max_vertex_error: bpy.props.FloatProperty(
+        name="Max Vertex Error",
+        description="Largest distance between an exported and an original vertex",
+        subtype="DISTANCE",
+        default=0.001,
+        min=1e-7,
+        precision=5
+    )
+    max_uv_error: bpy.props.FloatProperty(
+        name="Max UV Error",
+        description="Largest difference between an exported and an original UV coordinate",
+        default=1.0 / 2048.0,
+        min=1e-7,
+        max=1.0,
+        precision=5
+    )
+    max_colour_error: bpy.props.FloatProperty(
+        name="Max Color Error",
+        description="Largest difference between an exported and an original color channel",
+        default=1.0 / 512.0,
+        min=1e-7,
+        max=1.0,
+        precision=5
+    )
     export_vprec: bpy.props.FloatProperty(
         name="Vertex Precision",
         description="Relative vertex precision (fixed point)",
@@ -181,188 +754,148 @@ class OpenCTMExport(bpy.types.Operator, ImportHelper):
         box.prop(self, "axis_forward")
         box.prop(self, "axis_up")
 
+        box = self.layout.box()
+        box.prop(self, "scope_pref")
+        box.prop(self, "merge_pref")
+        if not self.merge_pref:
+            box.prop(self, "name_template")
+        box.prop(self, "threads_pref")
+
         box = self.layout.box()
         row1 = box.row()
         row1.prop(self, "uv_pref")
         row1.prop(self, "colour_pref")
         row2 = box.row()
         row2.prop(self, "normal_pref")
+        row2.prop(self, "optimize_pref")
+        row3 = box.row()
+        row3.prop(self, "lod_chain_pref")
+        if self.lod_chain_pref:
+            row3.prop(self, "lod_chain_levels")
 
         box = self.layout.box()
         box.prop(self, "compression_pref")
+        if self.compression_pref == "SWEEP":
+            box.prop(self, "objective_pref")
+            box.prop(self, "sweep_report_pref")
+        elif self.compression_pref != "RAW":
+            box.prop(self, "level_pref")
+
+        if self.compression_pref in ("MG2", "SWEEP"):
+            box.prop(self, "precision_pref")
+            if self.precision_pref == "AUTO":
+                box.prop(self, "max_vertex_error")
+                box.prop(self, "export_nprec")
+                box.prop(self, "max_uv_error")
+                box.prop(self, "max_colour_error")
+            else:
+                box.prop(self, "export_vprec")
+                box.prop(self, "export_nprec")
+                box.prop(self, "export_uvprec")
+                box.prop(self, "export_cprec")
+
+    def export_objects(self, context):
+        if self.scope_pref == "COLLECTION":
+            objects = context.view_layer.active_layer_collection.collection.all_objects
+        elif self.scope_pref == "SCENE":
+            objects = context.scene.objects
+        else:
+            objects = context.selected_objects
+        return [obj for obj in objects if obj.type == 'MESH']
 
-        if self.compression_pref == "MG2":
-            box.prop(self, "export_vprec")
-            box.prop(self, "export_nprec")
-            box.prop(self, "export_uvprec")
-            box.prop(self, "export_cprec")
-
+    def extract(self, obj, transform_matrix):
+        return extract_mesh(obj, transform_matrix, self.normal_pref, self.uv_pref, self.colour_pref,
+                            self.optimize_pref)
 
+    @_traced("export")
     def execute(self, context):
+        objects = self.export_objects(context)
+        # OpenCTM files hold at least one triangle
+        faceless = [obj for obj in objects if not obj.data.polygons]
+        if faceless:
+            self.report({'WARNING'}, "Skipped objects without faces: " + ", ".join(obj.name for obj in faceless))
+            objects = [obj for obj in objects if obj.data.polygons]
+        if not objects:
+            self.report({'ERROR'}, "No mesh object to export")
+            return {'CANCELLED'}
+        if context.object and context.object.mode != 'OBJECT':
+            # Edit mode changes are not in the mesh data yet
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        archive = self.filepath.lower().endswith('.zip')
+        if not archive and not self.filepath.lower().endswith('.ctm'):
+            self.filepath += '.ctm'
         self.report({'INFO'}, f"Exporting: {self.filepath}...")
         transform_matrix = axis_conversion(
             from_forward=self.axis_forward,
             from_up=self.axis_up,
         ).to_4x4()
 
-        active_object = bpy.context.active_object
-
-        if active_object is not None:
-            if len(bpy.context.selected_objects) == 1:
-                active_object.data.transform(transform_matrix)
-                if not self.filepath.lower().endswith('.ctm'):
-                    self.filepath += '.ctm'
-
-
-                mesh = active_object.data
-
-                triangle_count = sum(2 if len(f.vertices) == 4 else 1 for f in mesh.polygons)
-                p_indices = cast((c_uint * (3 * triangle_count))(), POINTER(c_uint))
-
-                index = 0
-                for f in mesh.polygons:
-                    p_indices[index] = ctypes.c_uint(f.vertices[0])
-                    p_indices[index + 1] = ctypes.c_uint(f.vertices[1])
-                    p_indices[index + 2] = ctypes.c_uint(f.vertices[2])
-                    index += 3
-
-                    if len(f.vertices) == 4:
-                        p_indices[index] = ctypes.c_uint(f.vertices[0])
-                        p_indices[index + 1] = ctypes.c_uint(f.vertices[2])
-                        p_indices[index + 2] = ctypes.c_uint(f.vertices[3])
-                        index += 3
-
-                # Extract vertex array from the Blender mesh
-                vertex_count = len(mesh.vertices)
-                p_vertices = cast((c_float * (3 * vertex_count))(), POINTER(c_float))
-
-                for i, v in enumerate(mesh.vertices):
-                    p_vertices[3 * i] = ctypes.c_float(v.co.x)
-                    p_vertices[3 * i + 1] = ctypes.c_float(v.co.y)
-                    p_vertices[3 * i + 2] = ctypes.c_float(v.co.z)
-
-                # Extract normals
-                if self.normal_pref:
-                    p_normals = (ctypes.c_float * (3 * vertex_count))()
-                    for i, v in enumerate(mesh.vertices):
-                        p_normals[3 * i] = ctypes.c_float(v.normal.x)
-                        p_normals[3 * i + 1] = ctypes.c_float(v.normal.y)
-                        p_normals[3 * i + 2] = ctypes.c_float(v.normal.z)
-                else:
-                    p_normals = ctypes.POINTER(ctypes.c_float)()
-
-                # Extract UVs
-                if self.uv_pref:
-                    p_UV_coords = (ctypes.c_float * (2 * vertex_count))()
-
-                    if hasattr(mesh, "uv_layers") and mesh.uv_layers:
-                        uv_layer = mesh.uv_layers.active.data
-
-                        for f in mesh.polygons:
-                            for j, loop_index in enumerate(f.loop_indices):
-                                k = mesh.loops[loop_index].vertex_index
-                                if k < vertex_count:
-                                    uv = uv_layer[loop_index].uv
-                                    p_UV_coords[k * 2] = ctypes.c_float(uv[0])
-                                    p_UV_coords[k * 2 + 1] = ctypes.c_float(uv[1])
-
-                    else:
-                        i = 0
-                        for v in mesh.vertices:
-                            if hasattr(v, "uvco"):
-                                p_UV_coords[i] = ctypes.c_float(v.uvco[0])
-                                p_UV_coords[i + 1] = ctypes.c_float(v.uvco[1])
-                                i += 2
-                else:
-                    p_UV_coords = POINTER(c_float)()
-                
-                # Extract colors
-                if self.colour_pref:
-                    p_colors = cast((c_float * 4 * vertex_count)(), POINTER(c_float))
-                    if mesh.vertex_colors:
-                        color_layer = mesh.vertex_colors.active.data
-                        for f in mesh.polygons:
-                            for j, loop_index in enumerate(f.loop_indices):
-                                k = mesh.loops[loop_index].vertex_index
-                                if k < vertex_count:
-                                    col = color_layer[loop_index]
-                                    p_colors[k * 4] = col.color[0]
-                                    p_colors[k * 4 + 1] = col.color[1]
-                                    p_colors[k * 4 + 2] = col.color[2]
-                                    p_colors[k * 4 + 3] = 1.0
-                else:
-                    p_colors = POINTER(c_float)()
-                try:
-                    # Create an OpenCTM context
-                    ctm = ctmNewContext(CTM_EXPORT)
-
-                    # Set the file comment
-                    ctmFileComment(ctm, c_char_p(_encode('Created by OpenCTM Addon (https://github.com/RealIndrit/blender-openctm) for Blender (https://www.blender.org/)')))
-
-                    # Define the mesh
-                    ctmDefineMesh(ctm, p_vertices, c_uint(vertex_count), p_indices, c_uint(triangle_count), p_normals)
-
-                    # Add UV coordinates?
-                    if self.uv_pref:
-                        tm = ctmAddUVMap(ctm, p_UV_coords, c_char_p(), c_char_p())
-                        if self.compression_pref == "MG2":
-                            ctmUVCoordPrecision(ctm, tm, self.export_uvprec)
-
-                    # Add colors?
-                    if self.normal_pref:
-                        cm = ctmAddAttribMap(ctm, p_colors, c_char_p(_encode('Color')))
-                        if self.compression_pref == "MG2":
-                            ctmAttribPrecision(ctm, cm, self.export_cprec)
-
-                    # Set compression method
-                    if self.compression_pref == "MG2":
-                        ctmVertexPrecisionRel(ctm, self.export_vprec)
-                        if self.normal_pref:
-                            ctmNormalPrecision(ctm, self.export_nprec)
-
-
-                    if self.compression_pref == "MG2":
-                        ctmCompressionMethod(ctm, CTM_METHOD_MG2)
-                    elif self.compression_pref == "MG1":
-                        ctmCompressionMethod(ctm, CTM_METHOD_MG1)
-                    elif self.compression_pref == "RAW":
-                        ctmCompressionMethod(ctm, CTM_METHOD_RAW)
-
-                    # Save the file
-                    ctmSave(ctm, c_char_p(_encode(self.filepath)))
-
-                    # Check for errors
-                    e = ctmGetError(ctm)
-                    if e != 0:
-                        s = ctmErrorString(e)
-                        self.report({'ERROR'}, f"Could not save the file: {s}")
-
-                finally:
-                    # Free the OpenCTM context
-                    ctmFreeContext(ctm)
-
-                self.report({'INFO'}, f"Exported: {self.filepath}")
-                return {'FINISHED'}
-            elif len(bpy.context.selected_objects) > 1:
-                self.report({'ERROR'}, "Multiple objects selected, only one object per export allowed")
-                return {'CANCELLED'}
-            elif len(bpy.context.selected_objects) < 1:
-                self.report({'ERROR'}, "No object selected")
-                return {'CANCELLED'}
+        # Mesh data is read here, compression runs in the worker pool
+        if self.merge_pref:
+            parts = [self.extract(obj, transform_matrix @ obj.matrix_world) for obj in objects]
+            with phase("merge"):
+                jobs = [(self.filepath, merge_meshes(parts))]
+            del parts
+        elif len(objects) == 1:
+            jobs = [(self.filepath, self.extract(objects[0], transform_matrix))]
+        else:
+            directory = os.path.dirname(self.filepath)
+            jobs = []
+            for index, obj in enumerate(objects):
+                filepath = os.path.join(directory, object_filename(self.name_template, obj, index))
+                jobs.append((filepath, self.extract(obj, transform_matrix)))
+
+        settings = ExportSettings(COMPRESSION_METHODS.get(self.compression_pref, CTM_METHOD_MG2), self.export_vprec,
+                                  self.export_nprec, self.export_uvprec, self.export_cprec)
+        if self.compression_pref == "SWEEP":
+            settings.objective = self.objective_pref
+            settings.sweep_report = self.sweep_report_pref
         else:
-            self.report({'ERROR'}, f"No object selected")
+            settings.level = self.level_pref
+        if self.precision_pref == "AUTO":
+            settings.error_budget = (self.max_vertex_error, self.max_uv_error, self.max_colour_error)
+        if self.lod_chain_pref:
+            jobs = lod_jobs(jobs, self.lod_chain_levels)
+        if archive:
+            # Files become archive members, named as they would be next to
+            # the archive
+            directory = os.path.dirname(self.filepath)
+            members = {self.filepath: os.path.splitext(os.path.basename(self.filepath))[0] + ".ctm"}
+            jobs = [(members.get(filepath) or os.path.relpath(filepath, directory).replace(os.sep, "/"), export_mesh)
+                    for filepath, export_mesh in jobs]
+            results, errors = export_archive(self.filepath, jobs, settings, self.threads_pref)
+        else:
+            results, errors = export_files(jobs, settings, self.threads_pref)
+        for filepath, result in results:
+            if "sweep" in result:
+                self.report({'INFO'}, f"{os.path.basename(filepath)}: kept {result['method']} level "
+                            f"{result['level']}, " + ", ".join(
+                                f"{row['method']}-{row['level']} {row['size'] / 1024:.0f} KB "
+                                f"{row['decode_seconds'] * 1000:.0f} ms" for row in result["sweep"]))
+            if "precisions" in result:
+                self.report({'INFO'}, f"{os.path.basename(filepath)}: {result['size'] / 1024:.0f} KB, "
+                            + ", ".join(f"{name} precision {precision:.3g} (error {error:.3g})"
+                                        for name, (precision, error) in result["precisions"].items()))
+        for filepath, error in errors:
+            self.report({'ERROR'}, f"{filepath}: {error}")
+        if len(errors) == len(jobs):
             return {'CANCELLED'}
 
+        if len(jobs) == 1:
+            self.report({'INFO'}, f"Exported: {self.filepath}")
+        else:
+            self.report({'INFO'}, f"Exported {len(jobs) - len(errors)} of {len(jobs)} files")
+        return {'FINISHED'}
+
 def register():
     bpy.utils.register_class(OpenCTMImport)
     bpy.utils.register_class(OpenCTMExport)
+    bpy.utils.register_class(OpenCTMLoadFullResolution)
 
 def unregister():
+    bpy.utils.unregister_class(OpenCTMLoadFullResolution)
     bpy.utils.unregister_class(OpenCTMExport)
     bpy.utils.unregister_class(OpenCTMImport)
-
-def _encode(_filename):
-    try:
-        return str(_filename).encode("utf-8")
-    except UnicodeEncodeError:
-        pass
\ No newline at end of file
+    # Free the OpenCTM contexts pooled by imports and exports
+    clear_pool()
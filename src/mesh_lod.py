@@ -0,0 +1,117 @@
+import numpy as np
+
+# Grids with up to this many cells label vertices through a dense lookup
+# table, finer ones through np.unique
+_DENSE_CELLS = 1 << 22
+# Finest grid resolution, keeps cell keys within 64 bits
+_MAX_CELLS = 1 << 20
+# Grid refinements tried to get close to a target triangle count, and how
+# close is close enough
+_SEARCH_STEPS = 5
+_SEARCH_TOLERANCE = 0.1
+
+
+def cluster_vertices(vertices, cells, bounds=None):
+    """Label vertices by the cell of a grid of cubes they fall in, cells
+    being the number of cubes along the longest side of the bounding box
+    (the (minimum, maximum) corners of the vertices, when not given).
+    Returns (labels, count): a cluster index per vertex and the number of
+    clusters."""
+    cells = min(cells, _MAX_CELLS)
+    minimum, maximum = bounds or (vertices.min(axis=0), vertices.max(axis=0))
+    extent = maximum - minimum
+    size = float(extent.max()) / cells
+    if size <= 0.0:
+        return np.zeros(len(vertices), dtype=np.int64), 1
+    shape = np.minimum(np.floor(extent / size).astype(np.int64) + 1, cells)
+    coords = np.minimum(((vertices - minimum) / size).astype(np.int64), shape - 1)
+    keys = (coords[:, 0] * shape[1] + coords[:, 1]) * shape[2] + coords[:, 2]
+    total = int(np.prod(shape))
+    if total <= _DENSE_CELLS:
+        occupied = np.zeros(total, dtype=bool)
+        occupied[keys] = True
+        lookup = np.cumsum(occupied) - 1
+        return lookup[keys], int(lookup[-1]) + 1
+    _, labels = np.unique(keys, return_inverse=True)
+    labels = labels.ravel()
+    return labels, int(labels.max(initial=-1)) + 1
+
+
+def cluster_triangles(labels, count, triangles):
+    """Triangles between clusters: collapsed and duplicate triangles are
+    dropped, the first of duplicates keeps its winding"""
+    clustered = labels[triangles]
+    a, b, c = clustered[:, 0], clustered[:, 1], clustered[:, 2]
+    clustered = clustered[(a != b) & (b != c) & (a != c)]
+    ordered = np.sort(clustered, axis=1)
+    if count < 1 << 21:
+        keys = (ordered[:, 0] * count + ordered[:, 1]) * count + ordered[:, 2]
+    else:
+        keys = np.ascontiguousarray(ordered).view(np.dtype((np.void, 3 * ordered.dtype.itemsize))).ravel()
+    _, first = np.unique(keys, return_index=True)
+    return clustered[np.sort(first)]
+
+
+def cluster_means(values, labels, count):
+    """(count, k) float32 mean of the (n, k) values of each cluster"""
+    weights = np.bincount(labels, minlength=count).astype(np.float64)
+    weights[weights == 0] = 1.0
+    values = np.asarray(values, dtype=np.float64)
+    means = [np.bincount(labels, weights=values[:, column], minlength=count) / weights
+             for column in range(values.shape[1])]
+    return np.stack(means, axis=1).astype(np.float32)
+
+
+def decimate(vertices, triangles, target_triangles=None, cells=None):
+    """Simplify a mesh by vertex clustering, on a grid of cells cubes along
+    its longest side or, with target_triangles, on a grid refined until the
+    result has about that many triangles.
+
+    Returns (vertex_groups, triangles): the cluster index of every input
+    vertex (-1 for clusters no triangle uses) and the (t, 3) uint32
+    triangles between the clusters. Vertex values of the simplified mesh
+    are the cluster_means() of the input values.
+    """
+    vertices = np.asarray(vertices, dtype=np.float32)
+    triangles = np.asarray(triangles, dtype=np.int64)
+    bounds = (vertices.min(axis=0), vertices.max(axis=0))
+    if cells is None:
+        # Surfaces have about 2 triangles per occupied cell, and a number of
+        # occupied cells growing with the square of the grid resolution. The
+        # ratio is measured on the first grid, later grids only count their
+        # clusters.
+        cells = max(2, int(np.sqrt(target_triangles)))
+        labels, count = cluster_vertices(vertices, cells, bounds)
+        clustered = cluster_triangles(labels, count, triangles)
+        ratio = len(clustered) / count
+        best = (abs(len(clustered) - target_triangles), cells, labels, count)
+        for _ in range(_SEARCH_STEPS - 1):
+            if best[0] <= _SEARCH_TOLERANCE * target_triangles:
+                break
+            cells = max(2, min(_MAX_CELLS, int(round(cells * np.sqrt(target_triangles / max(ratio * count, 1.0))))))
+            if cells == best[1]:
+                break
+            labels, count = cluster_vertices(vertices, cells, bounds)
+            miss = abs(ratio * count - target_triangles)
+            if miss < best[0]:
+                best = (miss, cells, labels, count)
+                clustered = None
+        _, cells, labels, count = best
+        if clustered is None:
+            clustered = cluster_triangles(labels, count, triangles)
+    else:
+        labels, count = cluster_vertices(vertices, cells, bounds)
+        clustered = cluster_triangles(labels, count, triangles)
+
+    # Clusters no triangle uses are left out
+    used = np.zeros(count, dtype=bool)
+    used[clustered.ravel()] = True
+    remap = np.cumsum(used) - 1
+    groups = np.where(used[labels], remap[labels], -1)
+    return groups, remap[clustered].astype(np.uint32).reshape((-1, 3))
+
+
+def group_means(values, groups):
+    """cluster_means() of the vertices decimate() kept"""
+    kept = groups >= 0
+    return cluster_means(np.asarray(values)[kept], groups[kept], int(groups.max(initial=-1)) + 1)
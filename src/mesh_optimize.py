@@ -0,0 +1,91 @@
+import numpy as np
+
+# Bits per axis of the Morton codes sorting triangles in space
+_MORTON_BITS = 10
+
+
+def _row_hashes(keys):
+    # 64 bit FNV-1a style hash of each row of a uint32 array
+    hashes = np.full(len(keys), 0xCBF29CE484222325, dtype=np.uint64)
+    prime = np.uint64(0x100000001B3)
+    with np.errstate(over="ignore"):
+        for column in range(keys.shape[1]):
+            hashes ^= keys[:, column].astype(np.uint64)
+            hashes *= prime
+    return hashes
+
+
+def weld_corners(corner_vertices, corner_attributes):
+    """Split vertices at attribute seams.
+
+    corner_vertices holds the vertex index of every triangle corner and
+    corner_attributes (n, k) float32 arrays of per corner values (UVs,
+    colors). Corners sharing a vertex and all their attribute values become
+    one output vertex. Returns (corners, triangles): the index of a corner
+    providing the values of each output vertex, and the (t, 3) uint32
+    triangles of output vertices.
+    """
+    if len(corner_vertices) == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, 3), dtype=np.uint32)
+    columns = [np.asarray(corner_vertices, dtype=np.uint32).reshape((-1, 1))]
+    columns += [np.ascontiguousarray(values, dtype=np.float32).view(np.uint32) for values in corner_attributes]
+    if len(columns) == 1:
+        # No attributes to split at, vertices stay as they are
+        _, corners, inverse = np.unique(columns[0][:, 0], return_index=True, return_inverse=True)
+        return corners, inverse.astype(np.uint32).reshape((-1, 3))
+
+    keys = np.ascontiguousarray(np.concatenate(columns, axis=1))
+    # Unique rows through their hashes, sorting 8 byte hashes is much faster
+    # than sorting whole rows
+    _, corners, inverse = np.unique(_row_hashes(keys), return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    if not np.array_equal(keys[corners[inverse]], keys):
+        # Hash collision, compare the whole rows
+        rows = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+        _, corners, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+    return corners, inverse.astype(np.uint32).reshape((-1, 3))
+
+
+def _spread_bits(values):
+    # Insert two zero bits between each of the low 10 bits, for 3D Morton codes
+    values = values.astype(np.uint32) & 0x3FF
+    values = (values | (values << 16)) & 0x030000FF
+    values = (values | (values << 8)) & 0x0300F00F
+    values = (values | (values << 4)) & 0x030C30C3
+    values = (values | (values << 2)) & 0x09249249
+    return values
+
+
+def morton_codes(points):
+    """30 bit Morton (Z-order) codes of points within their bounding box"""
+    minimum = points.min(axis=0)
+    extent = points.max(axis=0) - minimum
+    scale = np.where(extent > 0, ((1 << _MORTON_BITS) - 1) / np.where(extent > 0, extent, 1), 0)
+    cells = ((points - minimum) * scale).astype(np.uint32)
+    return _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << 1) | (_spread_bits(cells[:, 2]) << 2)
+
+
+def locality_order(positions, triangles):
+    """Reorder for locality: triangles along a Z-order curve of their
+    centroids, vertices in order of first use by these triangles.
+
+    Returns (vertex_order, triangles): the old index of each new vertex and
+    the reordered triangles using the new vertex indices.
+    """
+    if len(triangles) == 0:
+        return np.arange(len(positions)), triangles
+    centroids = positions[triangles[:, 0]] + positions[triangles[:, 1]] + positions[triangles[:, 2]]
+    triangles = triangles[np.argsort(morton_codes(centroids), kind="stable")]
+
+    corners = triangles.ravel()
+    used, first_use = np.unique(corners, return_index=True)
+    vertex_order = used[np.argsort(first_use, kind="stable")]
+    if len(vertex_order) < len(positions):
+        # Unused vertices go last
+        unused = np.ones(len(positions), dtype=bool)
+        unused[vertex_order] = False
+        vertex_order = np.concatenate((vertex_order, np.flatnonzero(unused)))
+    remap = np.empty(len(positions), dtype=np.uint32)
+    remap[vertex_order] = np.arange(len(positions), dtype=np.uint32)
+    return vertex_order, remap[triangles]
@@ -0,0 +1,199 @@
+import numpy as np
+
+# foreach_get property and channel count of the attribute types exported as
+# OpenCTM attribute maps (4 floats per vertex)
+ATTRIBUTE_TYPES = {
+    'FLOAT': ("value", 1),
+    'FLOAT2': ("vector", 2),
+    'FLOAT_VECTOR': ("vector", 3),
+    'FLOAT_COLOR': ("color", 4),
+    'BYTE_COLOR': ("color", 4),
+    'QUATERNION': ("value", 4),
+}
+
+# Attributes Blender itself uses (creases, bevel weights, sharpness...),
+# never exported as attribute maps
+BUILTIN_ATTRIBUTES = {
+    "position",
+    "crease_vert",
+    "crease_edge",
+    "bevel_weight_vert",
+    "bevel_weight_edge",
+    "sharp_face",
+    "sharp_edge",
+    "material_index",
+    "custom_normal",
+    "sculpt_face_set",
+}
+
+
+def _as_float32(array):
+    return np.ascontiguousarray(array, dtype=np.float32).ravel()
+
+
+def _as_int32(array):
+    array = np.ascontiguousarray(array)
+    if array.dtype == np.uint32:
+        return array.view(np.int32).ravel()
+    return np.ascontiguousarray(array, dtype=np.int32).ravel()
+
+
+def build_triangle_mesh(mesh, vertices, triangles):
+    """Fill an empty mesh with vertices and triangles using the bulk setters.
+
+    Edges are not created, call mesh.update(calc_edges=True) afterwards.
+    """
+    triangle_count = len(triangles)
+    mesh.vertices.add(len(vertices))
+    mesh.loops.add(3 * triangle_count)
+    mesh.polygons.add(triangle_count)
+
+    mesh.vertices.foreach_set("co", _as_float32(vertices))
+    mesh.loops.foreach_set("vertex_index", _as_int32(triangles))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, 3 * triangle_count, 3, dtype=np.int32))
+    # loop_total is read-only and derived from the next face's loop_start
+    # since Blender 4.0, the add-on also supports 3.6 where it is set
+    if triangle_count and not mesh.polygons[0].bl_rna.properties["loop_total"].is_readonly:
+        mesh.polygons.foreach_set("loop_total", np.full(triangle_count, 3, dtype=np.int32))
+
+
+def loop_vertex_indices(mesh):
+    """Vertex index of every loop (face corner) of the mesh"""
+    indices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", indices)
+    return indices
+
+
+def add_uv_layer(mesh, name, uv_coords, loop_vertices):
+    """Create a UV layer from per-vertex UV coordinates, expanded to loops"""
+    uv_layer = mesh.uv_layers.new(name=name)
+    uv_layer.data.foreach_set("uv", _as_float32(uv_coords[loop_vertices]))
+    return uv_layer
+
+
+def add_color_attribute(mesh, name, colours, active=True):
+    """Create a point domain float color attribute from per-vertex RGBA values"""
+    attribute = mesh.color_attributes.new(name=name, type='FLOAT_COLOR', domain='POINT')
+    attribute.data.foreach_set("color", _as_float32(colours))
+    if active:
+        mesh.color_attributes.active_color = attribute
+    return attribute
+
+
+def set_custom_normals(mesh, normals):
+    """Use per-vertex normals as the custom normals of a mesh, shaded smooth"""
+    mesh.polygons.foreach_set("use_smooth", np.ones(len(mesh.polygons), dtype=bool))
+    if hasattr(mesh, "use_auto_smooth"):
+        # Custom normals need auto smooth before Blender 4.1
+        mesh.use_auto_smooth = True
+    mesh.normals_split_custom_set_from_vertices(np.ascontiguousarray(normals, dtype=np.float32).reshape((-1, 3)))
+
+
+def triangle_vertex_indices(mesh):
+    """(t, 3) uint32 vertex indices of the mesh triangulated with loop_triangles"""
+    mesh.calc_loop_triangles()
+    indices = np.empty(3 * len(mesh.loop_triangles), dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", indices)
+    return indices.view(np.uint32).reshape((-1, 3))
+
+
+def triangle_loop_indices(mesh):
+    """(t, 3) int32 loop indices of the triangles, call after
+    triangle_vertex_indices()"""
+    loops = np.empty(3 * len(mesh.loop_triangles), dtype=np.int32)
+    mesh.loop_triangles.foreach_get("loops", loops)
+    return loops.reshape((-1, 3))
+
+
+def vertex_positions(mesh):
+    """(n, 3) float32 vertex coordinates"""
+    positions = np.empty(3 * len(mesh.vertices), dtype=np.float32)
+    mesh.vertices.foreach_get("co", positions)
+    return positions.reshape((-1, 3))
+
+
+def vertex_normals(mesh):
+    """(n, 3) float32 vertex normals"""
+    normals = np.empty(3 * len(mesh.vertices), dtype=np.float32)
+    mesh.vertices.foreach_get("normal", normals)
+    return normals.reshape((-1, 3))
+
+
+def _loops_to_vertices(mesh, loop_values):
+    # OpenCTM stores one value per vertex, the last loop using a vertex wins
+    values = np.zeros((len(mesh.vertices), loop_values.shape[1]), dtype=np.float32)
+    values[loop_vertex_indices(mesh)] = loop_values
+    return values
+
+
+def loop_uv_coords(mesh, uv_layer):
+    """(l, 2) float32 UV coordinates of every loop"""
+    uv_coords = np.empty(2 * len(mesh.loops), dtype=np.float32)
+    uv_layer.data.foreach_get("uv", uv_coords)
+    return uv_coords.reshape((-1, 2))
+
+
+def float_attributes(mesh):
+    """Point and corner float attributes that export as attribute maps: color
+    and generic float attributes other than UV maps, internal (".name") and
+    BUILTIN_ATTRIBUTES, the active color first"""
+    uv_names = set(mesh.uv_layers.keys())
+    attributes = [attribute for attribute in mesh.attributes
+                  if attribute.data_type in ATTRIBUTE_TYPES and attribute.domain in ('POINT', 'CORNER')
+                  and attribute.name not in uv_names and attribute.name not in BUILTIN_ATTRIBUTES
+                  and not attribute.name.startswith(".") and not getattr(attribute, "is_internal", False)]
+    active = mesh.color_attributes.active_color
+    if active is not None:
+        attributes.sort(key=lambda attribute: attribute.name != active.name)
+    return attributes
+
+
+def _attribute_values(attribute):
+    # Values of any float attribute as (len(data), 4) float32, zero padded
+    prop, channels = ATTRIBUTE_TYPES[attribute.data_type]
+    data = np.empty(channels * len(attribute.data), dtype=np.float32)
+    attribute.data.foreach_get(prop, data)
+    if channels == 4:
+        return data.reshape((-1, 4))
+    values = np.zeros((len(attribute.data), 4), dtype=np.float32)
+    values[:, :channels] = data.reshape((-1, channels))
+    return values
+
+
+def loop_attribute_values(mesh, attribute):
+    """(l, 4) float32 values of every loop of a point or corner float
+    attribute, RGBA for colors"""
+    values = _attribute_values(attribute)
+    if attribute.domain == 'POINT':
+        return values[loop_vertex_indices(mesh)]
+    return values
+
+
+def vertex_uv_coords(mesh, uv_layer):
+    """(n, 2) float32 per-vertex UV coordinates of a UV layer"""
+    return _loops_to_vertices(mesh, loop_uv_coords(mesh, uv_layer))
+
+
+def vertex_attribute_values(mesh, attribute):
+    """(n, 4) float32 per-vertex values of a point or corner float attribute,
+    RGBA for colors"""
+    values = _attribute_values(attribute)
+    if attribute.domain == 'CORNER':
+        return _loops_to_vertices(mesh, values)
+    return values
+
+
+def transform_points(points, matrix):
+    """(n, 3) float32 points transformed by a 4x4 matrix"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return points @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def transform_normals(normals, matrix):
+    """(n, 3) float32 unit normals transformed by the inverse transpose of a
+    4x4 matrix"""
+    normal_matrix = np.linalg.inv(np.asarray(matrix, dtype=np.float64)[:3, :3]).T.astype(np.float32)
+    normals = normals @ normal_matrix.T
+    length = np.sqrt(np.einsum("ij,ij->i", normals, normals))
+    normals /= np.where(length > 1e-10, length, 1.0)[:, None]
+    return normals
@@ -1 +1,16 @@
-from .bindings import *
\ No newline at end of file
+from .constants import *
+
+# Prefer the OpenCTM shared library, fall back to the pure Python codec on
+# platforms without one
+try:
+    from .bindings import *
+    BACKEND = "library"
+except OSError:
+    from .codec.api import *
+    BACKEND = "python"
+
+# Header-only metadata works with either backend
+from .codec.probe import MeshInfo, MapInfo, probe
+
+# Pooled contexts over either backend
+from .context import CTMContext, ContextPool, clear_pool, pooled_context
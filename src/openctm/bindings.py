@@ -3,6 +3,8 @@ import sys
 import ctypes
 from ctypes import *
 
+import numpy as np
+
 # ------------------------------------------------------------------------------
 # Product:     OpenCTM
 # File:        bindings.py
@@ -39,64 +41,21 @@ CTMuint = c_uint32
 CTMcontext = c_void_p
 CTMenum = c_uint32
 
-# Constants
-CTM_API_VERSION = 0x00000100
-CTM_TRUE = 1
-CTM_FALSE = 0
-
-# CTMenum
-CTM_NONE = 0x0000
-CTM_INVALID_CONTEXT = 0x0001
-CTM_INVALID_ARGUMENT = 0x0002
-CTM_INVALID_OPERATION = 0x0003
-CTM_INVALID_MESH = 0x0004
-CTM_OUT_OF_MEMORY = 0x0005
-CTM_FILE_ERROR = 0x0006
-CTM_BAD_FORMAT = 0x0007
-CTM_LZMA_ERROR = 0x0008
-CTM_INTERNAL_ERROR = 0x0009
-CTM_UNSUPPORTED_FORMAT_VERSION = 0x000A
-CTM_IMPORT = 0x0101
-CTM_EXPORT = 0x0102
-CTM_METHOD_RAW = 0x0201
-CTM_METHOD_MG1 = 0x0202
-CTM_METHOD_MG2 = 0x0203
-CTM_VERTEX_COUNT = 0x0301
-CTM_TRIANGLE_COUNT = 0x0302
-CTM_HAS_NORMALS = 0x0303
-CTM_UV_MAP_COUNT = 0x0304
-CTM_ATTRIB_MAP_COUNT = 0x0305
-CTM_VERTEX_PRECISION = 0x0306
-CTM_NORMAL_PRECISION = 0x0307
-CTM_COMPRESSION_METHOD = 0x0308
-CTM_FILE_COMMENT = 0x0309
-CTM_NAME = 0x0501
-CTM_FILE_NAME = 0x0502
-CTM_PRECISION = 0x0503
-CTM_INDICES = 0x0601
-CTM_VERTICES = 0x0602
-CTM_NORMALS = 0x0603
-CTM_UV_MAP_1 = 0x0700
-CTM_UV_MAP_2 = 0x0701
-CTM_UV_MAP_3 = 0x0702
-CTM_UV_MAP_4 = 0x0703
-CTM_UV_MAP_5 = 0x0704
-CTM_UV_MAP_6 = 0x0705
-CTM_UV_MAP_7 = 0x0706
-CTM_UV_MAP_8 = 0x0707
-CTM_ATTRIB_MAP_1 = 0x0800
-CTM_ATTRIB_MAP_2 = 0x0801
-CTM_ATTRIB_MAP_3 = 0x0802
-CTM_ATTRIB_MAP_4 = 0x0803
-CTM_ATTRIB_MAP_5 = 0x0804
-CTM_ATTRIB_MAP_6 = 0x0805
-CTM_ATTRIB_MAP_7 = 0x0806
-CTM_ATTRIB_MAP_8 = 0x0807
+from .constants import *
+from .callbacks import CTMreadfn, CTMwritefn, StreamReader, StreamWriter
 
 if sys.platform.startswith('win32'):
-    _lib = os.path.join(os.path.dirname(__file__), 'libs', 'openctm.dll')
+    _lib = 'openctm.dll'
+elif sys.platform.startswith('darwin'):
+    _lib = 'libopenctm.dylib'
 else:
-    raise NotImplementedError(sys.platform)
+    _lib = 'libopenctm.so'
+_lib = os.path.join(os.path.dirname(__file__), 'libs', _lib)
+
+# No shared library shipped for this platform, the package falls back to the
+# pure Python codec
+if not os.path.isfile(_lib):
+    raise OSError("OpenCTM library not found: %s" % _lib)
 
 _lib = ctypes.CDLL(_lib)
 
@@ -199,4 +158,64 @@ ctmLoad = _lib.ctmLoad
 ctmLoad.argtypes = [CTMcontext, c_char_p]
 
 ctmSave = _lib.ctmSave
-ctmSave.argtypes = [CTMcontext, c_char_p]
\ No newline at end of file
+ctmSave.argtypes = [CTMcontext, c_char_p]
+
+ctmLoadCustom = _lib.ctmLoadCustom
+ctmLoadCustom.argtypes = [CTMcontext, CTMreadfn, c_void_p]
+
+ctmSaveCustom = _lib.ctmSaveCustom
+ctmSaveCustom.argtypes = [CTMcontext, CTMwritefn, c_void_p]
+
+# Stream helpers (not part of the C API)
+
+
+def ctmLoadStream(aContext, aSource):
+    """ctmLoad from bytes, a memoryview (or any buffer, such as an mmap) or a
+    binary file object through ctmLoadCustom. Returns the bytes read."""
+    reader = StreamReader(aSource)
+    ctmLoadCustom(aContext, reader.function, reader.user_data)
+    reader.raise_error()
+    return reader.count
+
+
+def ctmSaveStream(aContext, aTarget):
+    """ctmSave to a bytearray or a binary file object through ctmSaveCustom.
+    Returns the bytes written."""
+    writer = StreamWriter(aTarget)
+    ctmSaveCustom(aContext, writer.function, writer.user_data)
+    writer.raise_error()
+    return writer.count
+
+# NumPy helpers (not part of the C API)
+
+
+def _array_shape(aContext, aProperty):
+    if aProperty == CTM_INDICES:
+        return ctmGetInteger(aContext, CTM_TRIANGLE_COUNT), 3
+    vertex_count = ctmGetInteger(aContext, CTM_VERTEX_COUNT)
+    if aProperty in (CTM_VERTICES, CTM_NORMALS):
+        return vertex_count, 3
+    if CTM_UV_MAP_1 <= aProperty <= CTM_UV_MAP_8:
+        return vertex_count, 2
+    if CTM_ATTRIB_MAP_1 <= aProperty <= CTM_ATTRIB_MAP_8:
+        return vertex_count, 4
+    raise ValueError("Not an array property: 0x%04x" % aProperty)
+
+
+def ctmGetArrayView(aContext, aProperty):
+    """Return a zero-copy NumPy view (float32, or uint32 for CTM_INDICES) of
+    an array owned by the context, shaped (count, components).
+
+    Returns None if the context has no such array. The view is only valid
+    until the context is freed.
+    """
+    rows, columns = _array_shape(aContext, aProperty)
+    if aProperty == CTM_INDICES:
+        pointer = ctmGetIntegerArray(aContext, aProperty)
+    else:
+        pointer = ctmGetFloatArray(aContext, aProperty)
+    if not pointer:
+        return None
+    if rows == 0:
+        return np.empty((0, columns), dtype=np.uint32 if aProperty == CTM_INDICES else np.float32)
+    return np.ctypeslib.as_array(pointer, shape=(rows, columns))
@@ -0,0 +1,91 @@
+import ctypes
+from ctypes import CFUNCTYPE, c_char, c_uint32, c_void_p
+
+import numpy as np
+
+# Stream callbacks of ctmLoadCustom/ctmSaveCustom:
+# (buffer, byte count, user data) -> bytes read/written
+CTMreadfn = CFUNCTYPE(c_uint32, c_void_p, c_uint32, c_void_p)
+CTMwritefn = CFUNCTYPE(c_uint32, c_void_p, c_uint32, c_void_p)
+
+
+class _Callback:
+    # Exceptions of the Python side are kept and re-raised after the load or
+    # save, the callback reports 0 bytes so that OpenCTM gives up
+    def __init__(self):
+        self.count = 0
+        self.error = None
+        # The library skips stream calls with NULL user data
+        self.user_data = id(self)
+
+    def raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+
+class StreamReader(_Callback):
+    """CTMreadfn reading from bytes, a memoryview (or any buffer, such as an
+    mmap) or a binary file object. Buffers are copied from in place."""
+
+    def __init__(self, source):
+        super().__init__()
+        if hasattr(source, "readinto") or hasattr(source, "read"):
+            self.stream = source
+            self.data = None
+        else:
+            self.stream = None
+            self.data = np.frombuffer(source, dtype=np.uint8)
+        self.function = CTMreadfn(self._read)
+
+    def _read(self, buffer, count, user_data):
+        try:
+            if self.data is not None:
+                count = min(count, len(self.data) - self.count)
+                ctypes.memmove(buffer, self.data.ctypes.data + self.count, count)
+            else:
+                count = read_into(self.stream, memoryview((c_char * count).from_address(buffer)).cast("B"))
+            self.count += count
+            return count
+        except BaseException as e:
+            self.error = e
+            return 0
+
+
+class StreamWriter(_Callback):
+    """CTMwritefn appending to a bytearray or writing to a binary file object"""
+
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+        self.function = CTMwritefn(self._write)
+
+    def _write(self, buffer, count, user_data):
+        try:
+            data = ctypes.string_at(buffer, count)
+            if isinstance(self.target, bytearray):
+                self.target += data
+            else:
+                self.target.write(data)
+            self.count += count
+            return count
+        except BaseException as e:
+            self.error = e
+            return 0
+
+
+def read_into(stream, view):
+    """Fill a writable byte memoryview from a binary file object, short only
+    at the end of the stream. Returns the number of bytes read."""
+    position = 0
+    readinto = getattr(stream, "readinto", None)
+    while position < len(view):
+        if readinto is not None:
+            read = readinto(view[position:])
+        else:
+            data = stream.read(len(view) - position)
+            read = len(data)
+            view[position:position + read] = data
+        if not read:
+            break
+        position += read
+    return position
@@ -0,0 +1,5 @@
+from .mesh import Mesh, UVMap, AttribMap
+from .probe import MeshInfo, MapInfo, probe
+from .reader import MeshReader, read_mesh, load
+from .stream import CTMError
+from .writer import write_mesh, save
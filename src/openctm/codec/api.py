@@ -0,0 +1,499 @@
+import ctypes
+
+import numpy as np
+
+from ..callbacks import CTMreadfn, CTMwritefn, StreamReader, StreamWriter, read_into
+from ..constants import *
+from .mesh import *
+from .reader import load, read_mesh
+from .stream import CTMError
+from .writer import average_edge_length, save, write_mesh
+
+__all__ = [
+    "ctmNewContext",
+    "ctmFreeContext",
+    "ctmGetError",
+    "ctmErrorString",
+    "ctmGetInteger",
+    "ctmGetFloat",
+    "ctmGetArrayView",
+    "ctmGetIntegerArray",
+    "ctmGetFloatArray",
+    "ctmGetNamedUVMap",
+    "ctmGetUVMapString",
+    "ctmGetUVMapFloat",
+    "ctmGetNamedAttribMap",
+    "ctmGetAttribMapString",
+    "ctmGetAttribMapFloat",
+    "ctmGetString",
+    "ctmCompressionMethod",
+    "ctmCompressionLevel",
+    "ctmVertexPrecision",
+    "ctmVertexPrecisionRel",
+    "ctmNormalPrecision",
+    "ctmUVCoordPrecision",
+    "ctmAttribPrecision",
+    "ctmFileComment",
+    "ctmDefineMesh",
+    "ctmAddUVMap",
+    "ctmAddAttribMap",
+    "ctmLoad",
+    "ctmSave",
+    "ctmLoadCustom",
+    "ctmSaveCustom",
+    "ctmLoadStream",
+    "ctmSaveStream",
+    "CTMreadfn",
+    "CTMwritefn",
+]
+
+# Drop-in replacements for the functions of bindings.py, backed by the pure
+# Python codec. Arguments may be plain Python values, NumPy arrays or the
+# ctypes objects the bindings take.
+
+_ERROR_STRINGS = {
+    CTM_INVALID_CONTEXT: b"CTM_INVALID_CONTEXT",
+    CTM_INVALID_ARGUMENT: b"CTM_INVALID_ARGUMENT",
+    CTM_INVALID_OPERATION: b"CTM_INVALID_OPERATION",
+    CTM_INVALID_MESH: b"CTM_INVALID_MESH",
+    CTM_OUT_OF_MEMORY: b"CTM_OUT_OF_MEMORY",
+    CTM_FILE_ERROR: b"CTM_FILE_ERROR",
+    CTM_BAD_FORMAT: b"CTM_BAD_FORMAT",
+    CTM_LZMA_ERROR: b"CTM_LZMA_ERROR",
+    CTM_INTERNAL_ERROR: b"CTM_INTERNAL_ERROR",
+    CTM_UNSUPPORTED_FORMAT_VERSION: b"CTM_UNSUPPORTED_FORMAT_VERSION",
+}
+
+
+class _Context:
+    def __init__(self, mode):
+        self.mode = mode
+        self.error = CTM_NONE
+        self.mesh = None
+        self.level = DEFAULT_COMPRESSION_LEVEL
+        self.method = CTM_METHOD_MG1
+        self.comment = ""
+        self.vertex_precision = DEFAULT_VERTEX_PRECISION
+        self.normal_precision = DEFAULT_NORMAL_PRECISION
+
+
+def _value(argument):
+    # Unwrap ctypes scalars (c_uint(3), c_char_p(b"name"), ...)
+    return getattr(argument, "value", argument)
+
+
+def _string(argument):
+    argument = _value(argument)
+    if isinstance(argument, bytes):
+        return argument.decode("utf-8")
+    return argument
+
+
+def _encode(value):
+    return value.encode("utf-8") if value else None
+
+
+def _array(pointer, count, size):
+    if pointer is None:
+        return None
+    if isinstance(pointer, np.ndarray):
+        return pointer.reshape((count, size))
+    if not pointer:
+        return None
+    return np.ctypeslib.as_array(pointer, shape=(count, size))
+
+
+def _fail(context, code):
+    if context.error == CTM_NONE:
+        context.error = code
+
+
+def _export_mesh(context):
+    if context.mode != CTM_EXPORT:
+        _fail(context, CTM_INVALID_OPERATION)
+        return None
+    if context.mesh is None:
+        _fail(context, CTM_INVALID_MESH)
+    return context.mesh
+
+
+def _uv_map(context, map_id):
+    mesh = context.mesh
+    index = _value(map_id) - CTM_UV_MAP_1
+    if mesh is None or not 0 <= index < len(mesh.uv_maps):
+        _fail(context, CTM_INVALID_ARGUMENT)
+        return None
+    return mesh.uv_maps[index]
+
+
+def _attrib_map(context, map_id):
+    mesh = context.mesh
+    index = _value(map_id) - CTM_ATTRIB_MAP_1
+    if mesh is None or not 0 <= index < len(mesh.attrib_maps):
+        _fail(context, CTM_INVALID_ARGUMENT)
+        return None
+    return mesh.attrib_maps[index]
+
+
+def ctmNewContext(aMode):
+    aMode = _value(aMode)
+    if aMode not in (CTM_IMPORT, CTM_EXPORT):
+        return None
+    return _Context(aMode)
+
+
+def ctmFreeContext(aContext):
+    if aContext is not None:
+        aContext.mesh = None
+
+
+def ctmGetError(aContext):
+    if aContext is None:
+        return CTM_INVALID_CONTEXT
+    error = aContext.error
+    aContext.error = CTM_NONE
+    return error
+
+
+def ctmErrorString(aError):
+    return _ERROR_STRINGS.get(_value(aError))
+
+
+def ctmGetInteger(aContext, aProperty):
+    mesh = aContext.mesh
+    if mesh is None:
+        return 0
+    aProperty = _value(aProperty)
+    if aProperty == CTM_VERTEX_COUNT:
+        return mesh.vertex_count
+    if aProperty == CTM_TRIANGLE_COUNT:
+        return mesh.triangle_count
+    if aProperty == CTM_UV_MAP_COUNT:
+        return len(mesh.uv_maps)
+    if aProperty == CTM_ATTRIB_MAP_COUNT:
+        return len(mesh.attrib_maps)
+    if aProperty == CTM_HAS_NORMALS:
+        return CTM_TRUE if mesh.normals is not None else CTM_FALSE
+    if aProperty == CTM_COMPRESSION_METHOD:
+        return mesh.method
+    _fail(aContext, CTM_INVALID_ARGUMENT)
+    return 0
+
+
+def ctmGetFloat(aContext, aProperty):
+    aProperty = _value(aProperty)
+    if aProperty == CTM_VERTEX_PRECISION:
+        return aContext.mesh.vertex_precision if aContext.mesh else aContext.vertex_precision
+    if aProperty == CTM_NORMAL_PRECISION:
+        return aContext.mesh.normal_precision if aContext.mesh else aContext.normal_precision
+    _fail(aContext, CTM_INVALID_ARGUMENT)
+    return 0.0
+
+
+def ctmGetArrayView(aContext, aProperty):
+    """NumPy array (float32, or uint32 for CTM_INDICES) of a loaded mesh,
+    shaped (count, components), or None if the mesh has no such array"""
+    mesh = aContext.mesh
+    if mesh is None:
+        return None
+    aProperty = _value(aProperty)
+    if aProperty == CTM_INDICES:
+        return mesh.indices
+    if aProperty == CTM_VERTICES:
+        return mesh.vertices
+    if aProperty == CTM_NORMALS:
+        return mesh.normals
+    if CTM_UV_MAP_1 <= aProperty <= CTM_UV_MAP_8:
+        index = aProperty - CTM_UV_MAP_1
+        return mesh.uv_maps[index].coords if index < len(mesh.uv_maps) else None
+    if CTM_ATTRIB_MAP_1 <= aProperty <= CTM_ATTRIB_MAP_8:
+        index = aProperty - CTM_ATTRIB_MAP_1
+        return mesh.attrib_maps[index].values if index < len(mesh.attrib_maps) else None
+    raise ValueError("Not an array property: 0x%04x" % aProperty)
+
+
+def ctmGetIntegerArray(aContext, aProperty):
+    array = ctmGetArrayView(aContext, aProperty)
+    if array is None:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+        return ctypes.POINTER(ctypes.c_uint32)()
+    return array.ctypes.data_as(ctypes.POINTER(ctypes.c_uint32))
+
+
+def ctmGetFloatArray(aContext, aProperty):
+    array = ctmGetArrayView(aContext, aProperty)
+    if array is None:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+        return ctypes.POINTER(ctypes.c_float)()
+    return array.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+
+
+def ctmGetNamedUVMap(aContext, aName):
+    name = _string(aName)
+    for index, uv_map in enumerate(aContext.mesh.uv_maps if aContext.mesh else []):
+        if uv_map.name == name:
+            return CTM_UV_MAP_1 + index
+    return CTM_NONE
+
+
+def ctmGetUVMapString(aContext, aUVMap, aProperty):
+    uv_map = _uv_map(aContext, aUVMap)
+    if uv_map is None:
+        return None
+    aProperty = _value(aProperty)
+    if aProperty == CTM_NAME:
+        return _encode(uv_map.name)
+    if aProperty == CTM_FILE_NAME:
+        return _encode(uv_map.filename)
+    _fail(aContext, CTM_INVALID_ARGUMENT)
+    return None
+
+
+def ctmGetUVMapFloat(aContext, aUVMap, aProperty):
+    uv_map = _uv_map(aContext, aUVMap)
+    if uv_map is None or _value(aProperty) != CTM_PRECISION:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+        return 0.0
+    return uv_map.precision
+
+
+def ctmGetNamedAttribMap(aContext, aName):
+    name = _string(aName)
+    for index, attrib_map in enumerate(aContext.mesh.attrib_maps if aContext.mesh else []):
+        if attrib_map.name == name:
+            return CTM_ATTRIB_MAP_1 + index
+    return CTM_NONE
+
+
+def ctmGetAttribMapString(aContext, aAttribMap, aProperty):
+    attrib_map = _attrib_map(aContext, aAttribMap)
+    if attrib_map is None or _value(aProperty) != CTM_NAME:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+        return None
+    return _encode(attrib_map.name)
+
+
+def ctmGetAttribMapFloat(aContext, aAttribMap, aProperty):
+    attrib_map = _attrib_map(aContext, aAttribMap)
+    if attrib_map is None or _value(aProperty) != CTM_PRECISION:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+        return 0.0
+    return attrib_map.precision
+
+
+def ctmGetString(aContext, aProperty):
+    if _value(aProperty) != CTM_FILE_COMMENT:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+        return None
+    return _encode(aContext.mesh.comment if aContext.mesh else aContext.comment)
+
+
+def ctmCompressionMethod(aContext, aMethod):
+    aMethod = _value(aMethod)
+    if aContext.mode != CTM_EXPORT:
+        _fail(aContext, CTM_INVALID_OPERATION)
+    elif aMethod not in (CTM_METHOD_RAW, CTM_METHOD_MG1, CTM_METHOD_MG2):
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+    else:
+        aContext.method = aMethod
+
+
+def ctmCompressionLevel(aContext, aLevel):
+    aLevel = _value(aLevel)
+    if aContext.mode != CTM_EXPORT:
+        _fail(aContext, CTM_INVALID_OPERATION)
+    elif not 0 <= aLevel <= 9:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+    else:
+        aContext.level = aLevel
+
+
+def ctmVertexPrecision(aContext, aPrecision):
+    aPrecision = _value(aPrecision)
+    if aContext.mode != CTM_EXPORT:
+        _fail(aContext, CTM_INVALID_OPERATION)
+    elif aPrecision <= 0.0:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+    else:
+        aContext.vertex_precision = aPrecision
+
+
+def ctmVertexPrecisionRel(aContext, aRelPrecision):
+    aRelPrecision = _value(aRelPrecision)
+    mesh = _export_mesh(aContext)
+    if mesh is None:
+        return
+    if aRelPrecision <= 0.0:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+        return
+    # Relative to the average edge length of the defined mesh
+    aContext.vertex_precision = aRelPrecision * average_edge_length(mesh.vertices, mesh.indices)
+
+
+def ctmNormalPrecision(aContext, aPrecision):
+    aPrecision = _value(aPrecision)
+    if aContext.mode != CTM_EXPORT:
+        _fail(aContext, CTM_INVALID_OPERATION)
+    elif aPrecision <= 0.0:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+    else:
+        aContext.normal_precision = aPrecision
+
+
+def ctmUVCoordPrecision(aContext, aUVMap, aPrecision):
+    uv_map = _uv_map(aContext, aUVMap)
+    aPrecision = _value(aPrecision)
+    if uv_map is not None:
+        if aPrecision <= 0.0:
+            _fail(aContext, CTM_INVALID_ARGUMENT)
+        else:
+            uv_map.precision = aPrecision
+
+
+def ctmAttribPrecision(aContext, aAttribMap, aPrecision):
+    attrib_map = _attrib_map(aContext, aAttribMap)
+    aPrecision = _value(aPrecision)
+    if attrib_map is not None:
+        if aPrecision <= 0.0:
+            _fail(aContext, CTM_INVALID_ARGUMENT)
+        else:
+            attrib_map.precision = aPrecision
+
+
+def ctmFileComment(aContext, aFileComment):
+    if aContext.mode != CTM_EXPORT:
+        _fail(aContext, CTM_INVALID_OPERATION)
+        return
+    aContext.comment = _string(aFileComment) or ""
+
+
+def ctmDefineMesh(aContext, aVertices, aVertexCount, aIndices, aTriangleCount, aNormals):
+    if aContext.mode != CTM_EXPORT:
+        _fail(aContext, CTM_INVALID_OPERATION)
+        return
+    vertex_count = _value(aVertexCount)
+    triangle_count = _value(aTriangleCount)
+    vertices = _array(aVertices, vertex_count, 3)
+    indices = _array(aIndices, triangle_count, 3)
+    if vertices is None or indices is None or vertex_count == 0 or triangle_count == 0:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+        return
+    # Like the C library the arrays are referenced, not copied, until ctmSave
+    aContext.mesh = Mesh(vertices, indices, _array(aNormals, vertex_count, 3))
+
+
+def ctmAddUVMap(aContext, aUVCoords, aName, aFileName):
+    mesh = _export_mesh(aContext)
+    coords = _array(aUVCoords, mesh.vertex_count, 2) if mesh is not None else None
+    if coords is None or len(mesh.uv_maps) >= MAX_MAPS:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+        return CTM_NONE
+    mesh.uv_maps.append(UVMap(_string(aName) or "", coords, _string(aFileName) or ""))
+    return CTM_UV_MAP_1 + len(mesh.uv_maps) - 1
+
+
+def ctmAddAttribMap(aContext, aAttribValues, aName):
+    mesh = _export_mesh(aContext)
+    values = _array(aAttribValues, mesh.vertex_count, 4) if mesh is not None else None
+    if values is None or len(mesh.attrib_maps) >= MAX_MAPS:
+        _fail(aContext, CTM_INVALID_ARGUMENT)
+        return CTM_NONE
+    mesh.attrib_maps.append(AttribMap(_string(aName) or "", values))
+    return CTM_ATTRIB_MAP_1 + len(mesh.attrib_maps) - 1
+
+
+def ctmLoad(aContext, aFileName):
+    if aContext.mode != CTM_IMPORT:
+        _fail(aContext, CTM_INVALID_OPERATION)
+        return
+    try:
+        aContext.mesh = load(_string(aFileName))
+    except CTMError as e:
+        aContext.mesh = None
+        _fail(aContext, e.code)
+
+
+def _save_mesh(aContext):
+    mesh = _export_mesh(aContext)
+    if mesh is not None:
+        mesh.comment = aContext.comment
+        mesh.method = aContext.method
+        mesh.vertex_precision = aContext.vertex_precision
+        mesh.normal_precision = aContext.normal_precision
+    return mesh
+
+
+def ctmSave(aContext, aFileName):
+    mesh = _save_mesh(aContext)
+    if mesh is None:
+        return
+    try:
+        save(_string(aFileName), mesh, aContext.level)
+    except CTMError as e:
+        _fail(aContext, e.code)
+
+
+class _CallbackStream:
+    """Binary file object over a CTMreadfn/CTMwritefn"""
+
+    def __init__(self, function, user_data):
+        self.function = function
+        self.user_data = user_data
+
+    def readinto(self, destination):
+        view = memoryview(destination).cast("B")
+        if not len(view):
+            return 0
+        address = np.frombuffer(view, dtype=np.uint8).ctypes.data
+        return self.function(address, len(view), self.user_data)
+
+    def read(self, size):
+        data = bytearray(size)
+        return bytes(data[:read_into(self, memoryview(data))])
+
+    def write(self, data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        if len(data) and self.function(data.ctypes.data, len(data), self.user_data) != len(data):
+            raise CTMError(CTM_FILE_ERROR, "Write failed")
+
+
+def ctmLoadCustom(aContext, aReadFn, aUserData):
+    if aContext.mode != CTM_IMPORT:
+        _fail(aContext, CTM_INVALID_OPERATION)
+        return
+    try:
+        aContext.mesh = read_mesh(_CallbackStream(aReadFn, aUserData))
+    except CTMError as e:
+        aContext.mesh = None
+        _fail(aContext, e.code)
+
+
+def ctmSaveCustom(aContext, aWriteFn, aUserData):
+    mesh = _save_mesh(aContext)
+    if mesh is None:
+        return
+    try:
+        write_mesh(_CallbackStream(aWriteFn, aUserData), mesh, aContext.level)
+    except CTMError as e:
+        _fail(aContext, e.code)
+
+
+# Stream helpers (not part of the C API)
+
+
+def ctmLoadStream(aContext, aSource):
+    """ctmLoad from bytes, a memoryview (or any buffer, such as an mmap) or a
+    binary file object through ctmLoadCustom. Returns the bytes read."""
+    reader = StreamReader(aSource)
+    ctmLoadCustom(aContext, reader.function, reader.user_data)
+    reader.raise_error()
+    return reader.count
+
+
+def ctmSaveStream(aContext, aTarget):
+    """ctmSave to a bytearray or a binary file object through ctmSaveCustom.
+    Returns the bytes written."""
+    writer = StreamWriter(aTarget)
+    ctmSaveCustom(aContext, writer.function, writer.user_data)
+    writer.raise_error()
+    return writer.count
@@ -0,0 +1,270 @@
+import numpy as np
+
+from ..constants import *
+from .stream import DEFAULT_CHUNK_SIZE
+
+MAGIC = b"OCTM"
+FORMAT_VERSION = 5
+HAS_NORMALS_BIT = 0x00000001
+
+METHOD_TAGS = {
+    CTM_METHOD_RAW: b"RAW\0",
+    CTM_METHOD_MG1: b"MG1\0",
+    CTM_METHOD_MG2: b"MG2\0",
+}
+TAG_METHODS = {tag: method for method, tag in METHOD_TAGS.items()}
+
+
+def chunks(count, chunk_size, row_size):
+    """(start, end) row ranges keeping about chunk_size bytes of temporaries
+    for rows needing row_size bytes each"""
+    rows = max(1, chunk_size // row_size)
+    for start in range(0, count, rows):
+        yield start, min(start + rows, count)
+
+
+def _segmented_cumsum(values, new_run, run_base):
+    """Running sum of values restarting at every element flagged in new_run
+    (new_run[0] must be set), run i starting from run_base[i]. Wraps like the
+    C integer math."""
+    total = np.cumsum(values, dtype=values.dtype)
+    starts = np.flatnonzero(new_run)
+    offsets = run_base - (total[starts] - values[starts])
+    return total + np.repeat(offsets, np.diff(np.append(starts, len(values))))
+
+
+def _new_runs(keys):
+    new_run = np.empty(len(keys), dtype=bool)
+    new_run[0] = True
+    new_run[1:] = keys[1:] != keys[:-1]
+    return new_run
+
+
+def cumsum_inplace(values, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Running sum along the first axis, in place"""
+    carry = np.zeros(values.shape[1:], dtype=values.dtype)
+    for start, end in chunks(len(values), chunk_size, 16 * values[:1].size):
+        block = values[start:end]
+        np.cumsum(block, axis=0, dtype=values.dtype, out=block)
+        block += carry
+        carry = block[-1].copy()
+
+
+# Triangle indices (MG1, MG2)
+
+
+def rearrange_triangles(indices):
+    """Rotate every triangle so its smallest index comes first, then sort the
+    triangles by their first and second index"""
+    a, b, c = indices[:, 0], indices[:, 1], indices[:, 2]
+    rotate_b = (b < a) & (b < c)
+    rotate_c = (c < a) & (c < b)
+    triangles = indices.copy()
+    triangles[rotate_b] = indices[rotate_b][:, [1, 2, 0]]
+    triangles[rotate_c] = indices[rotate_c][:, [2, 0, 1]]
+    order = np.lexsort((triangles[:, 1], triangles[:, 0]))
+    return triangles[order]
+
+
+def make_index_deltas(triangles):
+    triangles = np.ascontiguousarray(triangles, dtype=np.uint32)
+    first = triangles[:, 0]
+    deltas = np.empty_like(triangles)
+    deltas[:, 2] = triangles[:, 2] - first
+    deltas[:, 1] = triangles[:, 1] - first
+    same = np.zeros(len(first), dtype=bool)
+    same[1:] = first[1:] == first[:-1]
+    deltas[1:, 1][same[1:]] = (triangles[1:, 1] - triangles[:-1, 1])[same[1:]]
+    deltas[:, 0] = first
+    deltas[1:, 0] -= first[:-1]
+    return deltas
+
+
+def restore_indices(indices, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Decode MG1/MG2 triangle index deltas, in place"""
+    previous = None
+    for start, end in chunks(len(indices), chunk_size, 48):
+        block = indices[start:end]
+        first = np.cumsum(block[:, 0], dtype=np.uint32)
+        if previous is not None:
+            first += previous[0]
+        # The second index is relative to the previous second index while the
+        # first index stays the same, else to the first index
+        new_run = _new_runs(first)
+        run_base = first[new_run]
+        if previous is not None and first[0] == previous[0]:
+            run_base[0] = previous[1]
+        block[:, 1] = _segmented_cumsum(block[:, 1], new_run, run_base)
+        block[:, 0] = first
+        block[:, 2] += first
+        previous = block[-1].copy()
+
+
+# Vertex grid (MG2)
+
+
+class Grid:
+    def __init__(self, minimum, maximum, division):
+        self.min = np.asarray(minimum, dtype=np.float32)
+        self.max = np.asarray(maximum, dtype=np.float32)
+        self.division = np.asarray(division, dtype=np.uint32)
+        self.size = (self.max - self.min) / self.division.astype(np.float32)
+
+    @classmethod
+    def for_vertices(cls, vertices):
+        minimum = vertices.min(axis=0)
+        maximum = vertices.max(axis=0)
+        factor = maximum - minimum
+        total = np.float32(factor.sum())
+        if total > 1e-30:
+            factor = factor * (np.float32(1.0) / total)
+            wanted = np.float32(np.power(np.float32(100.0) * len(vertices), np.float32(1.0 / 3.0)))
+            division = np.maximum(np.ceil(wanted * factor), 1).astype(np.uint32)
+        else:
+            division = np.full(3, 4, dtype=np.uint32)
+        return cls(minimum, maximum, division)
+
+    def point_to_index(self, points):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cells = np.floor((points - self.min) / self.size)
+        cells = np.nan_to_num(cells, nan=0.0, posinf=0.0, neginf=0.0)
+        cells = np.clip(cells, 0, self.division - 1).astype(np.uint32)
+        return cells[:, 0] + self.division[0] * (cells[:, 1] + self.division[1] * cells[:, 2])
+
+    def index_to_point(self, indices):
+        x_div = self.division[0]
+        xy_div = self.division[0] * self.division[1]
+        z = indices // xy_div
+        remainder = indices - z * xy_div
+        y = remainder // x_div
+        x = remainder - y * x_div
+        cells = np.stack((x, y, z), axis=1).astype(np.float32)
+        return cells * self.size + self.min
+
+
+def restore_vertices(vertices, grid_indices, grid, precision, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Decode MG2 vertices in place, vertices holding the int32 deltas to the
+    grid box origin on entry (x is also delta coded inside each box)"""
+    ints = vertices.view(np.int32)
+    scale = np.float32(precision)
+    previous = None
+    for start, end in chunks(len(vertices), chunk_size, 64):
+        block = ints[start:end]
+        boxes = grid_indices[start:end]
+        new_run = _new_runs(boxes)
+        run_base = np.zeros(np.count_nonzero(new_run), dtype=np.int32)
+        if previous is not None and boxes[0] == previous[0]:
+            run_base[0] = previous[1]
+        delta_x = _segmented_cumsum(np.ascontiguousarray(block[:, 0]), new_run, run_base)
+        previous = boxes[-1], delta_x[-1]
+
+        points = block.astype(np.float32)
+        points[:, 0] = delta_x
+        points *= scale
+        points += grid.index_to_point(boxes)
+        vertices[start:end] = points
+
+
+# Normals (MG2)
+
+
+def _normalize(vectors):
+    length = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+    vectors /= np.where(length > 1e-10, length, 1.0)[:, None]
+
+
+def smooth_normals(vertices, indices, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Normalized sum of the flat normals of the triangles around each vertex"""
+    sums = np.zeros((len(vertices), 3), dtype=np.float32)
+    for start, end in chunks(len(indices), chunk_size, 256):
+        triangles = indices[start:end].astype(np.intp)
+        v0 = vertices[triangles[:, 0]]
+        normals = np.cross(vertices[triangles[:, 1]] - v0, vertices[triangles[:, 2]] - v0)
+        _normalize(normals)
+        # Only the vertex range used by the chunk is accumulated, which stays
+        # small for the locality sorted MG2 triangles
+        corners = triangles.ravel()
+        low = corners.min()
+        corners -= low
+        span = corners.max() + 1
+        for axis in range(3):
+            sums[low:low + span, axis] += np.bincount(corners, weights=np.repeat(normals[:, axis], 3), minlength=span)
+    _normalize(sums)
+    return sums
+
+
+def normal_coord_sys(normals):
+    """Basis axes (x, y, z) with z along each (unit length) normal"""
+    x = np.stack((-normals[:, 1], normals[:, 0] - normals[:, 2], normals[:, 1]), axis=1)
+    length = np.sqrt(2.0 * x[:, 0] * x[:, 0] + x[:, 1] * x[:, 1])
+    x /= np.where(length > 1e-20, length, 1.0)[:, None]
+    y = np.cross(normals, x)
+    return x, y, normals
+
+
+def restore_normals(normals, smooth, precision, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Decode MG2 normals in place, normals holding the int32 (magnitude, phi,
+    theta) triplets on entry"""
+    ints = normals.view(np.int32)
+    for start, end in chunks(len(normals), chunk_size, 160):
+        block = ints[start:end]
+        magnitude = block[:, 0] * np.float32(precision)
+        int_phi = block[:, 1].view(np.uint32)
+        int_theta = block[:, 2].astype(np.float32)
+        phi = int_phi * np.float32(0.5 * np.pi * precision)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            theta = np.where(
+                int_phi <= 4,
+                np.float32(np.pi / 2.0) * (int_theta - 2.0),
+                (np.float32(2.0 * np.pi) * int_theta) / int_phi - np.float32(np.pi))
+        theta[int_phi == 0] = 0.0
+        sin_phi = np.sin(phi)
+        x, y, z = normal_coord_sys(smooth[start:end])
+        result = (x * (sin_phi * np.cos(theta))[:, None]
+                  + y * (sin_phi * np.sin(theta))[:, None]
+                  + z * np.cos(phi)[:, None])
+        result *= magnitude[:, None]
+        normals[start:end] = result
+
+
+def restore_map(values, precision, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Decode MG2 UV/attribute values in place, values holding the signed
+    magnitude coded int deltas on entry"""
+    bits = values.view(np.uint32)
+    carry = np.zeros(values.shape[1], dtype=np.int32)
+    for start, end in chunks(len(values), chunk_size, 16 * values.shape[1]):
+        block = bits[start:end]
+        deltas = (block >> 1).view(np.int32) ^ -(block & 1).view(np.int32)
+        ints = np.cumsum(deltas, axis=0, dtype=np.int32)
+        ints += carry
+        carry = ints[-1].copy()
+        values[start:end] = ints.astype(np.float32) * np.float32(precision)
+
+
+def make_normal_deltas(normals, smooth, precision):
+    scale = np.float32(1.0 / precision)
+    magnitude = np.sqrt(np.einsum("ij,ij->i", normals, normals))
+    magnitude[magnitude < 1e-10] = 1.0
+    magnitude = np.where(np.einsum("ij,ij->i", smooth, normals) < 0.0, -magnitude, magnitude)
+
+    int_normals = np.empty((len(normals), 3), dtype=np.int32)
+    int_normals[:, 0] = np.floor(scale * magnitude + 0.5)
+
+    # Angular representation (phi, theta) relative to the smooth normal
+    unit = normals / magnitude[:, None]
+    x, y, z = normal_coord_sys(smooth)
+    n_x = np.einsum("ij,ij->i", x, unit)
+    n_y = np.einsum("ij,ij->i", y, unit)
+    n_z = np.einsum("ij,ij->i", z, unit)
+    phi = np.where(n_z >= 1.0, 0.0, np.arccos(np.clip(n_z, -1.0, 1.0)))
+    theta = np.arctan2(n_y, n_x)
+
+    # The theta resolution follows the x/y circumference (roughly phi)
+    int_phi = np.floor(phi * (scale / (0.5 * np.pi)) + 0.5).astype(np.int32)
+    int_theta = np.floor((theta + np.pi) * (int_phi / (2.0 * np.pi)) + 0.5)
+    small = int_phi <= 4
+    int_theta[small] = np.floor((theta[small] + np.pi) * (2.0 / np.pi) + 0.5)
+    int_theta[int_phi == 0] = 0
+    int_normals[:, 1] = int_phi
+    int_normals[:, 2] = int_theta
+    return int_normals
@@ -0,0 +1,54 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from ..constants import *
+
+# Defaults used by the OpenCTM library
+DEFAULT_VERTEX_PRECISION = 1.0 / 1024.0
+DEFAULT_NORMAL_PRECISION = 1.0 / 256.0
+DEFAULT_UV_PRECISION = 1.0 / 4096.0
+DEFAULT_ATTRIB_PRECISION = 1.0 / 256.0
+DEFAULT_COMPRESSION_LEVEL = 1
+MAX_MAPS = 8
+
+
+@dataclass
+class UVMap:
+    name: str
+    coords: np.ndarray
+    """(n, 2) float32"""
+    filename: str = ""
+    precision: float = DEFAULT_UV_PRECISION
+
+
+@dataclass
+class AttribMap:
+    name: str
+    values: np.ndarray
+    """(n, 4) float32"""
+    precision: float = DEFAULT_ATTRIB_PRECISION
+
+
+@dataclass
+class Mesh:
+    vertices: np.ndarray
+    """(n, 3) float32"""
+    indices: np.ndarray
+    """(t, 3) uint32"""
+    normals: np.ndarray = None
+    """(n, 3) float32 or None"""
+    uv_maps: list = field(default_factory=list)
+    attrib_maps: list = field(default_factory=list)
+    comment: str = ""
+    method: int = CTM_METHOD_MG1
+    vertex_precision: float = DEFAULT_VERTEX_PRECISION
+    normal_precision: float = DEFAULT_NORMAL_PRECISION
+
+    @property
+    def vertex_count(self):
+        return len(self.vertices)
+
+    @property
+    def triangle_count(self):
+        return len(self.indices)
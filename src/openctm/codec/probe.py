@@ -0,0 +1,208 @@
+import os
+import sys
+
+import numpy as np
+
+from ..constants import *
+from .format import restore_map
+from .reader import load, read_header
+from .stream import *
+
+METHOD_NAMES = {
+    CTM_METHOD_RAW: "RAW",
+    CTM_METHOD_MG1: "MG1",
+    CTM_METHOD_MG2: "MG2",
+}
+
+
+class MapInfo:
+    """UV or attribute map found by probe(), its values are decoded on demand"""
+
+    def __init__(self, name, filename, precision, offset):
+        self.name = name
+        self.filename = filename
+        self.precision = precision
+        # File offset of the map values
+        self.offset = offset
+
+    def __repr__(self):
+        return "MapInfo(%r)" % self.name
+
+
+class MeshInfo:
+    """Header and section directory of an OpenCTM file"""
+
+    def __init__(self, path, header, file_size):
+        self.path = path
+        self.method = header.method
+        self.vertex_count = header.vertex_count
+        self.triangle_count = header.triangle_count
+        self.has_normals = header.has_normals
+        self.comment = header.comment
+        self.uv_map_count = header.uv_map_count
+        self.attrib_map_count = header.attrib_map_count
+        self.file_size = file_size
+        self.vertex_precision = None
+        self.normal_precision = None
+        self.uv_maps = []
+        self.attrib_maps = []
+        # File offset of each section tag
+        self.sections = {}
+
+    @property
+    def method_name(self):
+        return METHOD_NAMES[self.method]
+
+    @property
+    def uv_map_names(self):
+        return [uv_map.name for uv_map in self.uv_maps]
+
+    @property
+    def attrib_map_names(self):
+        return [attrib_map.name for attrib_map in self.attrib_maps]
+
+    def load(self, **kwargs):
+        """Decode the whole mesh, see reader.load()"""
+        return load(self.path, **kwargs)
+
+    def load_uv_map(self, key):
+        """Decode a single UV map, by name or index, to a (n, 2) float32 array"""
+        return self._load_map(_find(self.uv_maps, key), 2)
+
+    def load_attrib_map(self, key):
+        """Decode a single attribute map, by name or index, to a (n, 4) float32 array"""
+        return self._load_map(_find(self.attrib_maps, key), 4)
+
+    def _load_map(self, map_info, size):
+        values = np.empty((self.vertex_count, size), dtype=np.float32)
+        try:
+            with open(self.path, "rb") as stream:
+                stream.seek(map_info.offset)
+                if self.method == CTM_METHOD_RAW:
+                    read_raw_into(stream, values)
+                else:
+                    read_packed_into(stream, values.view(np.uint32))
+                    if self.method == CTM_METHOD_MG2:
+                        restore_map(values, map_info.precision)
+        except OSError as e:
+            raise CTMError(CTM_FILE_ERROR, str(e))
+        return values
+
+    def map_arrays(self):
+        """Read-only np.memmap views of the arrays of a RAW file, straight
+        from the file without decoding: {"indices": (t, 3) uint32,
+        "vertices"/"normals": (n, 3) float32 (normals None without),
+        "uv_maps": [(n, 2) float32], "attrib_maps": [(n, 4) float32]}"""
+        if self.method != CTM_METHOD_RAW:
+            raise CTMError(CTM_INVALID_OPERATION, "Only RAW files can be mapped")
+        if sys.byteorder != "little":
+            raise CTMError(CTM_INVALID_OPERATION, "RAW files are little endian")
+        n = self.vertex_count
+
+        def view(offset, dtype, rows, columns):
+            if rows == 0:
+                return np.empty((0, columns), dtype=dtype)
+            return np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=(rows, columns))
+
+        try:
+            # Tag offsets, the values follow the 4 byte tags
+            normals = self.sections.get(b"NORM")
+            arrays = {
+                "indices": view(self.sections[b"INDX"] + 4, np.uint32, self.triangle_count, 3),
+                "vertices": view(self.sections[b"VERT"] + 4, np.float32, n, 3),
+                "normals": view(normals + 4, np.float32, n, 3) if normals is not None else None,
+                "uv_maps": [view(uv_map.offset, np.float32, n, 2) for uv_map in self.uv_maps],
+                "attrib_maps": [view(attrib_map.offset, np.float32, n, 4) for attrib_map in self.attrib_maps],
+            }
+        except OSError as e:
+            raise CTMError(CTM_FILE_ERROR, str(e))
+        # Out of range indices would corrupt the mesh, ctmLoad refuses them too
+        if len(arrays["indices"]) and arrays["indices"].max() >= n:
+            raise CTMError(CTM_INVALID_MESH, "Vertex index out of range")
+        return arrays
+
+    def __repr__(self):
+        return "MeshInfo(%r, %s, %d vertices, %d triangles)" % (
+            self.path, self.method_name, self.vertex_count, self.triangle_count)
+
+
+def _find(maps, key):
+    if isinstance(key, int):
+        return maps[key]
+    for map_info in maps:
+        if map_info.name == key:
+            return map_info
+    raise KeyError(key)
+
+
+def _skip_packed(stream):
+    packed_size = read_uint(stream)
+    stream.seek(LZMA_PROPS_SIZE + packed_size, os.SEEK_CUR)
+
+
+def _skip(stream, method, count, size):
+    if method == CTM_METHOD_RAW:
+        stream.seek(4 * count * size, os.SEEK_CUR)
+    else:
+        _skip_packed(stream)
+
+
+def _scan(stream, info):
+    method = info.method
+    n = info.vertex_count
+
+    def section(tag):
+        info.sections[tag] = stream.tell()
+        expect_tag(stream, tag)
+
+    if method == CTM_METHOD_MG2:
+        section(b"MG2H")
+        info.vertex_precision = read_float(stream)
+        info.normal_precision = read_float(stream)
+        stream.seek(6 * 4 + 3 * 4, os.SEEK_CUR)
+        section(b"VERT")
+        _skip_packed(stream)
+        section(b"GIDX")
+        _skip_packed(stream)
+        section(b"INDX")
+        _skip_packed(stream)
+    else:
+        section(b"INDX")
+        _skip(stream, method, info.triangle_count, 3)
+        section(b"VERT")
+        _skip(stream, method, n, 3)
+    if info.has_normals:
+        section(b"NORM")
+        _skip(stream, method, n, 3)
+
+    for _ in range(info.uv_map_count):
+        info.sections.setdefault(b"TEXC", stream.tell())
+        expect_tag(stream, b"TEXC")
+        name = read_string(stream)
+        filename = read_string(stream)
+        precision = read_float(stream) if method == CTM_METHOD_MG2 else None
+        info.uv_maps.append(MapInfo(name, filename, precision, stream.tell()))
+        _skip(stream, method, n, 2)
+    for _ in range(info.attrib_map_count):
+        info.sections.setdefault(b"ATTR", stream.tell())
+        expect_tag(stream, b"ATTR")
+        name = read_string(stream)
+        precision = read_float(stream) if method == CTM_METHOD_MG2 else None
+        info.attrib_maps.append(MapInfo(name, "", precision, stream.tell()))
+        _skip(stream, method, n, 4)
+
+
+def probe(path):
+    """Read the header and section directory of the OpenCTM file at path
+    without decoding any mesh data"""
+    try:
+        with open(path, "rb") as stream:
+            header = read_header(stream)
+            info = MeshInfo(path, header, os.fstat(stream.fileno()).st_size)
+            _scan(stream, info)
+            # Skipped sections are only checked against the file size
+            if stream.tell() > info.file_size:
+                raise CTMError(CTM_BAD_FORMAT, "Unexpected end of file")
+    except OSError as e:
+        raise CTMError(CTM_FILE_ERROR, str(e))
+    return info
@@ -0,0 +1,225 @@
+import numpy as np
+
+from ..constants import *
+from .format import *
+from .mesh import MAX_MAPS, Mesh, UVMap, AttribMap
+from .stream import *
+
+
+class Header:
+    def __init__(self, method, vertex_count, triangle_count, uv_map_count, attrib_map_count, flags, comment):
+        self.method = method
+        self.vertex_count = vertex_count
+        self.triangle_count = triangle_count
+        self.uv_map_count = uv_map_count
+        self.attrib_map_count = attrib_map_count
+        self.flags = flags
+        self.comment = comment
+
+    @property
+    def has_normals(self):
+        return bool(self.flags & HAS_NORMALS_BIT)
+
+
+def read_header(stream):
+    if read_exact(stream, 4) != MAGIC:
+        raise CTMError(CTM_BAD_FORMAT, "Not an OpenCTM file")
+    version = read_uint(stream)
+    if version != FORMAT_VERSION:
+        raise CTMError(CTM_UNSUPPORTED_FORMAT_VERSION, "Unsupported format version %d" % version)
+    method = TAG_METHODS.get(read_exact(stream, 4))
+    if method is None:
+        raise CTMError(CTM_BAD_FORMAT, "Unknown compression method")
+    header = Header(method, read_uint(stream), read_uint(stream), read_uint(stream), read_uint(stream),
+                    read_uint(stream), read_string(stream))
+    if header.vertex_count == 0 or header.triangle_count == 0:
+        raise CTMError(CTM_BAD_FORMAT, "Empty mesh")
+    if header.uv_map_count > MAX_MAPS or header.attrib_map_count > MAX_MAPS:
+        raise CTMError(CTM_BAD_FORMAT, "Too many UV/attribute maps")
+    return header
+
+
+# Bytes of working memory per vertex besides the output arrays, MG2 keeps the
+# grid indices and predicts the normals from the smooth normals
+_MG2_VERTEX_WORK = 4
+_MG2_NORMAL_WORK = 12 + 8
+_MIN_CHUNK_SIZE = 1 << 16
+
+
+def mesh_size(header):
+    """Bytes taken by the decoded arrays of the mesh described by header"""
+    components = 3 + 2 * header.uv_map_count + 4 * header.attrib_map_count
+    if header.has_normals:
+        components += 3
+    return 4 * (3 * header.triangle_count + components * header.vertex_count)
+
+
+class MeshReader:
+    """Decode an OpenCTM file section by section.
+
+    Every section is decoded in chunks of at most chunk_size bytes straight
+    into its preallocated output array, so besides the decoded mesh only a
+    bounded amount of memory is used. With max_memory set the chunk size is
+    reduced to fit the whole decode in that many bytes, CTMError
+    (CTM_OUT_OF_MEMORY) is raised if the mesh alone does not fit.
+    """
+
+    def __init__(self, stream, chunk_size=DEFAULT_CHUNK_SIZE, max_memory=None):
+        self.stream = stream
+        self.header = read_header(stream)
+        self.mesh = Mesh(None, None, comment=self.header.comment, method=self.header.method)
+        self.chunk_size = chunk_size
+        if max_memory is not None:
+            budget = max_memory - mesh_size(self.header)
+            if self.header.method == CTM_METHOD_MG2:
+                work = _MG2_VERTEX_WORK + (_MG2_NORMAL_WORK if self.header.has_normals else 0)
+                budget -= work * self.header.vertex_count
+            if budget < _MIN_CHUNK_SIZE:
+                raise CTMError(CTM_OUT_OF_MEMORY, "Mesh does not fit in %d bytes" % max_memory)
+            self.chunk_size = min(chunk_size, budget)
+
+    def sections(self):
+        """Decode the sections in file order, yielding each section tag once
+        its data is in self.mesh"""
+        if self.header.method == CTM_METHOD_RAW:
+            yield from self._raw_sections()
+        elif self.header.method == CTM_METHOD_MG1:
+            yield from self._mg1_sections()
+        else:
+            yield from self._mg2_sections()
+
+    def read(self):
+        """Decode the whole file and return the Mesh"""
+        for _ in self.sections():
+            pass
+        if self.mesh.indices.max(initial=0) >= self.header.vertex_count:
+            raise CTMError(CTM_INVALID_MESH, "Triangle index out of range")
+        return self.mesh
+
+    def _raw(self, count, size, dtype):
+        values = np.empty((count, size), dtype=dtype)
+        read_raw_into(self.stream, values, self.chunk_size)
+        return values
+
+    def _packed(self, count, size, dtype):
+        values = np.empty((count, size), dtype=dtype)
+        read_packed_into(self.stream, values.view(np.uint32), self.chunk_size)
+        return values
+
+    def _raw_sections(self):
+        stream, header, mesh = self.stream, self.header, self.mesh
+        expect_tag(stream, b"INDX")
+        mesh.indices = self._raw(header.triangle_count, 3, np.uint32)
+        yield "INDX"
+        expect_tag(stream, b"VERT")
+        mesh.vertices = self._raw(header.vertex_count, 3, np.float32)
+        yield "VERT"
+        if header.has_normals:
+            expect_tag(stream, b"NORM")
+            mesh.normals = self._raw(header.vertex_count, 3, np.float32)
+            yield "NORM"
+        for _ in range(header.uv_map_count):
+            expect_tag(stream, b"TEXC")
+            name = read_string(stream)
+            filename = read_string(stream)
+            mesh.uv_maps.append(UVMap(name, self._raw(header.vertex_count, 2, np.float32), filename))
+            yield "TEXC"
+        for _ in range(header.attrib_map_count):
+            expect_tag(stream, b"ATTR")
+            name = read_string(stream)
+            mesh.attrib_maps.append(AttribMap(name, self._raw(header.vertex_count, 4, np.float32)))
+            yield "ATTR"
+
+    def _mg1_sections(self):
+        stream, header, mesh = self.stream, self.header, self.mesh
+        expect_tag(stream, b"INDX")
+        mesh.indices = self._packed(header.triangle_count, 3, np.uint32)
+        restore_indices(mesh.indices, self.chunk_size)
+        yield "INDX"
+        expect_tag(stream, b"VERT")
+        mesh.vertices = self._packed(header.vertex_count * 3, 1, np.float32).reshape((-1, 3))
+        yield "VERT"
+        if header.has_normals:
+            expect_tag(stream, b"NORM")
+            mesh.normals = self._packed(header.vertex_count, 3, np.float32)
+            yield "NORM"
+        for _ in range(header.uv_map_count):
+            expect_tag(stream, b"TEXC")
+            name = read_string(stream)
+            filename = read_string(stream)
+            mesh.uv_maps.append(UVMap(name, self._packed(header.vertex_count, 2, np.float32), filename))
+            yield "TEXC"
+        for _ in range(header.attrib_map_count):
+            expect_tag(stream, b"ATTR")
+            name = read_string(stream)
+            mesh.attrib_maps.append(AttribMap(name, self._packed(header.vertex_count, 4, np.float32)))
+            yield "ATTR"
+
+    def _mg2_sections(self):
+        stream, header, mesh = self.stream, self.header, self.mesh
+        expect_tag(stream, b"MG2H")
+        mesh.vertex_precision = read_float(stream)
+        mesh.normal_precision = read_float(stream)
+        minimum = [read_float(stream) for _ in range(3)]
+        maximum = [read_float(stream) for _ in range(3)]
+        division = [read_uint(stream) for _ in range(3)]
+        if min(division) < 1:
+            raise CTMError(CTM_BAD_FORMAT, "Bad MG2 grid")
+        grid = Grid(minimum, maximum, division)
+
+        # The vertex deltas are decoded into the vertex array itself
+        expect_tag(stream, b"VERT")
+        vertices = self._packed(header.vertex_count, 3, np.float32)
+        expect_tag(stream, b"GIDX")
+        grid_indices = self._packed(header.vertex_count, 1, np.uint32)
+        cumsum_inplace(grid_indices, self.chunk_size)
+        expect_tag(stream, b"INDX")
+        mesh.indices = self._packed(header.triangle_count, 3, np.uint32)
+        restore_indices(mesh.indices, self.chunk_size)
+        if mesh.indices.max(initial=0) >= header.vertex_count:
+            raise CTMError(CTM_INVALID_MESH, "Triangle index out of range")
+        yield "INDX"
+        restore_vertices(vertices, grid_indices[:, 0], grid, mesh.vertex_precision, self.chunk_size)
+        mesh.vertices = vertices
+        del grid_indices
+        yield "VERT"
+
+        if header.has_normals:
+            expect_tag(stream, b"NORM")
+            normals = self._packed(header.vertex_count, 3, np.float32)
+            smooth = smooth_normals(mesh.vertices, mesh.indices, self.chunk_size)
+            restore_normals(normals, smooth, mesh.normal_precision, self.chunk_size)
+            mesh.normals = normals
+            del smooth
+            yield "NORM"
+        for _ in range(header.uv_map_count):
+            expect_tag(stream, b"TEXC")
+            name = read_string(stream)
+            filename = read_string(stream)
+            precision = read_float(stream)
+            coords = self._packed(header.vertex_count, 2, np.float32)
+            restore_map(coords, precision, self.chunk_size)
+            mesh.uv_maps.append(UVMap(name, coords, filename, precision))
+            yield "TEXC"
+        for _ in range(header.attrib_map_count):
+            expect_tag(stream, b"ATTR")
+            name = read_string(stream)
+            precision = read_float(stream)
+            values = self._packed(header.vertex_count, 4, np.float32)
+            restore_map(values, precision, self.chunk_size)
+            mesh.attrib_maps.append(AttribMap(name, values, precision))
+            yield "ATTR"
+
+
+def read_mesh(stream, chunk_size=DEFAULT_CHUNK_SIZE, max_memory=None):
+    """Decode an OpenCTM file from a binary file object into a Mesh"""
+    return MeshReader(stream, chunk_size, max_memory).read()
+
+
+def load(path, chunk_size=DEFAULT_CHUNK_SIZE, max_memory=None):
+    """Decode the OpenCTM file at path into a Mesh"""
+    try:
+        with open(path, "rb") as stream:
+            return read_mesh(stream, chunk_size, max_memory)
+    except OSError as e:
+        raise CTMError(CTM_FILE_ERROR, str(e))
@@ -0,0 +1,181 @@
+import lzma
+import struct
+import sys
+
+import numpy as np
+
+from ..constants import *
+
+LZMA_PROPS_SIZE = 5
+DEFAULT_CHUNK_SIZE = 1 << 24
+_LZMA_DICT_SIZE_MIN = 1 << 12
+
+
+class CTMError(Exception):
+    """Codec failure carrying the OpenCTM error code (CTM_BAD_FORMAT, ...)"""
+
+    def __init__(self, code, message=""):
+        super().__init__(message or "OpenCTM error 0x%04x" % code)
+        self.code = code
+
+
+def read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise CTMError(CTM_BAD_FORMAT, "Unexpected end of file")
+    return data
+
+
+def read_uint(stream):
+    return struct.unpack("<I", read_exact(stream, 4))[0]
+
+
+def read_float(stream):
+    return struct.unpack("<f", read_exact(stream, 4))[0]
+
+
+def read_string(stream):
+    length = read_uint(stream)
+    return read_exact(stream, length).decode("utf-8", errors="replace")
+
+
+def expect_tag(stream, tag):
+    if read_exact(stream, 4) != tag:
+        raise CTMError(CTM_BAD_FORMAT, "Missing %s section" % tag.decode("ascii"))
+
+
+def write_uint(stream, value):
+    stream.write(struct.pack("<I", value))
+
+
+def write_float(stream, value):
+    stream.write(struct.pack("<f", value))
+
+
+def write_string(stream, value):
+    data = (value or "").encode("utf-8")
+    write_uint(stream, len(data))
+    stream.write(data)
+
+
+def read_raw_into(stream, destination, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Fill a C-contiguous 4-byte array from plain little endian data"""
+    view = memoryview(destination.reshape(-1).view(np.uint8))
+    position = 0
+    while position < len(view):
+        read = stream.readinto(view[position:position + chunk_size])
+        if not read:
+            raise CTMError(CTM_BAD_FORMAT, "Unexpected end of file")
+        position += read
+    if sys.byteorder != "little":
+        destination.byteswap(inplace=True)
+
+
+def write_raw(stream, array, dtype):
+    stream.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+
+# LZMA packed arrays
+#
+# Packed arrays are LZMA1 streams (raw, 5 byte props header) of the array
+# bytes split into byte planes: for an array of `count` elements with `size`
+# components, all bytes of one significance are stored together, component by
+# component, starting with the most significant byte.
+
+
+def _lzma_filters(props):
+    value = props[0]
+    lc = value % 9
+    value //= 9
+    lp = value % 5
+    pb = value // 5
+    dict_size = max(int.from_bytes(props[1:5], "little"), _LZMA_DICT_SIZE_MIN)
+    return [{"id": lzma.FILTER_LZMA1, "lc": lc, "lp": lp, "pb": pb, "dict_size": dict_size}]
+
+
+def lzma_dict_size(level):
+    # Same dictionary sizes as the LZMA SDK used by OpenCTM
+    if level <= 5:
+        return 1 << (level * 2 + 14)
+    if level == 6:
+        return 1 << 25
+    return 1 << 26
+
+
+def lzma_compress(data, level):
+    dict_size = lzma_dict_size(level)
+    filters = [{"id": lzma.FILTER_LZMA1, "preset": level, "dict_size": dict_size, "lc": 3, "lp": 0, "pb": 2}]
+    packed = lzma.compress(data, format=lzma.FORMAT_RAW, filters=filters)
+    props = bytes(((2 * 5 + 0) * 9 + 3,)) + dict_size.to_bytes(4, "little")
+    return props, packed
+
+
+def read_packed_into(stream, destination, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Decode a packed array straight into destination, a C-contiguous
+    (count, size) uint32 array, inflating at most chunk_size bytes at a time"""
+    count, size = destination.shape
+    total = 4 * count * size
+    packed_size = read_uint(stream)
+    props = read_exact(stream, LZMA_PROPS_SIZE)
+    try:
+        decompressor = lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=_lzma_filters(props))
+    except (lzma.LZMAError, ValueError) as e:
+        raise CTMError(CTM_LZMA_ERROR, str(e))
+
+    # Byte plane p (most significant first) of component k is byte 3 - p of
+    # each element of column k
+    elements = destination.view(np.uint8).reshape((count, size, 4))
+    if sys.byteorder != "little":
+        elements = elements[:, :, ::-1]
+    position = 0
+    remaining = packed_size
+    while position < total:
+        data = b""
+        if decompressor.needs_input:
+            if not remaining:
+                raise CTMError(CTM_LZMA_ERROR, "Packed data is truncated")
+            data = read_exact(stream, min(chunk_size, remaining))
+            remaining -= len(data)
+        try:
+            output = decompressor.decompress(data, max_length=min(chunk_size, total - position))
+        except (lzma.LZMAError, EOFError) as e:
+            raise CTMError(CTM_LZMA_ERROR, str(e))
+        output = np.frombuffer(output, dtype=np.uint8)
+        offset = 0
+        while offset < len(output):
+            row, first = divmod(position, count)
+            plane, column = divmod(row, size)
+            length = min(count - first, len(output) - offset)
+            elements[first:first + length, column, 3 - plane] = output[offset:offset + length]
+            offset += length
+            position += length
+    if remaining:
+        read_exact(stream, remaining)
+
+
+def _write_packed(stream, planes, level):
+    props, packed = lzma_compress(planes.tobytes(), level)
+    write_uint(stream, len(packed))
+    stream.write(props)
+    stream.write(packed)
+
+
+def _write_values(stream, values, level):
+    count, size = values.shape
+    values = np.ascontiguousarray(values, dtype=">u4")
+    planes = values.view(np.uint8).reshape((count, size, 4)).transpose(2, 1, 0)
+    _write_packed(stream, np.ascontiguousarray(planes), level)
+
+
+def write_packed_ints(stream, values, signed, level):
+    values = np.asarray(values)
+    if signed:
+        # Two's complement to signed magnitude
+        values = values.astype(np.int32)
+        values = ((values << 1) ^ (values >> 31)).view(np.uint32)
+    _write_values(stream, values.astype(np.uint32, copy=False), level)
+
+
+def write_packed_floats(stream, values, level):
+    values = np.ascontiguousarray(values, dtype=np.float32)
+    _write_values(stream, values.view(np.uint32), level)
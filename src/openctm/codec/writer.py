@@ -0,0 +1,173 @@
+import numpy as np
+
+from ..constants import *
+from .format import *
+from .mesh import DEFAULT_COMPRESSION_LEVEL
+from .stream import *
+
+
+def average_edge_length(vertices, indices):
+    """Average triangle edge length, base of ctmVertexPrecisionRel"""
+    corners = vertices[indices.astype(np.intp)]
+    total = 0.0
+    for a, b in ((0, 1), (1, 2), (2, 0)):
+        edges = corners[:, b] - corners[:, a]
+        total += np.sqrt(np.einsum("ij,ij->i", edges, edges)).sum(dtype=np.float64)
+    return float(total / (3 * len(indices)))
+
+
+def check_mesh(mesh):
+    if mesh.vertex_count == 0 or mesh.triangle_count == 0:
+        raise CTMError(CTM_INVALID_MESH, "Empty mesh")
+    if mesh.indices.max(initial=0) >= mesh.vertex_count:
+        raise CTMError(CTM_INVALID_MESH, "Triangle index out of range")
+    arrays = [mesh.vertices, mesh.normals]
+    arrays += [uv_map.coords for uv_map in mesh.uv_maps]
+    arrays += [attrib_map.values for attrib_map in mesh.attrib_maps]
+    for array in arrays:
+        if array is not None and not np.isfinite(array).all():
+            raise CTMError(CTM_INVALID_MESH, "Mesh contains non finite values")
+
+
+def _write_header(stream, mesh):
+    stream.write(MAGIC)
+    write_uint(stream, FORMAT_VERSION)
+    stream.write(METHOD_TAGS[mesh.method])
+    write_uint(stream, mesh.vertex_count)
+    write_uint(stream, mesh.triangle_count)
+    write_uint(stream, len(mesh.uv_maps))
+    write_uint(stream, len(mesh.attrib_maps))
+    write_uint(stream, HAS_NORMALS_BIT if mesh.normals is not None else 0)
+    write_string(stream, mesh.comment)
+
+
+def _write_raw(stream, mesh, level):
+    stream.write(b"INDX")
+    write_raw(stream, mesh.indices, "<u4")
+    stream.write(b"VERT")
+    write_raw(stream, mesh.vertices, "<f4")
+    if mesh.normals is not None:
+        stream.write(b"NORM")
+        write_raw(stream, mesh.normals, "<f4")
+    for uv_map in mesh.uv_maps:
+        stream.write(b"TEXC")
+        write_string(stream, uv_map.name)
+        write_string(stream, uv_map.filename)
+        write_raw(stream, uv_map.coords, "<f4")
+    for attrib_map in mesh.attrib_maps:
+        stream.write(b"ATTR")
+        write_string(stream, attrib_map.name)
+        write_raw(stream, attrib_map.values, "<f4")
+
+
+def _write_mg1(stream, mesh, level):
+    stream.write(b"INDX")
+    write_packed_ints(stream, make_index_deltas(rearrange_triangles(mesh.indices)), False, level)
+    stream.write(b"VERT")
+    write_packed_floats(stream, mesh.vertices.reshape((-1, 1)), level)
+    if mesh.normals is not None:
+        stream.write(b"NORM")
+        write_packed_floats(stream, mesh.normals, level)
+    for uv_map in mesh.uv_maps:
+        stream.write(b"TEXC")
+        write_string(stream, uv_map.name)
+        write_string(stream, uv_map.filename)
+        write_packed_floats(stream, uv_map.coords, level)
+    for attrib_map in mesh.attrib_maps:
+        stream.write(b"ATTR")
+        write_string(stream, attrib_map.name)
+        write_packed_floats(stream, attrib_map.values, level)
+
+
+def _make_map_deltas(values, order, precision):
+    scale = np.float32(1.0 / precision)
+    int_values = np.floor(scale * values[order] + np.float32(0.5)).astype(np.int32)
+    int_values[1:] -= int_values[:-1].copy()
+    return int_values
+
+
+def _write_mg2(stream, mesh, level):
+    vertices = np.asarray(mesh.vertices, dtype=np.float32)
+    grid = Grid.for_vertices(vertices)
+
+    # Sort the vertices by grid box, then by x inside each box
+    grid_indices = grid.point_to_index(vertices)
+    order = np.lexsort((vertices[:, 0], grid_indices))
+    grid_indices = grid_indices[order]
+    sorted_vertices = vertices[order]
+
+    scale = np.float32(1.0 / mesh.vertex_precision)
+    int_vertices = np.floor(scale * (sorted_vertices - grid.index_to_point(grid_indices)) + np.float32(0.5))
+    int_vertices = int_vertices.astype(np.int32)
+    same_box = np.zeros(len(grid_indices), dtype=bool)
+    same_box[1:] = grid_indices[1:] == grid_indices[:-1]
+    delta_x = int_vertices[:, 0].copy()
+    int_vertices[1:, 0][same_box[1:]] -= delta_x[:-1][same_box[1:]]
+
+    # Triangles refer to the sorted vertices
+    remap = np.empty(len(order), dtype=np.uint32)
+    remap[order] = np.arange(len(order), dtype=np.uint32)
+    triangles = rearrange_triangles(remap[mesh.indices])
+
+    stream.write(b"MG2H")
+    write_float(stream, mesh.vertex_precision)
+    write_float(stream, mesh.normal_precision)
+    for value in grid.min:
+        write_float(stream, value)
+    for value in grid.max:
+        write_float(stream, value)
+    for value in grid.division:
+        write_uint(stream, int(value))
+
+    stream.write(b"VERT")
+    write_packed_ints(stream, int_vertices, False, level)
+    stream.write(b"GIDX")
+    grid_deltas = grid_indices.copy()
+    grid_deltas[1:] -= grid_indices[:-1]
+    write_packed_ints(stream, grid_deltas.reshape((-1, 1)), False, level)
+    stream.write(b"INDX")
+    write_packed_ints(stream, make_index_deltas(triangles), False, level)
+
+    if mesh.normals is not None:
+        # Normals are predicted from the vertices as the decoder will see them
+        restored = int_vertices.view(np.float32).copy()
+        restore_vertices(restored, grid_indices, grid, mesh.vertex_precision)
+        smooth = smooth_normals(restored, triangles)
+        normals = np.asarray(mesh.normals, dtype=np.float32)[order]
+        stream.write(b"NORM")
+        write_packed_ints(stream, make_normal_deltas(normals, smooth, mesh.normal_precision), False, level)
+
+    for uv_map in mesh.uv_maps:
+        stream.write(b"TEXC")
+        write_string(stream, uv_map.name)
+        write_string(stream, uv_map.filename)
+        write_float(stream, uv_map.precision)
+        write_packed_ints(stream, _make_map_deltas(uv_map.coords, order, uv_map.precision), True, level)
+    for attrib_map in mesh.attrib_maps:
+        stream.write(b"ATTR")
+        write_string(stream, attrib_map.name)
+        write_float(stream, attrib_map.precision)
+        write_packed_ints(stream, _make_map_deltas(attrib_map.values, order, attrib_map.precision), True, level)
+
+
+_WRITERS = {
+    CTM_METHOD_RAW: _write_raw,
+    CTM_METHOD_MG1: _write_mg1,
+    CTM_METHOD_MG2: _write_mg2,
+}
+
+
+def write_mesh(stream, mesh, level=DEFAULT_COMPRESSION_LEVEL):
+    """Encode a Mesh to a binary file object, using mesh.method"""
+    check_mesh(mesh)
+    _write_header(stream, mesh)
+    _WRITERS[mesh.method](stream, mesh, level)
+
+
+def save(path, mesh, level=DEFAULT_COMPRESSION_LEVEL):
+    """Encode a Mesh to the OpenCTM file at path"""
+    try:
+        with open(path, "wb") as stream:
+            write_mesh(stream, mesh, level)
+    except OSError as e:
+        raise CTMError(CTM_FILE_ERROR, str(e))
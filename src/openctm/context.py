@@ -0,0 +1,198 @@
+import os
+import threading
+
+import numpy as np
+
+from . import (
+    ctmCompressionLevel,
+    ctmCompressionMethod,
+    ctmErrorString,
+    ctmFileComment,
+    ctmFreeContext,
+    ctmGetError,
+    ctmGetInteger,
+    ctmNewContext,
+    ctmNormalPrecision,
+    ctmVertexPrecision,
+)
+from .codec.mesh import DEFAULT_COMPRESSION_LEVEL, DEFAULT_NORMAL_PRECISION, DEFAULT_VERTEX_PRECISION
+from .codec.stream import CTMError
+from .constants import *
+
+# Byte alignment of the array buffers of a context
+BUFFER_ALIGNMENT = 64
+# Contexts of meshes with more vertices are freed instead of pooled, their
+# setup cost is small next to the mesh and the context (import) or the
+# buffers (export) would keep its arrays alive
+POOL_MAX_VERTICES = 1 << 16
+# Buffers a pooled context keeps, larger ones are dropped on release
+POOL_BUFFER_BYTES = 16 << 20
+
+
+def _error_text(error):
+    text = ctmErrorString(error)
+    return text.decode("ascii", "replace") if text else "OpenCTM error 0x%04x" % error
+
+
+class CTMContext:
+    """OpenCTM context with context manager semantics: leaving the with
+    block raises CTMError for an error the context recorded, and hands the
+    context back to its ContextPool (or frees it without one).
+
+    handle is what the ctm* functions take. array() gives the export arrays
+    in the form OpenCTM reads, reusing grow-only aligned buffers of the
+    context when they need a copy.
+    """
+
+    def __init__(self, mode, pool=None):
+        self.mode = mode
+        self.pool = pool
+        self.handle = ctmNewContext(mode)
+        if not self.handle:
+            raise CTMError(CTM_OUT_OF_MEMORY, "Could not create an OpenCTM context")
+        self._buffers = []
+        self._used = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        error = ctmGetError(self.handle)
+        if exc_type is None and error == CTM_NONE:
+            self.release()
+        else:
+            # Contexts that failed are not reused
+            self.close()
+        if exc_type is None and error != CTM_NONE:
+            raise CTMError(error, _error_text(error))
+        return False
+
+    def release(self):
+        """Hand the context back to its pool, or free it without one. Views
+        of its arrays (ctmGetArrayView) are invalid afterwards."""
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            self.close()
+
+    def check(self, message=""):
+        """Raise CTMError, prefixed by message, if an OpenCTM call failed
+        since the last check"""
+        error = ctmGetError(self.handle)
+        if error != CTM_NONE:
+            text = _error_text(error)
+            raise CTMError(error, f"{message}: {text}" if message else text)
+
+    def array(self, values, dtype):
+        """values as a C contiguous dtype array, values itself when it
+        already is one, else a copy in the next buffer of the context. The
+        buffers stay valid until the context is released."""
+        values = np.asarray(values)
+        if values.dtype == dtype and values.flags.c_contiguous:
+            return values
+        dtype = np.dtype(dtype)
+        nbytes = values.size * dtype.itemsize
+        if self._used == len(self._buffers):
+            self._buffers.append(np.empty(0, dtype=np.uint8))
+        buffer = self._buffers[self._used]
+        if len(buffer) < nbytes + BUFFER_ALIGNMENT:
+            # Grow only, to the next power of two
+            buffer = np.empty(1 << (nbytes + BUFFER_ALIGNMENT - 1).bit_length(), dtype=np.uint8)
+            self._buffers[self._used] = buffer
+        self._used += 1
+        offset = -buffer.ctypes.data % BUFFER_ALIGNMENT
+        array = buffer[offset:offset + nbytes].view(dtype).reshape(values.shape)
+        np.copyto(array, values, casting="unsafe")
+        return array
+
+    def vertex_count(self):
+        return ctmGetInteger(self.handle, CTM_VERTEX_COUNT)
+
+    def reset(self):
+        """Back to the settings of a new context, for reuse"""
+        self._used = 0
+        if self.mode == CTM_EXPORT:
+            ctmFileComment(self.handle, None)
+            ctmCompressionMethod(self.handle, CTM_METHOD_MG1)
+            ctmCompressionLevel(self.handle, DEFAULT_COMPRESSION_LEVEL)
+            ctmVertexPrecision(self.handle, DEFAULT_VERTEX_PRECISION)
+            ctmNormalPrecision(self.handle, DEFAULT_NORMAL_PRECISION)
+        ctmGetError(self.handle)
+
+    def trim(self, max_bytes):
+        """Drop the buffers beyond max_bytes in total"""
+        kept = 0
+        for index, buffer in enumerate(self._buffers):
+            kept += len(buffer)
+            if kept > max_bytes:
+                del self._buffers[index:]
+                break
+
+    def close(self):
+        """Free the OpenCTM context, the handle and buffers are unusable
+        afterwards"""
+        if self.handle:
+            ctmFreeContext(self.handle)
+            self.handle = None
+        self._buffers = []
+
+
+class ContextPool:
+    """Thread-safe pool of up to max_contexts free CTMContext per mode, which
+    saves creating a context and allocating its buffers for every file.
+
+    with pool.acquire(CTM_EXPORT) as ctm:
+        ctmDefineMesh(ctm.handle, ...)
+    """
+
+    def __init__(self, max_contexts=None):
+        self.max_contexts = max_contexts or 2 * (os.cpu_count() or 1)
+        self._free = {CTM_IMPORT: [], CTM_EXPORT: []}
+        self._lock = threading.Lock()
+
+    def acquire(self, mode):
+        """A CTMContext of mode (CTM_IMPORT or CTM_EXPORT), reused when one
+        is free"""
+        with self._lock:
+            free = self._free[mode]
+            context = free.pop() if free else None
+        if context is None:
+            return CTMContext(mode, self)
+        context.reset()
+        return context
+
+    def release(self, context):
+        """Take back a context once its arrays are no longer used, called on
+        leaving its with block"""
+        if context.vertex_count() > POOL_MAX_VERTICES:
+            context.close()
+            return
+        context.trim(POOL_BUFFER_BYTES)
+        with self._lock:
+            free = self._free[context.mode]
+            if len(free) < self.max_contexts:
+                free.append(context)
+                return
+        context.close()
+
+    def clear(self):
+        """Free the pooled contexts"""
+        with self._lock:
+            contexts = [context for free in self._free.values() for context in free]
+            for free in self._free.values():
+                free.clear()
+        for context in contexts:
+            context.close()
+
+
+_pool = ContextPool()
+
+
+def pooled_context(mode):
+    """A CTMContext of mode from the pool shared by the package"""
+    return _pool.acquire(mode)
+
+
+def clear_pool():
+    """Free the contexts of the shared pool"""
+    _pool.clear()
@@ -0,0 +1,548 @@
+"""Batch conversion between OpenCTM and NumPy (.npz), binary PLY and OBJ
+files, without Blender:
+
+    python -m openctm models/ --to ply --output converted/ --jobs 16
+    python -m openctm converted/ --to ctm --method MG2 --output models/
+
+Directories are searched recursively and mirrored below --output. Files
+are converted in a process pool, one file per task, and written in chunks
+to a temporary name that replaces the output once complete.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from ctypes import POINTER, c_float, c_uint
+
+import numpy as np
+
+from . import *
+from .codec.mesh import AttribMap, Mesh, UVMap
+from .codec.stream import CTMError
+
+# Rows formatted or packed per write of the streaming writers
+CHUNK_ROWS = 1 << 16
+
+METHODS = {"RAW": CTM_METHOD_RAW, "MG1": CTM_METHOD_MG1, "MG2": CTM_METHOD_MG2}
+
+
+class CTMSettings:
+    """Compression of the .ctm files written, defaults match the add-on"""
+
+    def __init__(self, method=CTM_METHOD_MG1, level=1, vertex_precision=0.01, normal_precision=1.0 / 256.0,
+                 uv_precision=1.0 / 1024.0, attrib_precision=1.0 / 256.0):
+        self.method = method
+        self.level = level
+        # Relative to the average edge length
+        self.vertex_precision = vertex_precision
+        self.normal_precision = normal_precision
+        self.uv_precision = uv_precision
+        self.attrib_precision = attrib_precision
+
+
+def _text(value):
+    return value.decode("utf-8", "replace") if value else ""
+
+
+def read_ctm(path):
+    """Load a .ctm file into a Mesh, RAW files are memory-mapped"""
+    info = probe(path)
+    if info.method == CTM_METHOD_RAW and sys.byteorder == "little":
+        arrays = info.map_arrays()
+        return Mesh(arrays["vertices"], arrays["indices"], arrays["normals"],
+                    [UVMap(uv_map.name, coords, uv_map.filename)
+                     for uv_map, coords in zip(info.uv_maps, arrays["uv_maps"])],
+                    [AttribMap(attrib_map.name, values)
+                     for attrib_map, values in zip(info.attrib_maps, arrays["attrib_maps"])],
+                    info.comment, CTM_METHOD_RAW)
+
+    with pooled_context(CTM_IMPORT) as ctm:
+        context = ctm.handle
+        ctmLoad(context, os.fsencode(path))
+        ctm.check()
+        mesh = Mesh(np.array(ctmGetArrayView(context, CTM_VERTICES)),
+                    np.array(ctmGetArrayView(context, CTM_INDICES)),
+                    comment=_text(ctmGetString(context, CTM_FILE_COMMENT)),
+                    method=ctmGetInteger(context, CTM_COMPRESSION_METHOD))
+        if ctmGetInteger(context, CTM_HAS_NORMALS):
+            mesh.normals = np.array(ctmGetArrayView(context, CTM_NORMALS))
+        for index in range(ctmGetInteger(context, CTM_UV_MAP_COUNT)):
+            uv_map = CTM_UV_MAP_1 + index
+            mesh.uv_maps.append(UVMap(_text(ctmGetUVMapString(context, uv_map, CTM_NAME)),
+                                      np.array(ctmGetArrayView(context, uv_map)),
+                                      _text(ctmGetUVMapString(context, uv_map, CTM_FILE_NAME)),
+                                      ctmGetUVMapFloat(context, uv_map, CTM_PRECISION)))
+        for index in range(ctmGetInteger(context, CTM_ATTRIB_MAP_COUNT)):
+            attrib_map = CTM_ATTRIB_MAP_1 + index
+            mesh.attrib_maps.append(AttribMap(_text(ctmGetAttribMapString(context, attrib_map, CTM_NAME)),
+                                              np.array(ctmGetArrayView(context, attrib_map)),
+                                              ctmGetAttribMapFloat(context, attrib_map, CTM_PRECISION)))
+    return mesh
+
+
+def write_ctm(path, mesh, settings=None):
+    """Compress a Mesh to a .ctm file"""
+    settings = settings or CTMSettings()
+    with pooled_context(CTM_EXPORT) as ctm:
+        context = ctm.handle
+        # Referenced by the context until ctmSave
+        arrays = []
+
+        def pointer(array, dtype):
+            array = ctm.array(array, dtype)
+            arrays.append(array)
+            return array.ctypes.data_as(POINTER(c_uint if dtype == np.uint32 else c_float))
+
+        ctmFileComment(context, mesh.comment.encode("utf-8"))
+        normals = pointer(mesh.normals, np.float32) if mesh.normals is not None else POINTER(c_float)()
+        ctmDefineMesh(context, pointer(mesh.vertices, np.float32), len(mesh.vertices),
+                      pointer(mesh.indices, np.uint32), len(mesh.indices), normals)
+        for uv_map in mesh.uv_maps:
+            map_id = ctmAddUVMap(context, pointer(uv_map.coords, np.float32), uv_map.name.encode("utf-8"),
+                                 uv_map.filename.encode("utf-8") or None)
+            if settings.method == CTM_METHOD_MG2:
+                ctmUVCoordPrecision(context, map_id, settings.uv_precision)
+        for attrib_map in mesh.attrib_maps:
+            map_id = ctmAddAttribMap(context, pointer(attrib_map.values, np.float32),
+                                     attrib_map.name.encode("utf-8"))
+            if settings.method == CTM_METHOD_MG2:
+                ctmAttribPrecision(context, map_id, settings.attrib_precision)
+        ctmCompressionMethod(context, settings.method)
+        ctmCompressionLevel(context, settings.level)
+        if settings.method == CTM_METHOD_MG2:
+            ctmVertexPrecisionRel(context, settings.vertex_precision)
+            if mesh.normals is not None:
+                ctmNormalPrecision(context, settings.normal_precision)
+        ctm.check()
+        ctmSave(context, os.fsencode(path))
+        ctm.check()
+
+
+def read_npz(path):
+    """Load a Mesh saved by write_npz()"""
+    with np.load(path) as data:
+        mesh = Mesh(data["vertices"].astype(np.float32), data["indices"].astype(np.uint32),
+                    data["normals"].astype(np.float32) if "normals" in data else None,
+                    comment=str(data["comment"]) if "comment" in data else "")
+        uv_names = data["uv_names"] if "uv_names" in data else []
+        for index, name in enumerate(uv_names):
+            mesh.uv_maps.append(UVMap(str(name), data[f"uv{index}"].astype(np.float32)))
+        attrib_names = data["attrib_names"] if "attrib_names" in data else []
+        for index, name in enumerate(attrib_names):
+            mesh.attrib_maps.append(AttribMap(str(name), data[f"attrib{index}"].astype(np.float32)))
+    return mesh
+
+
+def write_npz(path, mesh):
+    """Save a Mesh as NumPy arrays: vertices, indices, normals (optional),
+    uv0.. with uv_names, attrib0.. with attrib_names and comment"""
+    arrays = {"vertices": mesh.vertices, "indices": mesh.indices, "comment": np.array(mesh.comment)}
+    if mesh.normals is not None:
+        arrays["normals"] = mesh.normals
+    arrays["uv_names"] = np.array([uv_map.name for uv_map in mesh.uv_maps], dtype=str)
+    for index, uv_map in enumerate(mesh.uv_maps):
+        arrays[f"uv{index}"] = uv_map.coords
+    arrays["attrib_names"] = np.array([attrib_map.name for attrib_map in mesh.attrib_maps], dtype=str)
+    for index, attrib_map in enumerate(mesh.attrib_maps):
+        arrays[f"attrib{index}"] = attrib_map.values
+    with open(path, "wb") as stream:
+        np.savez(stream, **arrays)
+
+
+def _colour_map(mesh):
+    # The attribute map written as vertex colors to PLY/OBJ
+    for attrib_map in mesh.attrib_maps:
+        if attrib_map.name == "Color":
+            return attrib_map
+    return mesh.attrib_maps[0] if mesh.attrib_maps else None
+
+
+_PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+_PLY_UV_NAMES = (("s", "t"), ("u", "v"), ("texture_u", "texture_v"))
+
+
+def _ply_header(stream):
+    if stream.readline().strip() != b"ply":
+        raise CTMError(CTM_BAD_FORMAT, "Not a PLY file")
+    byte_order = None
+    comments = []
+    elements = []
+    while True:
+        line = stream.readline()
+        if not line:
+            raise CTMError(CTM_BAD_FORMAT, "Unexpected end of PLY header")
+        words = line.decode("ascii", "replace").split()
+        if not words:
+            continue
+        if words[0] == "end_header":
+            break
+        if words[0] == "format":
+            if words[1] == "binary_little_endian":
+                byte_order = "<"
+            elif words[1] == "binary_big_endian":
+                byte_order = ">"
+            else:
+                raise CTMError(CTM_UNSUPPORTED_FORMAT_VERSION, "Only binary PLY files are supported")
+        elif words[0] == "comment":
+            comments.append(line.decode("utf-8", "replace")[len("comment"):].strip())
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            if words[1] == "list":
+                elements[-1][2].append((words[4], (_PLY_TYPES[words[2]], _PLY_TYPES[words[3]])))
+            else:
+                elements[-1][2].append((words[2], _PLY_TYPES[words[1]]))
+    return byte_order, "\n".join(comments), elements
+
+
+def _ply_faces(data, count, count_type, index_type):
+    # Faces with the same number of corners are read in one go, mixed
+    # polygons one by one. Polygons become triangle fans.
+    count_dtype = np.dtype(count_type)
+    index_dtype = np.dtype(index_type)
+    if count == 0:
+        return np.empty((0, 3), dtype=np.uint32), 0
+    corners = int(np.frombuffer(data, count_dtype, 1)[0])
+    dtype = np.dtype([("count", count_dtype), ("indices", index_dtype, (corners,))])
+    if len(data) >= count * dtype.itemsize:
+        records = np.frombuffer(data, dtype, count)
+        if np.all(records["count"] == corners):
+            polygons = records["indices"].astype(np.uint32)
+            fans = [polygons[:, [0, corner, corner + 1]] for corner in range(1, corners - 1)]
+            return np.stack(fans, axis=1).reshape((-1, 3)), count * dtype.itemsize
+    triangles = []
+    position = 0
+    for _ in range(count):
+        corners = int(np.frombuffer(data, count_dtype, 1, position)[0])
+        position += count_dtype.itemsize
+        polygon = np.frombuffer(data, index_dtype, corners, position)
+        position += corners * index_dtype.itemsize
+        triangles.extend((polygon[0], polygon[corner], polygon[corner + 1]) for corner in range(1, corners - 1))
+    return np.array(triangles, dtype=np.uint32).reshape((-1, 3)), position
+
+
+def read_ply(path):
+    """Load a binary PLY file: positions, normals (nx, ny, nz), UVs (s, t or
+    u, v) and colors (red, green, blue, alpha) of the vertices and the faces,
+    split into triangles"""
+    with open(path, "rb") as stream:
+        byte_order, comment, elements = _ply_header(stream)
+        data = stream.read()
+
+    vertices = indices = None
+    position = 0
+    for name, count, properties in elements:
+        if all(isinstance(kind, str) for _, kind in properties):
+            dtype = np.dtype([(prop, byte_order + kind) for prop, kind in properties])
+            records = np.frombuffer(data, dtype, count, position)
+            position += count * dtype.itemsize
+            if name == "vertex":
+                vertices = records
+        elif name == "face" and len(properties) == 1:
+            count_type, index_type = properties[0][1]
+            indices, size = _ply_faces(data[position:], count, byte_order + count_type, byte_order + index_type)
+            position += size
+        else:
+            raise CTMError(CTM_UNSUPPORTED_FORMAT_VERSION, f"Unsupported PLY element: {name}")
+    if vertices is None or indices is None:
+        raise CTMError(CTM_BAD_FORMAT, "PLY file without vertices or faces")
+
+    def columns(*names):
+        return np.stack([vertices[name] for name in names], axis=1).astype(np.float32)
+
+    fields = vertices.dtype.names
+    mesh = Mesh(columns("x", "y", "z"), indices, comment=comment)
+    if {"nx", "ny", "nz"} <= set(fields):
+        mesh.normals = columns("nx", "ny", "nz")
+    for u, v in _PLY_UV_NAMES:
+        if u in fields and v in fields:
+            mesh.uv_maps.append(UVMap("", columns(u, v)))
+            break
+    if {"red", "green", "blue"} <= set(fields):
+        colours = np.ones((len(vertices), 4), dtype=np.float32)
+        for channel, name in enumerate(("red", "green", "blue", "alpha")):
+            if name in fields:
+                values = vertices[name].astype(np.float32)
+                colours[:, channel] = values / 255.0 if vertices.dtype[name].kind in "iu" else values
+        mesh.attrib_maps.append(AttribMap("Color", colours))
+    return mesh
+
+
+def _write_chunks(stream, count, dtype, columns):
+    # Pack the columns into rows of a structured dtype, a chunk at a time
+    for start in range(0, count, CHUNK_ROWS):
+        stop = min(count, start + CHUNK_ROWS)
+        records = np.empty(stop - start, dtype)
+        for name, values in columns:
+            records[name] = values[start:stop]
+        stream.write(records.tobytes())
+
+
+def write_ply(path, mesh):
+    """Save a Mesh as a binary little endian PLY file, with the first UV map
+    and the color map (8 bits per channel)"""
+    count = len(mesh.vertices)
+    fields = [("position", "<f4", (3,))]
+    columns = [("position", mesh.vertices)]
+    header = ["ply", "format binary_little_endian 1.0"]
+    header += [f"comment {line}" for line in mesh.comment.splitlines()]
+    header += [f"element vertex {count}", "property float x", "property float y", "property float z"]
+    if mesh.normals is not None:
+        fields.append(("normal", "<f4", (3,)))
+        columns.append(("normal", mesh.normals))
+        header += ["property float nx", "property float ny", "property float nz"]
+    if mesh.uv_maps:
+        fields.append(("uv", "<f4", (2,)))
+        columns.append(("uv", mesh.uv_maps[0].coords))
+        header += ["property float s", "property float t"]
+    colour_map = _colour_map(mesh)
+    if colour_map is not None:
+        fields.append(("colour", "u1", (4,)))
+        columns.append(("colour", _LazyColours(colour_map.values)))
+        header += ["property uchar red", "property uchar green", "property uchar blue", "property uchar alpha"]
+    header += [f"element face {len(mesh.indices)}", "property list uchar uint vertex_indices", "end_header"]
+
+    with open(path, "wb") as stream:
+        stream.write(("\n".join(header) + "\n").encode("utf-8"))
+        _write_chunks(stream, count, np.dtype(fields), columns)
+        face_dtype = np.dtype([("count", "u1"), ("indices", "<u4", (3,))])
+        _write_chunks(stream, len(mesh.indices), face_dtype, [("count", _Constant(3)), ("indices", mesh.indices)])
+
+
+class _LazyColours:
+    # Float colors converted to bytes per chunk
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, key):
+        return np.clip(np.rint(self.values[key] * 255.0), 0, 255).astype(np.uint8)
+
+
+class _Constant:
+    def __init__(self, value):
+        self.value = value
+
+    def __getitem__(self, key):
+        return self.value
+
+
+def _parse_index(token, count):
+    # 1 based, negative values count back from the last element read
+    if not token:
+        return -1
+    index = int(token)
+    return index - 1 if index > 0 else count + index
+
+
+def read_obj(path):
+    """Load an OBJ file: positions (with optional r g b colors), texture
+    coordinates, normals and faces, split into triangles. Corners with
+    different position/UV/normal combinations become separate vertices."""
+    positions = []
+    uvs = []
+    normals = []
+    corners = []
+    comments = []
+    with open(path, "r", encoding="utf-8", errors="replace") as stream:
+        for line in stream:
+            words = line.split()
+            if not words:
+                continue
+            kind = words[0]
+            if kind == "v":
+                positions.append(words[1:])
+            elif kind == "vt":
+                uvs.append(words[1:3])
+            elif kind == "vn":
+                normals.append(words[1:4])
+            elif kind == "f":
+                polygon = []
+                for word in words[1:]:
+                    parts = word.split("/") + ["", ""]
+                    polygon.append((_parse_index(parts[0], len(positions)), _parse_index(parts[1], len(uvs)),
+                                    _parse_index(parts[2], len(normals))))
+                for corner in range(1, len(polygon) - 1):
+                    corners += (polygon[0], polygon[corner], polygon[corner + 1])
+            elif kind == "#" and not positions:
+                comments.append(line[1:].strip())
+    if not corners:
+        raise CTMError(CTM_BAD_FORMAT, "OBJ file without faces")
+
+    # One vertex per distinct corner
+    keys, inverse = np.unique(np.array(corners, dtype=np.int64), axis=0, return_inverse=True)
+    has_colours = bool(positions) and all(len(position) >= 6 for position in positions)
+    position_values = np.array([position[:6 if has_colours else 3] for position in positions], dtype=np.float32)
+    mesh = Mesh(position_values[keys[:, 0], :3], inverse.astype(np.uint32).reshape((-1, 3)),
+                comment="\n".join(comments))
+    if uvs and np.all(keys[:, 1] >= 0):
+        mesh.uv_maps.append(UVMap("", np.array(uvs, dtype=np.float32)[keys[:, 1]]))
+    if normals and np.all(keys[:, 2] >= 0):
+        mesh.normals = np.array(normals, dtype=np.float32)[keys[:, 2]]
+    if has_colours:
+        colours = np.ones((len(keys), 4), dtype=np.float32)
+        colours[:, :3] = position_values[keys[:, 0], 3:6]
+        mesh.attrib_maps.append(AttribMap("Color", colours))
+    return mesh
+
+
+def write_obj(path, mesh):
+    """Save a Mesh as an OBJ file, with the first UV map, the normals and the
+    color map as r g b after the positions"""
+    count = len(mesh.vertices)
+    colour_map = _colour_map(mesh)
+    uv_coords = mesh.uv_maps[0].coords if mesh.uv_maps else None
+    if uv_coords is not None and mesh.normals is not None:
+        corner = "{0}/{0}/{0}"
+    elif uv_coords is not None:
+        corner = "{0}/{0}"
+    elif mesh.normals is not None:
+        corner = "{0}//{0}"
+    else:
+        corner = "{0}"
+    face = "f " + " ".join(corner.replace("0", str(index)) for index in range(3)) + "\n"
+
+    with open(path, "w", encoding="utf-8", newline="\n") as stream:
+        for line in mesh.comment.splitlines():
+            stream.write(f"# {line}\n")
+        for start in range(0, count, CHUNK_ROWS):
+            rows = slice(start, min(count, start + CHUNK_ROWS))
+            if colour_map is not None:
+                values = np.concatenate((mesh.vertices[rows], colour_map.values[rows, :3]), axis=1)
+                stream.write(("v %.9g %.9g %.9g %.6g %.6g %.6g\n" * len(values)) % tuple(values.ravel().tolist()))
+            else:
+                values = np.asarray(mesh.vertices[rows])
+                stream.write(("v %.9g %.9g %.9g\n" * len(values)) % tuple(values.ravel().tolist()))
+        if uv_coords is not None:
+            for start in range(0, count, CHUNK_ROWS):
+                values = np.asarray(uv_coords[start:start + CHUNK_ROWS])
+                stream.write(("vt %.9g %.9g\n" * len(values)) % tuple(values.ravel().tolist()))
+        if mesh.normals is not None:
+            for start in range(0, count, CHUNK_ROWS):
+                values = np.asarray(mesh.normals[start:start + CHUNK_ROWS])
+                stream.write(("vn %.9g %.9g %.9g\n" * len(values)) % tuple(values.ravel().tolist()))
+        for start in range(0, len(mesh.indices), CHUNK_ROWS):
+            triangles = np.asarray(mesh.indices[start:start + CHUNK_ROWS], dtype=np.int64) + 1
+            stream.write("".join(face.format(*triangle) for triangle in triangles.tolist()))
+
+
+READERS = {".ctm": read_ctm, ".npz": read_npz, ".ply": read_ply, ".obj": read_obj}
+WRITERS = {".npz": write_npz, ".ply": write_ply, ".obj": write_obj}
+
+
+def convert_file(source, target, settings=None):
+    """Convert one mesh file, formats are taken from the extensions. The
+    output is written next to target and renamed once complete."""
+    mesh = READERS[os.path.splitext(source)[1].lower()](source)
+    extension = os.path.splitext(target)[1].lower()
+    partial = target + ".part"
+    try:
+        if extension == ".ctm":
+            write_ctm(partial, mesh, settings)
+        else:
+            WRITERS[extension](partial, mesh)
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return len(mesh.vertices), len(mesh.indices)
+
+
+def _convert_task(task):
+    # Pool worker, errors are reported instead of raised
+    source, target, settings = task
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        convert_file(source, target, settings)
+        return source, target, time.perf_counter() - start, None
+    except Exception as e:
+        return source, target, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+def find_sources(inputs, extension, output=None):
+    """(source, target) pairs of the files to convert to extension. Files
+    given directly are converted whatever their format, directories are
+    searched recursively for the other formats and mirrored below output
+    (next to the sources without)."""
+    pairs = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                for name in sorted(names):
+                    stem, source_extension = os.path.splitext(name)
+                    if source_extension.lower() in READERS and source_extension.lower() != extension:
+                        source = os.path.join(directory, name)
+                        relative = os.path.relpath(os.path.join(directory, stem), path)
+                        pairs.append((source, os.path.join(output or path, relative + extension)))
+        else:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            pairs.append((path, os.path.join(output or os.path.dirname(path), stem + extension)))
+    return pairs
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m openctm", description=__doc__.split("\n\n")[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="mesh files or directories (.ctm, .npz, .ply, .obj)")
+    parser.add_argument("--to", required=True, choices=["ctm", "npz", "ply", "obj"], help="output format")
+    parser.add_argument("--output", "-o", help="output directory (default: next to the inputs)")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="worker processes (default: one per CPU core)")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="skip files whose output is newer than the input")
+    parser.add_argument("--method", choices=list(METHODS), default="MG1", help="OpenCTM compression method")
+    parser.add_argument("--level", type=int, default=1, choices=range(10), metavar="0-9",
+                        help="LZMA compression level")
+    parser.add_argument("--vertex-precision", type=float, default=0.01,
+                        help="MG2 vertex precision, relative to the average edge length")
+    parser.add_argument("--normal-precision", type=float, default=1.0 / 256.0, help="MG2 normal precision")
+    parser.add_argument("--uv-precision", type=float, default=1.0 / 1024.0, help="MG2 UV precision")
+    parser.add_argument("--attrib-precision", type=float, default=1.0 / 256.0,
+                        help="MG2 attribute (color) precision")
+    parser.add_argument("--quiet", "-q", action="store_true", help="only report errors")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    extension = "." + args.to
+    settings = CTMSettings(METHODS[args.method], args.level, args.vertex_precision, args.normal_precision,
+                           args.uv_precision, args.attrib_precision)
+    pairs = find_sources(args.inputs, extension, args.output)
+    if args.skip_existing:
+        pairs = [(source, target) for source, target in pairs
+                 if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source)]
+    if not pairs:
+        print("Nothing to convert", file=sys.stderr)
+        return 0
+
+    tasks = [(source, target, settings) for source, target in pairs]
+    jobs = min(args.jobs or os.cpu_count() or 1, len(tasks))
+    failed = 0
+    start = time.perf_counter()
+    if jobs == 1:
+        results = map(_convert_task, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(jobs)
+        # Small chunks keep the processes busy when file sizes vary
+        results = pool.imap_unordered(_convert_task, tasks, chunksize=max(1, min(16, len(tasks) // (8 * jobs))))
+    try:
+        for done, (source, target, seconds, error) in enumerate(results, 1):
+            if error is not None:
+                failed += 1
+                print(f"[{done}/{len(tasks)}] {source}: {error}", file=sys.stderr)
+            elif not args.quiet:
+                print(f"[{done}/{len(tasks)}] {source} -> {target} ({seconds:.2f}s)")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if not args.quiet:
+        print(f"Converted {len(tasks) - failed} of {len(tasks)} files in {time.perf_counter() - start:.1f}s")
+    return 1 if failed else 0
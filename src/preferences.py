@@ -0,0 +1,136 @@
+import os
+import tempfile
+
+import bpy
+from bpy.props import BoolProperty, EnumProperty, IntProperty, StringProperty
+
+from .decode_cache import DecodeCache
+
+
+def default_cache_directory():
+    return os.path.join(tempfile.gettempdir(), "blender_openctm_cache")
+
+
+class OpenCTMPreferences(bpy.types.AddonPreferences):
+    bl_idname = __package__
+
+    cache_pref: BoolProperty(
+        name="Decode Cache",
+        description="Keep decoded meshes on disk so importing the same file again skips decompression",
+        default=False
+    )
+    cache_directory: StringProperty(
+        name="Cache Location",
+        description="Directory of the decode cache, a shared location lets machines reuse each other's entries "
+                    "(empty = temporary directory)",
+        subtype="DIR_PATH",
+        default=""
+    )
+    cache_size: IntProperty(
+        name="Cache Size (MB)",
+        description="Least recently used entries are removed past this size",
+        default=4096,
+        min=16
+    )
+    cache_key: EnumProperty(
+        name="Cache Key",
+        description="How files are identified in the cache",
+        items=[("STAT", "Path and Date", "File path, size and modification time, instant but per machine"),
+               ("CONTENT", "Contents", "Hash of the file contents, survives copies and renames"),],
+        default="STAT"
+    )
+    memory_limit: IntProperty(
+        name="Import Memory Limit (MB)",
+        description="Files whose decode would take more memory are decoded section by section in bounded "
+                    "chunks, or rejected if the mesh alone does not fit (0 = no limit)",
+        default=0,
+        min=0
+    )
+    trace_pref: BoolProperty(
+        name="Performance Trace",
+        description="Time every import/export phase and report a summary in the Info log",
+        default=False
+    )
+    trace_file: StringProperty(
+        name="Trace File",
+        description="Append each trace as a JSON line to this file (empty = Info summary only)",
+        subtype="FILE_PATH",
+        default=""
+    )
+    trace_memory: BoolProperty(
+        name="Track Memory",
+        description="Also record NumPy/Python memory allocations, slows imports and exports down a little",
+        default=True
+    )
+
+    def draw(self, context):
+        box = self.layout.box()
+        box.prop(self, "cache_pref")
+        column = box.column()
+        column.enabled = self.cache_pref
+        column.prop(self, "cache_directory")
+        column.prop(self, "cache_size")
+        column.prop(self, "cache_key")
+        column.operator(OpenCTMClearCache.bl_idname)
+
+        box = self.layout.box()
+        box.prop(self, "memory_limit")
+
+        box = self.layout.box()
+        box.prop(self, "trace_pref")
+        column = box.column()
+        column.enabled = self.trace_pref
+        column.prop(self, "trace_file")
+        column.prop(self, "trace_memory")
+
+
+class OpenCTMClearCache(bpy.types.Operator):
+    """Remove every entry of the OpenCTM decode cache"""
+    bl_idname = "preferences.openctm_clear_cache"
+    bl_label = "Clear Cache"
+
+    def execute(self, context):
+        cache = decode_cache(context, enabled_only=False)
+        cache.clear()
+        self.report({'INFO'}, f"Cleared: {cache.directory}")
+        return {'FINISHED'}
+
+
+def preferences(context):
+    return context.preferences.addons[__package__].preferences
+
+
+def decode_cache(context, enabled_only=True):
+    """DecodeCache configured in the add-on preferences, None if disabled"""
+    prefs = preferences(context)
+    if enabled_only and not prefs.cache_pref:
+        return None
+    directory = bpy.path.abspath(prefs.cache_directory) if prefs.cache_directory else default_cache_directory()
+    return DecodeCache(directory, prefs.cache_size << 20, prefs.cache_key == "CONTENT")
+
+
+def memory_limit(context):
+    """Import memory ceiling in bytes from the add-on preferences, None
+    without one"""
+    limit = preferences(context).memory_limit
+    return limit << 20 if limit else None
+
+
+def trace_settings(context):
+    """(enabled, trace file, track memory) of the performance trace, the
+    OPENCTM_TRACE environment variable turns it on with that trace file"""
+    filepath = os.environ.get("OPENCTM_TRACE")
+    if filepath:
+        return True, filepath, True
+    prefs = preferences(context)
+    return prefs.trace_pref, bpy.path.abspath(prefs.trace_file) if prefs.trace_file else "", prefs.trace_memory
+
+
+def register():
+    bpy.utils.register_class(OpenCTMClearCache)
+    bpy.utils.register_class(OpenCTMPreferences)
+
+
+def unregister():
+    bpy.utils.unregister_class(OpenCTMPreferences)
+    bpy.utils.unregister_class(OpenCTMClearCache)
@@ -0,0 +1,177 @@
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__package__)
+
+# Trace being recorded, None when profiling is off
+_active = None
+
+
+class _NullPhase:
+    """Shared do-nothing phase, all that phase() costs while not profiling"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class Phase:
+    def __init__(self, trace, name, label, nbytes):
+        self.trace = trace
+        self.name = name
+        self.label = label
+        self.bytes = nbytes
+
+    def __enter__(self):
+        self.memory = tracemalloc.get_traced_memory()[0] if self.trace.track_memory else 0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        memory = tracemalloc.get_traced_memory()[0] - self.memory if self.trace.track_memory else None
+        self.trace.records.append({
+            "phase": self.name,
+            "label": self.label,
+            "thread": threading.current_thread().name,
+            "start": self.start - self.trace.start,
+            "seconds": end - self.start,
+            "bytes": self.bytes,
+            "memory": memory,
+        })
+        return False
+
+
+class Trace:
+    """Timings of the phases of one operator run.
+
+    Phases may run on worker threads, their seconds then add up to more than
+    the wall time. memory is the change of NumPy/Python allocations over a
+    phase (all threads), peak_memory the highest total of these allocations
+    and peak_rss the process peak resident set size.
+    """
+
+    def __init__(self, name, track_memory=True):
+        self.name = name
+        self.track_memory = track_memory
+        self.records = []
+        self.info = {}
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.peak_memory = None
+        self._started_tracemalloc = False
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def phase(self, name, label="", nbytes=0):
+        return Phase(self, name, label, nbytes)
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.start
+        if self.track_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+    def totals(self):
+        """{phase: [seconds, bytes, calls]} in order of first appearance"""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["phase"], [0.0, 0, 0])
+            total[0] += record["seconds"]
+            total[1] += record["bytes"]
+            total[2] += 1
+        return totals
+
+    def summary(self):
+        parts = [f"{self.name} {self.seconds:.2f}s"]
+        for phase, (seconds, nbytes, calls) in self.totals().items():
+            text = f"{phase} {seconds:.2f}s"
+            if nbytes:
+                text += " " + _format_bytes(nbytes)
+            if calls > 1:
+                text += f" x{calls}"
+            parts.append(text)
+        if self.peak_memory is not None:
+            parts.append("peak " + _format_bytes(self.peak_memory))
+        return ", ".join(parts)
+
+    def to_dict(self):
+        peak_rss = None
+        if resource is not None:
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Linux reports kilobytes, macOS bytes
+            if sys.platform != "darwin":
+                peak_rss *= 1024
+        return {
+            "operation": self.name,
+            "time": time.time(),
+            "seconds": self.seconds,
+            "peak_memory": self.peak_memory,
+            "peak_rss": peak_rss,
+            "info": self.info,
+            "phases": self.records,
+        }
+
+    def write(self, filepath):
+        """Append the trace as one JSON line to filepath"""
+        with open(filepath, "a", encoding="utf-8") as stream:
+            stream.write(json.dumps(self.to_dict()) + "\n")
+
+
+def _format_bytes(nbytes):
+    if nbytes < 1 << 20:
+        return f"{nbytes / (1 << 10):.0f}KB"
+    return f"{nbytes / (1 << 20):.0f}MB"
+
+
+def array_bytes(*arrays):
+    return sum(array.nbytes for array in arrays if array is not None)
+
+
+def phase(name, label="", nbytes=0):
+    """Context manager timing a phase of the active trace, a no-op without one"""
+    trace = _active
+    if trace is None:
+        return _NULL_PHASE
+    return trace.phase(name, label, nbytes)
+
+
+def active():
+    return _active
+
+
+def start(name, track_memory=True):
+    """Start recording a Trace, phase() calls from any thread go to it until
+    stop()"""
+    global _active
+    _active = Trace(name, track_memory)
+    return _active
+
+
+def stop():
+    """Stop recording and log the trace"""
+    global _active
+    trace, _active = _active, None
+    if trace is not None:
+        trace.finish()
+        logger.info("%s", json.dumps(trace.to_dict()))
+    return trace